@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+アーカイブインデックスモジュール
+
+開発日記のアーカイブについて、日付・通し番号・変換元のパス・生成した記事のスラッグを
+JSONファイルに記録する。ディレクトリは1回の走査で索引し、以降は更新時刻が変わった
+ディレクトリだけを走査し直す。通し番号順の並びから、各日記の前回の記事スラッグを引く。
+"""
+
+import os
+import re
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .output_writer import write_text_atomic
+
+# 日記のファイル名（YYYY-MM-DD_{通し番号}_development.md）
+DATE_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})')
+DIARY_FILENAME_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2})_(\d+)_development\.md$')
+
+DEFAULT_ARCHIVE_INDEX_PATH = ".diary-converter-index.json"
+
+
+def parse_diary_filename(filename: str) -> Optional[Tuple[str, str]]:
+    """ファイル名から (日付, 通し番号) を返す（命名規則に合わない場合はNone）"""
+    match = DIARY_FILENAME_PATTERN.match(filename)
+    return (match.group(1), match.group(2)) if match else None
+
+
+def slug_from_path(path: str) -> str:
+    """記事ファイルのパスからスラッグ（拡張子を除いたファイル名）を返す"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+class ArchiveIndex:
+    """開発日記のアーカイブを索引するクラス"""
+
+    VERSION = 1
+
+    def __init__(self, path: str):
+        """初期化（既存のインデックスがあれば読み込む）"""
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.directories: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._dirty = False
+        # ディレクトリごとの通し番号順の並びと、各日記の位置（エントリが変わると作り直す）
+        self._order: Dict[str, List[str]] = {}
+        self._positions: Dict[str, int] = {}
+        self.load()
+
+    def load(self) -> None:
+        """インデックスファイルを読み込む"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            raise IOError(f"インデックスファイルの形式が不正です: {self.path}: {e}")
+        if data.get("version") == self.VERSION:
+            self.entries = data.get("entries", {})
+            self.directories = data.get("directories", {})
+
+    def scan(self, directory: str) -> bool:
+        """
+        ディレクトリを索引する（前回の走査から更新時刻が変わっていなければ何もしない）
+
+        Returns:
+            走査し直した場合はTrue
+        """
+        directory = os.path.abspath(directory)
+        mtime = os.stat(directory).st_mtime_ns
+        with self._lock:
+            if self.directories.get(directory) == mtime:
+                return False
+
+            found = {}
+            with os.scandir(directory) as it:
+                for entry in it:
+                    parsed = parse_diary_filename(entry.name)
+                    if parsed and entry.is_file():
+                        found[entry.path] = parsed
+
+            for key in [k for k, e in self.entries.items() if e["directory"] == directory and k not in found]:
+                del self.entries[key]
+            for source, (date, serial) in found.items():
+                entry = self.entries.get(source)
+                if entry is None:
+                    self.entries[source] = {
+                        "directory": directory,
+                        "date": date,
+                        "serial": serial,
+                        "slug": None,
+                    }
+            self.directories[directory] = mtime
+            self._invalidate(directory)
+            return True
+
+    def _invalidate(self, directory: str) -> None:
+        """ディレクトリの並びを破棄し、変更を記録する"""
+        self._order.pop(directory, None)
+        self._dirty = True
+
+    def _ordered(self, directory: str) -> List[str]:
+        """ディレクトリ内の日記を通し番号（同じ場合は日付）の順に並べたリストを返す"""
+        order = self._order.get(directory)
+        if order is None:
+            keys = [k for k, e in self.entries.items() if e["directory"] == directory]
+            keys.sort(key=lambda k: (int(self.entries[k]["serial"]), self.entries[k]["date"], k))
+            for position, key in enumerate(keys):
+                self._positions[key] = position
+            order = self._order[directory] = keys
+        return order
+
+    def get(self, source_file: str) -> Optional[Dict[str, Any]]:
+        """日記のエントリを返す（ディレクトリは必要に応じて走査する）"""
+        source = os.path.abspath(source_file)
+        self.scan(os.path.dirname(source))
+        with self._lock:
+            entry = self.entries.get(source)
+            return dict(entry, source=source) if entry else None
+
+    def previous(self, source_file: str) -> Optional[Dict[str, Any]]:
+        """同じディレクトリで通し番号が1つ前の日記のエントリを返す（なければNone）"""
+        source = os.path.abspath(source_file)
+        directory = os.path.dirname(source)
+        self.scan(directory)
+        with self._lock:
+            if source not in self.entries:
+                return None
+            order = self._ordered(directory)
+            position = self._positions[source]
+            if position == 0:
+                return None
+            previous_source = order[position - 1]
+            return dict(self.entries[previous_source], source=previous_source)
+
+    def previous_slug(self, source_file: str) -> Optional[str]:
+        """前回の記事スラッグを返す（前回の日記がないか、記事がまだ記録されていない場合はNone）"""
+        entry = self.previous(source_file)
+        return entry["slug"] if entry else None
+
+    def record_output(self, source_file: str, destination_file: str) -> Optional[str]:
+        """
+        日記から生成する（した）記事のスラッグを記録する（保存はsave()で行う）
+
+        Returns:
+            それまでに記録されていたスラッグ（restore_output で元に戻すために使う）
+        """
+        source = os.path.abspath(source_file)
+        parsed = parse_diary_filename(os.path.basename(source))
+        if parsed is None:
+            return None
+        slug = slug_from_path(destination_file)
+        with self._lock:
+            entry = self.entries.get(source)
+            if entry is None:
+                # 走査前に記録する場合もエントリを作る（次の走査で存在を確認する）
+                entry = self.entries[source] = {
+                    "directory": os.path.dirname(source),
+                    "date": parsed[0],
+                    "serial": parsed[1],
+                    "slug": None,
+                }
+                self._order.pop(entry["directory"], None)
+            previous_slug = entry["slug"]
+            if previous_slug != slug:
+                entry["slug"] = slug
+                self._dirty = True
+            return previous_slug
+
+    def restore_output(self, source_file: str, slug: Optional[str]) -> None:
+        """変換に失敗した日記のスラッグを、record_output の前の値に戻す"""
+        source = os.path.abspath(source_file)
+        with self._lock:
+            entry = self.entries.get(source)
+            if entry is not None and entry["slug"] != slug:
+                entry["slug"] = slug
+                self._dirty = True
+
+    def save(self) -> None:
+        """変更があればインデックスファイルをアトミックに書き出す"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": self.VERSION, "directories": self.directories, "entries": self.entries}
+            write_text_atomic(self.path, json.dumps(data, ensure_ascii=False, indent=2, sort_keys=True))
+            self._dirty = False
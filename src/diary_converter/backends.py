@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+LLMバックエンドモジュール
+
+DiaryConverter がテキスト生成に使うバックエンドを定義する。GeminiBackend は
+共有のモデルプールを通じてGemini APIを呼び出す。StubBackend はネットワークを使わずに
+遅延・失敗・出力サイズを再現するローカルのスタブで、バッチ変換・キャッシュ・再試行・
+スループットの計測をオフラインで再現可能に行うために使う。HedgedBackend は応答の遅い
+リクエストに対して重複リクエストや代替モデルへのリクエストを送り、最初に返った結果を使う。
+"""
+
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .client_pool import default_model_pool
+from .metrics import increment
+from .source_reader import update_digest
+from .tokens import estimate_tokens
+
+
+class BackendError(Exception):
+    """バックエンドが返すエラー（code はHTTPステータスコード相当で、再試行の判定に使われる）"""
+
+    def __init__(self, message: str, code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.code = code
+        self.retry_after = retry_after
+
+
+class LLMBackend:
+    """LLMバックエンドの基底クラス"""
+
+    # エラーメッセージなどに使う表示名
+    label = "LLM"
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def cache_configs(self) -> Tuple[Any, ...]:
+        """応答キャッシュのキーに含める、生成結果に影響する設定"""
+        return ()
+
+    def generate(self, prompt: str, system_instruction: Optional[str] = None) -> str:
+        """
+        プロンプトに対する生成テキストを返す
+
+        system_instruction は複数のリクエストで共有する固定の指示で、バックエンドは
+        これをリクエストごとの内容と分けて扱い、再利用できる。
+        """
+        raise NotImplementedError
+
+    def generate_stream(self, prompt: str, system_instruction: Optional[str] = None) -> Iterator[str]:
+        """
+        生成テキストを断片ごとに返すイテレータを返す
+
+        リクエストの送信はこのメソッドの呼び出し中に行い、エラーもここで送出する
+        （スケジューラーが再試行できるのは応答の受信を開始するまで）。
+        """
+        return iter([self.generate(prompt, system_instruction=system_instruction)])
+
+    def with_model(self, model_name: str) -> "LLMBackend":
+        """同じ設定で別のモデルを使うバックエンドを返す（代替モデルへのフォールバックに使う）"""
+        raise NotImplementedError(f"{self.label} は別のモデルへの切り替えに対応していません")
+
+
+class GeminiBackend(LLMBackend):
+    """Gemini APIを呼び出すバックエンド"""
+
+    label = "Gemini API"
+
+    def __init__(self, model_name: str, api_key: Optional[str],
+                 generation_config: Dict[str, Any], safety_settings: Any, model_pool=None):
+        """
+        初期化
+
+        Args:
+            model_name: モデル名
+            api_key: APIキー
+            generation_config: 生成設定
+            safety_settings: セーフティ設定
+            model_pool: モデルを共有するプール（省略時はプロセス全体で共有するプール）
+        """
+        super().__init__(model_name)
+        self.api_key = api_key
+        self.generation_config = generation_config
+        self.safety_settings = safety_settings
+        self.model_pool = model_pool or default_model_pool
+
+    def cache_configs(self) -> Tuple[Any, ...]:
+        return (self.generation_config, self.safety_settings)
+
+    def with_model(self, model_name: str) -> "GeminiBackend":
+        return GeminiBackend(model_name, self.api_key, self.generation_config, self.safety_settings,
+                             model_pool=self.model_pool)
+
+    def get_model(self, system_instruction: Optional[str] = None):
+        """
+        共有プールから設定済みのモデルを取得する（初回はSDKの読み込みと設定を行う）
+
+        システム指示を持つモデルは指示ごとにプールされ、バッチ全体で再利用される。
+        """
+        self.model_pool.configure(self.api_key)
+        if system_instruction:
+            return self.model_pool.get(self.model_name, self.generation_config, self.safety_settings,
+                                       system_instruction=system_instruction)
+        return self.model_pool.get(self.model_name, self.generation_config, self.safety_settings)
+
+    def generate(self, prompt: str, system_instruction: Optional[str] = None) -> str:
+        return self.get_model(system_instruction).generate_content(prompt).text
+
+    def generate_stream(self, prompt: str, system_instruction: Optional[str] = None) -> Iterator[str]:
+        response = self.get_model(system_instruction).generate_content(prompt, stream=True)
+        return self._iter_text(response)
+
+    @staticmethod
+    def _iter_text(response) -> Iterator[str]:
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # テキストを含まない断片（終了理由のみなど）は読み飛ばす
+                continue
+            yield text
+
+
+class StubBackend(LLMBackend):
+    """
+    ネットワークを使わない決定的なスタブバックエンド
+
+    応答の内容と失敗するかどうかは seed・プロンプト・そのプロンプトの呼び出し回数だけで
+    決まるため、スレッドの実行順に関係なく同じ結果が再現される。
+    """
+
+    label = "スタブバックエンド"
+
+    def __init__(self, model_name: str = "stub", latency: float = 0.0, jitter: float = 0.0,
+                 failure_rate: float = 0.0, output_chars: int = 2000, stream_chunk_chars: int = 256,
+                 seed: int = 0, sleep: Callable[[float], None] = time.sleep,
+                 slow_rate: float = 0.0, slow_factor: float = 10.0):
+        """
+        初期化
+
+        Args:
+            model_name: モデル名（キャッシュやマニフェストの記録に使う）
+            latency: 1回の呼び出しの応答までの遅延（秒）
+            jitter: 遅延のゆらぎの割合（0.2なら±20%）
+            failure_rate: 呼び出しが再試行可能なエラー（503）で失敗する確率
+            output_chars: 生成する記事のおおよその文字数
+            stream_chunk_chars: ストリーミング時の1断片の文字数
+            seed: 乱数のシード
+            sleep: 待機に使う関数
+            slow_rate: 呼び出しの遅延が slow_factor 倍になる確率（テールレイテンシの再現に使う）
+            slow_factor: 遅い呼び出しの遅延の倍率
+        """
+        if not 0.0 <= failure_rate <= 1.0:
+            raise ValueError(f"failure_rate は0から1の範囲で指定してください: {failure_rate}")
+        super().__init__(model_name)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.output_chars = output_chars
+        self.stream_chunk_chars = max(1, stream_chunk_chars)
+        self.seed = seed
+        self.sleep = sleep
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self._attempts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "failures": 0, "output_chars": 0}
+
+    def cache_configs(self) -> Tuple[Any, ...]:
+        return ({"output_chars": self.output_chars, "seed": self.seed},)
+
+    def with_model(self, model_name: str) -> "StubBackend":
+        return StubBackend(model_name, self.latency, self.jitter, self.failure_rate, self.output_chars,
+                           self.stream_chunk_chars, self.seed, self.sleep, self.slow_rate, self.slow_factor)
+
+    def _begin(self, prompt: str, system_instruction: Optional[str] = None) -> random.Random:
+        """呼び出しを1回分進め、遅延と失敗を再現して、応答の生成に使う乱数を返す"""
+        # システム指示とプロンプトを連結した文字列のハッシュ（連結したコピーは作らない）
+        request_digest = hashlib.sha256()
+        if system_instruction is not None:
+            update_digest(request_digest, f"{system_instruction}\0")
+        update_digest(request_digest, prompt)
+        digest = request_digest.hexdigest()
+        with self._lock:
+            attempt = self._attempts.get(digest, 0)
+            self._attempts[digest] = attempt + 1
+            self.stats["calls"] += 1
+        rng = random.Random(f"{self.seed}:{digest}:{attempt}")
+
+        delay = self.latency * (1.0 + self.jitter * (2.0 * rng.random() - 1.0))
+        if self.slow_rate and rng.random() < self.slow_rate:
+            delay *= self.slow_factor
+        if delay > 0:
+            self.sleep(delay)
+        if rng.random() < self.failure_rate:
+            with self._lock:
+                self.stats["failures"] += 1
+            raise BackendError("スタブバックエンド: 503 Service Unavailable", code=503)
+        return random.Random(f"{self.seed}:{digest}")
+
+    def render(self, rng: random.Random) -> str:
+        """Zenn記事の形をした決定的な応答を生成する"""
+        slug = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(12))
+        header = (
+            "---\n"
+            f"title: \"スタブ記事 {slug}\"\n"
+            "emoji: \"🧪\"\n"
+            "type: \"tech\"\n"
+            "topics: [\"stub\"]\n"
+            "published: false\n"
+            "---\n\n"
+        )
+        sections = ["はじめに", "背景と目的", "検討内容", "実装内容", "まとめ"]
+        per_section = max(1, (self.output_chars - len(header)) // len(sections))
+        body = []
+        for section in sections:
+            words = []
+            length = 0
+            while length < per_section:
+                word = f"項目{rng.randrange(1000)}"
+                words.append(word)
+                length += len(word) + 1
+            body.append(f"## {section}\n\n{' '.join(words)}\n")
+        text = header + "\n".join(body)
+        with self._lock:
+            self.stats["output_chars"] += len(text)
+        return text
+
+    def generate(self, prompt: str, system_instruction: Optional[str] = None) -> str:
+        return self.render(self._begin(prompt, system_instruction))
+
+    def generate_stream(self, prompt: str, system_instruction: Optional[str] = None) -> Iterator[str]:
+        text = self.render(self._begin(prompt, system_instruction))
+        size = self.stream_chunk_chars
+        return iter([text[i:i + size] for i in range(0, len(text), size)])
+
+
+class HedgedBackend(LLMBackend):
+    """
+    応答の遅いリクエストを重複リクエストや代替モデルで補うバックエンド
+
+    最初のパス（主バックエンド）の応答が hedge_after 秒以内に返らない場合、またはエラーに
+    なった場合に次のパスへのリクエストを送り、最初に成功した結果を返す。代替モデルが
+    指定されていればそれらを順に、なければ主バックエンドへの重複リクエストを hedges 回まで送る。
+    負けたリクエストの結果は破棄する（同期APIの呼び出しは途中で止められないため、
+    送信済みのリクエストは完了まで各スレッドで実行される）。応答キャッシュのキーと
+    マニフェストのモデル名には主バックエンドのものを使う。scheduler（RequestScheduler）を
+    指定すると、追加のリクエストもそれぞれ送る前にレート制限の枠を予約する
+    （主バックエンドへのリクエストの分は呼び出し元の scheduler.call で予約済み）。
+    """
+
+    def __init__(self, primary: LLMBackend, fallbacks: Sequence[LLMBackend] = (),
+                 hedge_after: Optional[float] = None, hedges: int = 1, scheduler: Optional[Any] = None):
+        """
+        初期化
+
+        Args:
+            primary: 主バックエンド
+            fallbacks: 代替モデルのバックエンド（指定した順に試す）
+            hedge_after: 次のパスにリクエストを送るまでの待ち時間（秒。Noneならエラー時だけ次へ進む）
+            hedges: 代替モデルがない場合に送る重複リクエストの最大数
+            scheduler: 追加のリクエストのレート制限を予約するスケジューラー
+        """
+        super().__init__(primary.model_name)
+        self.scheduler = scheduler
+        self.label = primary.label
+        self.primary = primary
+        self.hedge_after = hedge_after
+        if fallbacks:
+            self.paths: List[Tuple[str, LLMBackend]] = [(f"fallback:{b.model_name}", b) for b in fallbacks]
+        else:
+            self.paths = [(f"hedge:{primary.model_name}", primary)] * max(0, hedges)
+        self.paths.insert(0, (f"primary:{primary.model_name}", primary))
+        self._lock = threading.Lock()
+        # requests: 呼び出し回数 / hedged: 追加で送ったリクエスト数 / discarded: 破棄した結果の数
+        self.stats: Dict[str, Any] = {"requests": 0, "hedged": 0, "discarded": 0, "wins": {}}
+
+    def cache_configs(self) -> Tuple[Any, ...]:
+        return self.primary.cache_configs()
+
+    @staticmethod
+    def _start(func: Callable[[], Any]) -> Future:
+        """関数を専用のスレッドで実行し、結果をFutureで返す（負けたリクエストの完了を待たない）"""
+        future: Future = Future()
+        future.set_running_or_notify_cancel()
+
+        def run():
+            try:
+                future.set_result(func())
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def _race(self, request: Callable[[LLMBackend], Any], estimated_tokens: int = 0) -> Any:
+        """パスへのリクエストを必要に応じて追加しながら、最初に成功した結果を返す"""
+        running: Dict[Future, str] = {}
+        next_path = 0
+        last_error: Optional[BaseException] = None
+        with self._lock:
+            self.stats["requests"] += 1
+        while True:
+            if next_path < len(self.paths) and (not running or self.hedge_after is not None):
+                name, backend = self.paths[next_path]
+                if next_path > 0 and self.scheduler is not None:
+                    # 追加のリクエストもレート制限の枠を使う（待っている間に成功した結果があれば送らない）
+                    self.scheduler.reserve(estimated_tokens)
+                next_path += 1
+                if not any(future.done() and future.exception() is None for future in running):
+                    running[self._start(lambda backend=backend: request(backend))] = name
+                    if next_path > 1:
+                        with self._lock:
+                            self.stats["hedged"] += 1
+                        increment("hedged_requests")
+            if not running:
+                raise last_error
+
+            timeout = self.hedge_after if next_path < len(self.paths) else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    last_error = error
+                    continue
+                with self._lock:
+                    self.stats["wins"][name] = self.stats["wins"].get(name, 0) + 1
+                    self.stats["discarded"] += len(running)
+                if name != self.paths[0][0]:
+                    increment("hedge_wins")
+                return future.result()
+
+    @staticmethod
+    def _estimate(prompt: str, system_instruction: Optional[str]) -> int:
+        return estimate_tokens(prompt) + (estimate_tokens(system_instruction) if system_instruction else 0)
+
+    def generate(self, prompt: str, system_instruction: Optional[str] = None) -> str:
+        return self._race(lambda backend: backend.generate(prompt, system_instruction=system_instruction),
+                          self._estimate(prompt, system_instruction))
+
+    def generate_stream(self, prompt: str, system_instruction: Optional[str] = None) -> Iterator[str]:
+        # 最初の断片が届くまでを競わせ、勝ったパスの残りの断片をそのまま返す
+        def first_chunk(backend):
+            stream = iter(backend.generate_stream(prompt, system_instruction=system_instruction))
+            return next(stream, None), stream
+
+        first, stream = self._race(first_chunk, self._estimate(prompt, system_instruction))
+        return self._chain(first, stream)
+
+    @staticmethod
+    def _chain(first: Optional[str], stream: Iterator[str]) -> Iterator[str]:
+        if first is not None:
+            yield first
+        yield from stream
+
+
+def add_backend_arguments(parser) -> None:
+    """バックエンドの選択とスタブの設定に関するコマンドライン引数を追加する"""
+    parser.add_argument("--backend", choices=["gemini", "stub"], default="gemini",
+                        help="使用するLLMバックエンド（stubはネットワークを使わないオフラインのスタブ）")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="スタブの応答までの遅延（秒）")
+    parser.add_argument("--stub-failure-rate", type=float, default=0.0, help="スタブの呼び出しが失敗する確率")
+    parser.add_argument("--stub-output-chars", type=int, default=2000, help="スタブが生成する記事の文字数")
+    parser.add_argument("--stub-seed", type=int, default=0, help="スタブの乱数のシード")
+    parser.add_argument("--stub-slow-rate", type=float, default=0.0,
+                        help="スタブの呼び出しが遅くなる（遅延が10倍になる）確率")
+    parser.add_argument("--hedge-after", type=float, default=None,
+                        help="応答がこの秒数以内に返らない場合、重複リクエストまたは代替モデルへのリクエストを送る")
+    parser.add_argument("--fallback-model", action="append", default=[],
+                        help="応答が遅いかエラーの場合に使う代替モデル（指定した順に試す。複数指定可）")
+    parser.add_argument("--hedges", type=int, default=1,
+                        help="代替モデルがない場合に送る重複リクエストの最大数")
+
+
+def backend_from_args(args) -> Optional[LLMBackend]:
+    """コマンドライン引数からバックエンドを生成する（gemini の場合はNoneで、既定のバックエンドを使う）"""
+    if args.backend != "stub":
+        return None
+    return StubBackend(
+        latency=args.stub_latency,
+        failure_rate=args.stub_failure_rate,
+        output_chars=args.stub_output_chars,
+        seed=args.stub_seed,
+        slow_rate=args.stub_slow_rate
+    )
+
+
+def latency_policy_from_args(args) -> Dict[str, Any]:
+    """コマンドライン引数から DiaryConverter に渡すレイテンシポリシーの設定を返す"""
+    return {
+        "hedge_after": args.hedge_after,
+        "fallback_models": args.fallback_model,
+        "hedges": args.hedges,
+    }
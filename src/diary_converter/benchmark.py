@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+ベンチマークモジュール
+
+合成した開発日記のコーパスに対して変換パイプラインを段階ごとに計測する。
+LLMの呼び出しは遅延を設定したスタブバックエンドで置き換えるため、ネットワークなしで
+同じ条件の計測を繰り返せる。結果はベースラインとしてJSONに保存でき、
+ベースラインと比較して遅くなった段階を回帰として報告する。
+
+計測する段階:
+    read            read_source_diary
+    template        load_compiled_template + prepare_template
+    prompt          generate_prompt
+    llm             generate_with_gemini（スタブバックエンド、スケジューラー経由）
+    post_process    DocumentProcessor.process_text（変換時にメモリ上で適用される後処理）
+    save            save_converted_article
+    process_file    DocumentProcessor.process（書き出した記事ファイルの後処理）
+    local           llm 以外の段階の合計（ローカルの処理時間）
+    total           1ファイルあたりの全段階の合計
+
+llm と total はスタブの模擬的な遅延を含むため、ベースラインとの比較の対象外とする。
+
+--memory-sizes を指定すると、大きな開発日記1件の変換と記事ファイルの後処理について、
+新しいプロセスで最大常駐メモリ（RSS）とPythonのヒープの最大使用量を計測する。
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+import multiprocessing
+from typing import Any, Dict, List, Optional
+
+from .backends import StubBackend
+from .diary_converter import DiaryConverter
+from .document_processor import DocumentProcessor
+from .metrics import percentile
+
+STAGES = ["read", "template", "prompt", "llm", "post_process", "save", "process_file", "local", "total"]
+# スタブの模擬的な遅延を含み、回帰の判定に使わない段階
+SIMULATED_STAGES = {"llm", "total"}
+BASELINE_VERSION = 1
+# メモリ計測のプロセスを待つ最大時間（秒）
+MEMORY_TIMEOUT = 600.0
+
+_WORDS = [
+    "テンプレート", "キャッシュ", "プロンプト", "変換", "記事", "ワーカー", "スレッド", "設定",
+    "エラー", "再試行", "マニフェスト", "出力", "入力", "確認", "修正", "実装", "調査", "原因",
+]
+_CODE_LINES = [
+    "python -m diary_converter.diary_converter ProjectLogs/ articles/ --batch",
+    "def convert(self, source_file, destination_file):",
+    "    content = self.read_source_diary(source_file)",
+    "Traceback (most recent call last):",
+    "docker compose run --rm diary-converter pytest",
+]
+
+
+def _sentence(rng: random.Random) -> str:
+    return "".join(rng.choice(_WORDS) for _ in range(rng.randint(4, 9))) + "を行った。"
+
+
+def synthetic_diary(size_chars: int, rng: random.Random) -> str:
+    """見出し・会話ログ・コードブロックを含む、おおよそsize_chars文字の開発日記を生成する"""
+    parts = ["# 開発日記\n\n"]
+    length = len(parts[0])
+    section = 0
+    while length < size_chars:
+        section += 1
+        block = [f"## 作業 {section}\n\n"]
+        for _ in range(rng.randint(1, 3)):
+            block.append(" ".join(_sentence(rng) for _ in range(rng.randint(2, 5))) + "\n\n")
+        for _ in range(rng.randint(1, 3)):
+            block.append(f"- ユーザー: {_sentence(rng)}\n- LLM: {_sentence(rng)}\n")
+        block.append("\n")
+        if rng.random() < 0.5:
+            lines = [rng.choice(_CODE_LINES) for _ in range(rng.randint(2, 6))]
+            block.append("```bash\n" + "\n".join(lines) + "\n```\n\n")
+        text = "".join(block)
+        parts.append(text)
+        length += len(text)
+    return "".join(parts)
+
+
+def generate_corpus(directory: str, count: int, size_chars: int, seed: int = 0) -> List[str]:
+    """合成した開発日記をcount件生成し、ファイルパスのリストを返す"""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(f"{seed}:{count}:{size_chars}")
+    paths = []
+    for index in range(1, count + 1):
+        day = 1 + (index - 1) % 28
+        path = os.path.join(directory, f"2025-01-{day:02d}_{index:03d}_development.md")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(synthetic_diary(size_chars, rng))
+        paths.append(path)
+    return paths
+
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    """段階ごとの計測値（秒）を集計する"""
+    summary = {}
+    for stage in STAGES:
+        values = samples.get(stage, [])
+        if not values:
+            continue
+        summary[stage] = {
+            "count": len(values),
+            "mean": sum(values) / len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "total": sum(values),
+        }
+    return summary
+
+
+def run_scenario(converter: DiaryConverter, processor: DocumentProcessor,
+                 source_files: List[str], output_dir: str, max_workers: int = 4) -> Dict[str, Any]:
+    """
+    1つのコーパスについて、段階ごとの計測とバッチ変換のスループットの計測を行う
+
+    Returns:
+        段階ごとの集計（stages）とスループット（throughput）を含む辞書
+    """
+    samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    manager = converter.template_manager
+    source_bytes = 0
+
+    for source_file in source_files:
+        destination_file = os.path.join(output_dir, "stages", os.path.basename(source_file))
+        durations = {}
+
+        start = time.perf_counter()
+        content = converter.read_source_diary(source_file)
+        durations["read"] = time.perf_counter() - start
+        source_bytes += len(content.encode('utf-8'))
+
+        start = time.perf_counter()
+        compiled = manager.load_compiled_template()
+        prepared = manager.prepare_template(
+            compiled, converter.model_name,
+            converter.extract_serial_number_from_filename(source_file), converter.prev_article_slug
+        )
+        durations["template"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        prompt = converter.generate_prompt(content, prepared)
+        durations["prompt"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        text = converter.generate_with_gemini(prompt)
+        durations["llm"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        text = processor.process_text(text)
+        durations["post_process"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        converter.save_converted_article(text, destination_file)
+        durations["save"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        processor.process(destination_file)
+        durations["process_file"] = time.perf_counter() - start
+
+        durations["total"] = sum(durations.values())
+        durations["local"] = durations["total"] - durations["llm"]
+        for stage, duration in durations.items():
+            samples[stage].append(duration)
+
+    # 並列のバッチ変換全体のスループット
+    start = time.perf_counter()
+    results = converter.convert_batch(
+        os.path.dirname(source_files[0]), os.path.join(output_dir, "batch"), max_workers=max_workers
+    )
+    elapsed = time.perf_counter() - start
+    failures = sum(1 for r in results if not r["success"])
+
+    return {
+        "files": len(source_files),
+        "source_bytes": source_bytes,
+        "stages": summarize(samples),
+        "throughput": {
+            "max_workers": max_workers,
+            "seconds": elapsed,
+            "files_per_second": len(results) / elapsed if elapsed > 0 else 0.0,
+            "bytes_per_second": source_bytes / elapsed if elapsed > 0 else 0.0,
+            "failures": failures,
+        },
+    }
+
+
+def run_benchmark(counts: List[int], sizes: List[int], template_path: str,
+                  latency: float = 0.05, jitter: float = 0.5, failure_rate: float = 0.0,
+                  output_chars: int = 4000, max_workers: int = 4, seed: int = 0,
+                  work_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    件数と文字数の組み合わせごとにコーパスを生成して計測する
+
+    Returns:
+        シナリオ名（"{件数}x{文字数}"）をキーとする計測結果を含む辞書
+    """
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="diary-converter-bench-")
+    backend = StubBackend(latency=latency, jitter=jitter, failure_rate=failure_rate,
+                          output_chars=output_chars, seed=seed)
+    converter = DiaryConverter(template_path=template_path, backend=backend, post_process=False)
+    # 再試行の待ち時間は計測対象から外す
+    converter.scheduler.sleep = lambda seconds: None
+    processor = DocumentProcessor()
+
+    scenarios = {}
+    try:
+        for count in counts:
+            for size in sizes:
+                name = f"{count}x{size}"
+                scenario_dir = os.path.join(work_dir, name)
+                source_files = generate_corpus(os.path.join(scenario_dir, "logs"), count, size, seed)
+                scenarios[name] = run_scenario(
+                    converter, processor, source_files, os.path.join(scenario_dir, "out"), max_workers
+                )
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "version": BASELINE_VERSION,
+        "config": {
+            "latency": latency, "jitter": jitter, "failure_rate": failure_rate,
+            "output_chars": output_chars, "max_workers": max_workers, "seed": seed,
+        },
+        "scenarios": scenarios,
+    }
+
+
+def _max_rss_bytes() -> Optional[int]:
+    """プロセスの最大常駐メモリ（バイト）を返す（計測できない環境ではNone）"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト、macOSはバイト単位
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _memory_worker(work_dir: str, size_chars: int, template_path: str, output_chars: int, seed: int,
+                   result_queue) -> None:
+    """新しいプロセスで大きな開発日記1件を変換し、メモリの使用量を計測する"""
+    logging.basicConfig(level=logging.WARNING)
+    converter = DiaryConverter(template_path=template_path, backend=StubBackend(output_chars=output_chars, seed=seed))
+    processor = DocumentProcessor()
+    # 読み込みやテンプレートの解析など、1回目の変換で行う準備を済ませておく
+    warmup = generate_corpus(os.path.join(work_dir, "warmup"), 1, 2000, seed)[0]
+    converter.convert(warmup, os.path.join(work_dir, "warmup.md"))
+
+    source_file = generate_corpus(os.path.join(work_dir, "logs"), 1, size_chars, seed)[0]
+    source_bytes = os.path.getsize(source_file)
+    article = os.path.join(work_dir, "article.md")
+    with open(article, 'w', encoding='utf-8') as f:
+        f.write(synthetic_diary(size_chars, random.Random(seed)))
+
+    rss_before = _max_rss_bytes()
+    converter.convert(source_file, os.path.join(work_dir, "out-rss.md"))
+    rss_after = _max_rss_bytes()
+
+    tracemalloc.start()
+    converter.convert(source_file, os.path.join(work_dir, "out-heap.md"))
+    convert_heap = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    processor.process(article)
+    process_heap = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result_queue.put({
+        "source_bytes": source_bytes,
+        "convert_heap_peak": convert_heap,
+        "convert_rss_growth": None if rss_before is None else rss_after - rss_before,
+        "process_file_bytes": os.path.getsize(article),
+        "process_file_heap_peak": process_heap,
+    })
+
+
+def measure_memory(size_chars: int, template_path: str, output_chars: int = 4000, seed: int = 0,
+                   work_dir: Optional[str] = None, timeout: float = MEMORY_TIMEOUT) -> Dict[str, Any]:
+    """
+    size_chars 文字の開発日記1件の変換と、同じ大きさの記事ファイルの後処理のメモリ使用量を計測する
+
+    計測は新しいプロセスで行い、変換による最大常駐メモリの増加量と、tracemalloc による
+    Pythonのヒープの最大使用量（変換の開始時点からの差分）を返す。計測のプロセスが
+    結果を返さずに終了した場合（メモリ不足など）や timeout 秒を過ぎた場合は RuntimeError を送出する。
+    """
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="diary-converter-mem-")
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    process = context.Process(
+        target=_memory_worker,
+        args=(work_dir, size_chars, os.path.abspath(template_path), output_chars, seed, result_queue)
+    )
+    try:
+        process.start()
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                result = result_queue.get(timeout=1.0)
+                break
+            except queue.Empty:
+                # 結果を書き込んだ直後に終了した場合に備え、終了を確認した後にもう一度だけ読む
+                if not process.is_alive():
+                    try:
+                        result = result_queue.get(timeout=1.0)
+                        break
+                    except queue.Empty:
+                        raise RuntimeError(
+                            f"メモリ計測のプロセスが結果を返さずに終了しました（終了コード {process.exitcode}）"
+                        )
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"メモリ計測が {timeout:.0f} 秒以内に終わりませんでした")
+        process.join()
+    finally:
+        if process.is_alive():
+            process.terminate()
+            process.join()
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    result["size_chars"] = size_chars
+    return result
+
+
+def print_memory_report(results: List[Dict[str, Any]]) -> None:
+    """メモリの計測結果を表形式で表示する（倍率は元ファイルのバイト数に対する比）"""
+    mib = 1024 * 1024
+    print(f"\n{'文字数':>10}{'日記 (MiB)':>12}{'RSS増加 (MiB)':>15}{'ヒープ (MiB)':>14}{'倍率':>8}"
+          f"{'後処理ヒープ (MiB)':>20}{'倍率':>8}")
+    for r in results:
+        rss = "-" if r["convert_rss_growth"] is None else f"{r['convert_rss_growth'] / mib:.1f}"
+        print(f"{r['size_chars']:>10}{r['source_bytes'] / mib:>12.1f}{rss:>15}"
+              f"{r['convert_heap_peak'] / mib:>14.1f}{r['convert_heap_peak'] / r['source_bytes']:>8.2f}"
+              f"{r['process_file_heap_peak'] / mib:>20.1f}"
+              f"{r['process_file_heap_peak'] / r['process_file_bytes']:>8.2f}")
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any],
+                        tolerance: float = 0.2, min_delta: float = 0.0005) -> List[Dict[str, Any]]:
+    """
+    ベースラインよりp50が遅くなった段階を回帰として返す
+
+    Args:
+        results: run_benchmark の結果
+        baseline: 保存済みのベースライン
+        tolerance: 許容する悪化の割合（0.2なら20%）
+        min_delta: 回帰とみなす最小の悪化量（秒）。ごく短い段階の揺らぎを無視する
+
+    Returns:
+        回帰の一覧（scenario, stage, baseline, current, ratio）
+    """
+    if baseline.get("version") != BASELINE_VERSION:
+        raise ValueError(f"ベースラインの形式が異なります: version={baseline.get('version')}")
+    regressions = []
+    for name, scenario in results["scenarios"].items():
+        base_scenario = baseline.get("scenarios", {}).get(name)
+        if not base_scenario:
+            continue
+        for stage, stats in scenario["stages"].items():
+            if stage in SIMULATED_STAGES:
+                continue
+            base_stats = base_scenario["stages"].get(stage)
+            if not base_stats:
+                continue
+            current, previous = stats["p50"], base_stats["p50"]
+            if current > previous * (1.0 + tolerance) and current - previous > min_delta:
+                regressions.append({
+                    "scenario": name,
+                    "stage": stage,
+                    "baseline": previous,
+                    "current": current,
+                    "ratio": current / previous if previous > 0 else float("inf"),
+                })
+    return regressions
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    """計測結果を表形式で表示する"""
+    for name, scenario in results["scenarios"].items():
+        print(f"\n== {name}（{scenario['files']} 件 / {scenario['source_bytes']} バイト）")
+        print(f"{'段階':<14}{'p50 (ms)':>12}{'p95 (ms)':>12}{'平均 (ms)':>12}{'合計 (s)':>10}")
+        for stage, stats in scenario["stages"].items():
+            print(f"{stage:<14}{stats['p50'] * 1000:>12.2f}{stats['p95'] * 1000:>12.2f}"
+                  f"{stats['mean'] * 1000:>12.2f}{stats['total']:>10.3f}")
+        throughput = scenario["throughput"]
+        print(f"バッチ変換（{throughput['max_workers']} 並列）: {throughput['files_per_second']:.2f} 件/秒 / "
+              f"{throughput['bytes_per_second'] / 1024:.1f} KiB/秒 / 失敗 {throughput['failures']} 件")
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="変換パイプラインのベンチマーク")
+    parser.add_argument("--counts", type=_int_list, default=[10], help="コーパスの件数（カンマ区切り）")
+    parser.add_argument("--sizes", type=_int_list, default=[2000, 20000, 100000],
+                        help="開発日記1件の文字数（カンマ区切り）")
+    parser.add_argument("--template", default="./templates/zenn_template.md", help="使用するテンプレートファイルのパス")
+    parser.add_argument("--latency", type=float, default=0.05, help="スタブのLLM応答までの遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.5, help="遅延のゆらぎの割合")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="スタブの呼び出しが失敗する確率")
+    parser.add_argument("--output-chars", type=int, default=4000, help="スタブが生成する記事の文字数")
+    parser.add_argument("--max-workers", type=int, default=4, help="バッチ変換の同時実行数")
+    parser.add_argument("--seed", type=int, default=0, help="コーパスとスタブの乱数のシード")
+    parser.add_argument("--json", dest="json_path", default=None, help="計測結果をJSONで保存するパス")
+    parser.add_argument("--save-baseline", default=None, help="計測結果をベースラインとして保存するパス")
+    parser.add_argument("--baseline", default=None, help="比較するベースラインのパス")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="ベースラインに対して許容する悪化の割合")
+    parser.add_argument("--memory-sizes", type=_int_list, default=None,
+                        help="メモリを計測する開発日記の文字数（カンマ区切り。指定時はメモリの計測だけを行う）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.memory_sizes:
+        print_memory_report([
+            measure_memory(size, args.template, output_chars=args.output_chars, seed=args.seed)
+            for size in args.memory_sizes
+        ])
+        return
+
+    results = run_benchmark(
+        args.counts, args.sizes, args.template,
+        latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+        output_chars=args.output_chars, max_workers=args.max_workers, seed=args.seed
+    )
+    print_report(results)
+
+    for path in filter(None, [args.json_path, args.save_baseline]):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n計測結果を保存しました: {path}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, tolerance=args.tolerance)
+        if regressions:
+            print("\nベースラインからの回帰:")
+            for r in regressions:
+                print(f"  {r['scenario']} {r['stage']}: {r['baseline'] * 1000:.2f} ms -> "
+                      f"{r['current'] * 1000:.2f} ms（{r['ratio']:.2f} 倍）")
+            sys.exit(1)
+        print("\nベースラインからの回帰はありません")
+
+
+if __name__ == "__main__":
+    main()
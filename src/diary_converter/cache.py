@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+応答キャッシュモジュール
+
+LLM APIの応答を、最終的なプロンプト・モデル名・生成設定から計算した
+ハッシュをキーとしてディスクに保存する。入力が変わらない限り、
+再実行時にはネットワークにアクセスせずキャッシュから応答を返す。
+
+エントリの経過時間は作成時刻で判定する。作成時刻はファイル内に保存し、
+ファイルの更新時刻（mtime）にも同じ値を設定して以後は変えない。最終利用時刻は
+アクセス時刻（atime）に記録し、件数上限による削除の順序だけに使う。
+"""
+
+import os
+import json
+import time
+import hashlib
+from typing import Any, Optional
+
+from .output_writer import write_text_atomic
+from .source_reader import TEXT_CHUNK_CHARS
+
+# キーの計算でプロンプトの位置を示す目印（JSON中に同じ文字列が現れない値）
+_PROMPT_MARKER = "\x00diary-converter-prompt\x00"
+
+
+class ResponseCache:
+    """コンテンツアドレス方式の応答キャッシュクラス"""
+
+    def __init__(self, cache_dir: str, max_age: Optional[float] = None,
+                 max_entries: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            cache_dir: キャッシュファイルを保存するディレクトリ
+            max_age: エントリの有効期間（作成時刻からの秒数）。Noneの場合は無期限
+            max_entries: 保持する最大エントリ数。超えた分は最終利用が古い順に削除する
+        """
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.max_entries = max_entries
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(prompt: str, model_name: str, *configs: Any) -> str:
+        """
+        プロンプト・モデル名・設定からキャッシュキーを計算する
+
+        キーは {"prompt", "model", "configs"} のJSONのハッシュで、大きなプロンプトの
+        JSON表現とそのエンコード結果を丸ごと作らないよう、プロンプトは区切りながら加える。
+        """
+        payload = json.dumps(
+            {"prompt": _PROMPT_MARKER, "model": model_name, "configs": configs},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        head, _, tail = payload.partition(json.dumps(_PROMPT_MARKER, ensure_ascii=False))
+        digest = hashlib.sha256(head.encode('utf-8'))
+        digest.update(b'"')
+        for start in range(0, len(prompt), TEXT_CHUNK_CHARS):
+            escaped = json.dumps(prompt[start:start + TEXT_CHUNK_CHARS], ensure_ascii=False)
+            digest.update(escaped[1:-1].encode('utf-8'))
+        digest.update(b'"')
+        digest.update(tail.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        """キーに対応するキャッシュファイルのパスを返す"""
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        キャッシュから応答を取得する
+
+        Returns:
+            キャッシュされた応答テキスト。存在しないか期限切れの場合はNone
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if self.max_age is not None and time.time() - entry.get("created", 0) > self.max_age:
+            self._remove(path)
+            return None
+
+        # 最終利用時刻（atime）を更新し、件数上限による削除の対象から外れやすくする（mtime は作成時刻のまま）
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+        return entry.get("text")
+
+    def set(self, key: str, text: str, model_name: Optional[str] = None) -> None:
+        """応答をキャッシュに保存する（上限が設定されている場合は超えた分を削除する）"""
+        created = time.time()
+        entry = {"created": created, "model": model_name, "text": text}
+        path = self._entry_path(key)
+        # 作成時刻が入るため内容は毎回異なり、比較せずに書き込む
+        write_text_atomic(path, json.dumps(entry, ensure_ascii=False), skip_unchanged=False)
+        try:
+            os.utime(path, (created, created))
+        except OSError:
+            pass
+        if self.max_age is not None or self.max_entries is not None:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        期限切れのエントリと件数上限を超えたエントリを削除する
+
+        期限切れの判定には作成時刻（mtime）、件数上限による削除の順序には
+        最終利用時刻（atime）を使う。上限が設定されていない場合は走査しない。
+
+        Returns:
+            削除したエントリ数
+        """
+        if self.max_age is None and self.max_entries is None:
+            return 0
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_atime, stat.st_mtime, entry.path))
+
+        removed = 0
+        if self.max_age is not None:
+            threshold = time.time() - self.max_age
+            expired = [e for e in entries if e[1] < threshold]
+            entries = [e for e in entries if e[1] >= threshold]
+            for _, _, path in expired:
+                removed += self._remove(path)
+
+        if self.max_entries is not None and len(entries) > self.max_entries:
+            entries.sort()
+            for _, _, path in entries[:len(entries) - self.max_entries]:
+                removed += self._remove(path)
+        return removed
+
+    def clear(self) -> None:
+        """キャッシュを全て削除する"""
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".json"):
+                self._remove(entry.path)
+
+    @staticmethod
+    def _remove(path: str) -> int:
+        """ファイルを削除する（他スレッドが削除済みの場合は無視する）"""
+        try:
+            os.remove(path)
+            return 1
+        except FileNotFoundError:
+            return 0
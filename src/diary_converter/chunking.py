@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+分割変換モジュール
+
+長い開発日記を見出しや会話ログの区切りで分割し、部分ごとに記事の
+セクション構成に沿った要点を抽出するためのプロンプトを組み立てる。
+抽出した要点は最後に1回の統合パスで記事にまとめる。
+"""
+
+import re
+from typing import List
+
+# 日記を分割する境界（優先度順）
+_HEADING_BOUNDARY = re.compile(r'^(?=#{1,2} )', re.MULTILINE)
+_TURN_BOUNDARY = re.compile(r'^(?=### |- (?:ユーザー|LLM|User|Assistant)\s*[:：])', re.MULTILINE)
+_PARAGRAPH_BOUNDARY = re.compile(r'(?<=\n\n)')
+_LINE_BOUNDARY = re.compile(r'(?<=\n)')
+
+_LLM_INSTRUCTIONS_END = '<!-- LLM_INSTRUCTIONS_END -->'
+_SECTION_HEADING = re.compile(r'^## (.+?)\s*$', re.MULTILINE)
+
+
+def _split_at(text: str, pattern: re.Pattern) -> List[str]:
+    """境界のパターンの位置で分割する（空の断片は除く）"""
+    positions = [m.start() for m in pattern.finditer(text)] + [len(text)]
+    pieces = []
+    start = 0
+    for position in positions:
+        if position > start:
+            pieces.append(text[start:position])
+            start = position
+    return pieces
+
+
+def split_diary(content: str, max_chars: int) -> List[str]:
+    """
+    開発日記をmax_chars以下の部分に分割する
+
+    見出しの境界で分割し、それでも大きい部分は会話ログの発言や小見出し、
+    段落、行の境界の順に細かく分割する。小さな部分は隣同士でmax_charsまで結合する。
+
+    Args:
+        content: 開発日記の内容
+        max_chars: 1つの部分の最大文字数の目安
+
+    Returns:
+        分割された部分のリスト（結合すると元の内容に戻る）
+    """
+    if max_chars <= 0:
+        raise ValueError(f"max_chars は正の値で指定してください: {max_chars}")
+
+    boundaries = [_HEADING_BOUNDARY, _TURN_BOUNDARY, _PARAGRAPH_BOUNDARY, _LINE_BOUNDARY]
+
+    def split(text: str, level: int) -> List[str]:
+        if len(text) <= max_chars or level >= len(boundaries):
+            return [text]
+        pieces = []
+        for piece in _split_at(text, boundaries[level]):
+            pieces.extend(split(piece, level + 1))
+        return pieces
+
+    chunks: List[str] = []
+    for piece in split(content, 0):
+        if chunks and len(chunks[-1]) + len(piece) <= max_chars:
+            chunks[-1] += piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def extract_sections(template_content: str) -> List[str]:
+    """テンプレートのLLM指示より後ろにある記事のセクション見出し（## ）を返す"""
+    _, found, body = template_content.partition(_LLM_INSTRUCTIONS_END)
+    return _SECTION_HEADING.findall(body if found else template_content)
+
+
+def build_chunk_prompt(chunk: str, index: int, total: int, sections: List[str]) -> str:
+    """分割した部分から、記事のセクションごとの要点を抽出させるプロンプトを生成する"""
+    section_list = "\n".join(f"## {section}" for section in sections)
+    return f"""
+# 要点抽出の指示
+
+以下は長い開発日記を分割したうちの一部（{index}/{total}）です。
+この部分から、記事の次のセクションの材料になる内容を、該当するセクション見出しの下に箇条書きで抜き出してください。
+
+{section_list}
+
+- 該当する内容がないセクションは見出しごと省略してください。
+- コマンド、コード、エラーメッセージ、ファイル名などの技術的な内容は正確に保持してください。
+- 会話ログは、誰が何を考え、何を決めたかが分かるように要約してください。
+- 前置きや結びの文は不要です。
+
+# 開発日記（部分 {index}/{total}）
+{chunk}
+"""
+
+
+def merge_chunk_notes(notes: List[str]) -> str:
+    """部分ごとに抽出した要点を、統合パスに渡す1つの入力にまとめる"""
+    total = len(notes)
+    parts = [
+        f"（この開発日記は長いため{total}個の部分に分割し、部分ごとに記事のセクション別の要点を抽出しています。"
+        "すべての部分を統合して1つの記事にまとめてください。）"
+    ]
+    for index, note in enumerate(notes, 1):
+        parts.append(f"# 部分 {index}/{total} の要点\n{note.strip()}")
+    return "\n\n".join(parts) + "\n"
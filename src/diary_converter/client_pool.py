@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+モデルクライアントプールモジュール
+
+Gemini SDKの設定（genai.configure）と GenerativeModel の生成を、プロセス内で
+一度だけ行って共有する。モデルはモデル名と生成設定をキーに保持され、
+バッチ変換や常駐サービスの各リクエストから同じインスタンスが再利用される。
+"""
+
+import json
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+
+def load_genai():
+    """
+    Gemini SDK（google.generativeai）を読み込む
+
+    SDKはgRPC/protobufを含む大きな依存関係を読み込むため、モジュールの読み込み時ではなく
+    API呼び出しの直前に初めて読み込む。2回目以降はsys.modulesのキャッシュが返る。
+    """
+    import google.generativeai as genai
+    return genai
+
+
+def _freeze(value: Any) -> str:
+    """設定値をプールのキーとして使える文字列にする"""
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class ModelPool:
+    """モデル名と設定をキーに GenerativeModel を共有する、スレッドセーフなプール"""
+
+    def __init__(self):
+        """初期化"""
+        self._models: Dict[Tuple[Any, ...], Any] = {}
+        self._configured_key: Optional[str] = None
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0}
+
+    def configure(self, api_key: str):
+        """
+        SDKにAPIキーを設定し、SDKのモジュールを返す
+
+        genai.configure はプロセス全体の設定のため、同じキーでは2回目以降は何もしない。
+        """
+        genai = load_genai()
+        with self._lock:
+            if self._configured_key != api_key:
+                genai.configure(api_key=api_key)
+                self._configured_key = api_key
+        return genai
+
+    def get(self, model_name: str, generation_config: Dict[str, Any],
+            safety_settings: Any, **model_kwargs: Any):
+        """
+        条件に合うモデルを返す（なければ生成してプールに保持する）
+
+        Args:
+            model_name: モデル名
+            generation_config: 生成設定
+            safety_settings: セーフティ設定
+            **model_kwargs: GenerativeModel に渡すその他の引数
+
+        Returns:
+            GenerativeModel のインスタンス
+        """
+        factory = load_genai().GenerativeModel
+        # SDKのクラス自体もキーに含め、差し替えられた場合（テストでのパッチなど）は作り直す
+        key = (factory, model_name, _freeze(generation_config), _freeze(safety_settings), _freeze(model_kwargs))
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self.stats["reused"] += 1
+                return model
+            model = factory(
+                model_name=model_name,
+                generation_config=generation_config,
+                safety_settings=safety_settings,
+                **model_kwargs
+            )
+            self._models[key] = model
+            self.stats["created"] += 1
+            return model
+
+    def clear(self) -> None:
+        """保持しているモデルと設定の記録を破棄する"""
+        with self._lock:
+            self._models.clear()
+            self._configured_key = None
+
+
+# プロセス全体で共有する既定のプール
+default_model_pool = ModelPool()
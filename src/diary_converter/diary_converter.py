@@ -7,13 +7,217 @@ articles配下にZenn公開用日記として配置するスクリプト
 """
 
 import os
+import json
 import sys
+import glob
+import time
 import argparse
-import frontmatter
-import google.generativeai as genai
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 import re
 
+from .cache import ResponseCache
+from .manifest import BuildManifest, content_hash
+from .document_processor import DocumentProcessor
+from .scheduler import RequestScheduler
+from .tokens import estimate_tokens, estimate_output_tokens
+from .client_pool import load_genai
+from .backends import (
+    GeminiBackend, HedgedBackend, add_backend_arguments, backend_from_args, latency_policy_from_args
+)
+from .metrics import MetricsCollector, timed, add_time, increment, current_record
+from .output_writer import OutputWriter
+from .source_reader import read_text
+from .preprocess import add_preprocess_arguments, preprocessor_from_args
+from .archive_index import (
+    ArchiveIndex, DATE_PATTERN, DEFAULT_ARCHIVE_INDEX_PATH, parse_diary_filename
+)
+from .validator import ArticleSpec, validate_article, repair_locally, build_repair_prompt, apply_repair
+from .chunking import split_diary, extract_sections, build_chunk_prompt, merge_chunk_notes
+
+def __getattr__(name):
+    """モジュール属性 genai を遅延読み込みする（テストでのパッチ対象としても使われる）"""
+    if name == "genai":
+        return load_genai()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# --incremental 指定時にマニフェストのパスが省略された場合の保存先
+DEFAULT_MANIFEST_PATH = ".diary-converter-manifest.json"
+
+# Gemini APIの生成設定（キャッシュキーにも含まれる）
+GENERATION_CONFIG = {
+    "temperature": 0.2,
+    "top_p": 0.8,
+    "top_k": 40,
+    "max_output_tokens": 4096,
+}
+
+SAFETY_SETTINGS = [
+    {
+        "category": "HARM_CATEGORY_HARASSMENT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_HATE_SPEECH",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    }
+]
+
+# テンプレート内のプレースホルダーと置換に使う値の名前
+TEMPLATE_PLACEHOLDERS = {
+    "[LLM Model名]": "model_name",
+    "[連番]": "serial_number",
+    "[前回の記事スラッグ]": "prev_article_slug",
+}
+_PLACEHOLDER_PATTERN = re.compile("|".join(re.escape(p) for p in TEMPLATE_PLACEHOLDERS))
+_LLM_INSTRUCTIONS_PATTERN = re.compile(
+    r'<!-- LLM_INSTRUCTIONS_START -->(.*?)<!-- LLM_INSTRUCTIONS_END -->', re.DOTALL
+)
+
+# プロセス内で保持する解析済みテンプレートの最大数
+TEMPLATE_CACHE_SIZE = 32
+
+
+class PreparedTemplate(str):
+    """プレースホルダー置換済みのテンプレート（置換済みのLLM指示部分を保持する）
+
+    static_instructions は日記ごとに変わるプレースホルダー（連番・前回の記事スラッグ）を
+    置換せずに残したLLM指示部分で、variables はそれらのプレースホルダーに入る値。
+    プレフィックス再利用モードでは、前者を共有のシステム指示として送る。
+    """
+
+    def __new__(cls, content, instructions, static_instructions=None, variables=None):
+        prepared = super().__new__(cls, content)
+        prepared.instructions = instructions
+        prepared.static_instructions = static_instructions
+        prepared.variables = variables or {}
+        return prepared
+
+
+class CompiledTemplate:
+    """解析済みテンプレート
+
+    テンプレートを一度だけ走査し、プレースホルダーの位置とLLM指示部分の範囲を
+    記録しておく。render() はその結果を使って1回の結合で置換済みテンプレートを作る。
+    """
+
+    def __init__(self, content, path=None, mtime=None):
+        """初期化（テンプレートを解析する）"""
+        self.content = content
+        self.path = path
+        self.mtime = mtime
+        # (開始位置, 終了位置, プレースホルダー) のリスト
+        self.placeholders = [
+            (m.start(), m.end(), m.group(0)) for m in _PLACEHOLDER_PATTERN.finditer(content)
+        ]
+
+        match = _LLM_INSTRUCTIONS_PATTERN.search(content)
+        bounds = [match.start(1), match.end(1)] if match else []
+
+        # 文字列とプレースホルダーが交互に並ぶセグメントに分割する
+        # LLM指示部分の境界でもセグメントを区切り、その範囲をインデックスで記録する
+        self.segments = []
+        self.instructions_range = None
+        cuts = sorted(
+            [(start, end, placeholder) for start, end, placeholder in self.placeholders]
+            + [(pos, pos, None) for pos in bounds]
+        )
+        position = 0
+        instructions_start = None
+        for start, end, placeholder in cuts:
+            self.segments.append((False, content[position:start]))
+            if placeholder is None:
+                if instructions_start is None:
+                    instructions_start = len(self.segments)
+                else:
+                    self.instructions_range = (instructions_start, len(self.segments))
+            else:
+                self.segments.append((True, placeholder))
+            position = end
+        self.segments.append((False, content[position:]))
+
+    def render(self, model_name, serial_number, prev_article_slug):
+        """プレースホルダーを置換したテンプレートを返す（前回の記事スラッグが空ならプレースホルダーを残す）"""
+        values = {
+            "[LLM Model名]": model_name,
+            "[連番]": serial_number,
+            "[前回の記事スラッグ]": prev_article_slug or "[前回の記事スラッグ]",
+        }
+        pieces = [values[text] if is_placeholder else text for is_placeholder, text in self.segments]
+        instructions = ""
+        static_instructions = ""
+        variables = {}
+        if self.instructions_range:
+            start, end = self.instructions_range
+            instructions = "".join(pieces[start:end])
+            # 実行中に変わらないモデル名だけを置換した指示と、日記ごとに変わる値
+            static_pieces = []
+            for is_placeholder, text in self.segments[start:end]:
+                if is_placeholder and text != "[LLM Model名]":
+                    variables[text] = values[text]
+                    static_pieces.append(text)
+                else:
+                    static_pieces.append(values[text] if is_placeholder else text)
+            static_instructions = "".join(static_pieces)
+        return PreparedTemplate("".join(pieces), instructions, static_instructions, variables)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(content):
+    """テンプレート文字列を解析する（同じ内容の解析結果は再利用する）"""
+    return CompiledTemplate(content)
+
+
+class _TemplateFileCache:
+    """解決済みパスをキーに、更新時刻で無効化する解析済みテンプレートのLRUキャッシュ"""
+
+    def __init__(self, maxsize=TEMPLATE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """テンプレートファイルを解析済みの状態で返す（変更がなければ再読み込みしない）"""
+        stat = os.stat(path)
+        mtime = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            compiled = self._entries.get(path)
+            if compiled is not None and compiled.mtime == mtime:
+                self._entries.move_to_end(path)
+                return compiled
+
+        with open(path, 'r', encoding='utf-8') as file:
+            compiled = CompiledTemplate(file.read(), path=path, mtime=mtime)
+
+        with self._lock:
+            self._entries[path] = compiled
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def clear(self):
+        """キャッシュを空にする"""
+        with self._lock:
+            self._entries.clear()
+
+
+_template_file_cache = _TemplateFileCache()
+
+
 class TemplateManager:
     """テンプレート管理クラス（シンプル化版）"""
     
@@ -21,9 +225,16 @@ class TemplateManager:
         """初期化"""
         self.template_path = template_path
         self.debug = debug
+        self._resolved_path = None
         
     def resolve_template_path(self):
-        """テンプレートパスを解決する"""
+        """テンプレートパスを解決する（結果はインスタンスごとに保持する）"""
+        if self._resolved_path is None:
+            self._resolved_path = self._resolve_template_path()
+        return self._resolved_path
+
+    def _resolve_template_path(self):
+        """環境に応じてテンプレートパスを解決する"""
         # GitHub Actions環境かどうかを判定
         github_actions = os.environ.get("GITHUB_ACTIONS") == "true"
         action_path = os.environ.get("GITHUB_ACTION_PATH")
@@ -60,6 +271,10 @@ class TemplateManager:
             
     def load_template(self):
         """テンプレートファイルを読み込む"""
+        return self.load_compiled_template().content
+
+    def load_compiled_template(self):
+        """テンプレートファイルを解析済みの状態で読み込む（変更がなければキャッシュを使う）"""
         try:
             template_path = self.resolve_template_path()
             
@@ -74,67 +289,178 @@ class TemplateManager:
                         print(f"GITHUB_ACTION_PATH: {os.environ.get('GITHUB_ACTION_PATH')}")
                 raise FileNotFoundError(f"テンプレートファイル '{template_path}' が見つかりません")
 
-            with open(template_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-            return content
+            return _template_file_cache.get(template_path)
         except Exception as e:
             raise IOError(f"テンプレートファイル読み込み中にエラーが発生しました: {e}")
     
     def prepare_template(self, template_content, model_name, serial_number, prev_article_slug):
-        """テンプレートを準備する（プレースホルダーを置換する）"""
-        # テンプレートのプレースホルダーを置換
-        prepared_template = template_content
-
-        # モデル名の置換
-        prepared_template = prepared_template.replace("[LLM Model名]", model_name)
+        """テンプレートを準備する（プレースホルダーを置換する）
 
-        # 連番の置換
-        prepared_template = prepared_template.replace("[連番]", serial_number)
-        
-        # 前回の記事スラッグの置換
-        if prev_article_slug:
-            # 単純な文字列置換に変更
-            prepared_template = prepared_template.replace("[前回の記事スラッグ]", prev_article_slug)
-        # else:
-            # スラッグがない場合、リンク行全体を削除するか、プレースホルダーを残すか検討が必要
-            # 現状ではプレースホルダーが残る
-        
-        return prepared_template
+        template_content には解析済みテンプレートまたはテンプレート文字列を渡せる。
+        前回の記事スラッグが空の場合、プレースホルダーはそのまま残る。
+        """
+        if not isinstance(template_content, CompiledTemplate):
+            template_content = compile_template(template_content)
+        return template_content.render(model_name, serial_number, prev_article_slug)
 
 class DiaryConverter:
     """開発日記をZenn公開用の記事に変換するクラス"""
 
     def __init__(self, model="gemini-2.0-flash-001",
-                 debug=False, prev_article_slug=None, template_path=None):
-        """初期化"""
+                 debug=False, prev_article_slug=None, template_path=None,
+                 cache_dir=None, no_cache=False, cache_max_age=None, cache_max_entries=None,
+                 manifest_path=None, incremental=False, stream=False,
+                 max_retries=5, requests_per_minute=None, tokens_per_minute=None,
+                 post_process=True, dry_run=False, chunk_size=None, chunk_workers=4,
+                 model_pool=None, backend=None, metrics=None, archive_index_path=None,
+                 reuse_prefix=False, hedge_after=None, fallback_models=None, hedges=1,
+                 validate=False, repair_attempts=1, preprocessor=None):
+        """初期化
+
+        cache_dir を指定すると、Gemini APIの応答をディスクにキャッシュする。
+        no_cache=True の場合はキャッシュを読まずにAPIを呼び出し、結果でキャッシュを更新する。
+        manifest_path を指定すると変換結果をマニフェストに記録し、incremental=True の場合は
+        変換元・テンプレート・モデル・出力に影響する設定・出力のいずれも変わっていない日記の変換をスキップする。
+        stream=True の場合はストリーミング応答を受け取りながら後処理を適用して書き出す。
+        API呼び出しは分間リクエスト数・トークン数の制限を守り、再試行可能なエラーでは
+        max_retries 回まで指数バックオフで再試行する。
+        post_process=True の場合は、生成された記事に DocumentProcessor の修正を適用してから書き出す。
+        dry_run=True の場合はAPIキーを要求せず、プロンプトの生成と見積もりだけを行える。
+        chunk_size（文字数）を指定すると、それより長い日記を分割して部分ごとの要点を
+        最大 chunk_workers 並列で抽出し、最後に1回の統合パスで記事にまとめる。
+        モデルは model_pool（省略時はプロセス全体で共有するプール）から取得し、再利用する。
+        backend（LLMBackend）を指定すると、Gemini APIの代わりにそのバックエンドで生成する。
+        metrics（MetricsCollector）を指定すると、変換ごとの段階別の所要時間やAPI呼び出しの回数を記録する。
+        archive_index_path を指定するとアーカイブインデックスに記事のスラッグを記録し、
+        prev_article_slug が指定されていない場合は前回の記事スラッグをインデックスから補う。
+        reuse_prefix=True の場合は、テンプレートの固定のLLM指示をシステム指示として分離し、
+        連番などの日記ごとの値はプロンプトで渡す（システム指示はバッチ全体で同じ内容になるが、
+        呼び出しごとに送信され、入力トークンとして課金される）。
+        hedge_after（秒）または fallback_models を指定すると、応答が遅いかエラーのリクエストに対して
+        代替モデル（指定がなければ同じモデル、最大 hedges 回）へのリクエストを送り、最初の結果を使う。
+        validate=True の場合は生成された記事をテンプレートの構成と照らし合わせ、欠落したり
+        壊れたりした部分だけを最大 repair_attempts 回まで再生成して差し込む。
+        preprocessor（SourcePreprocessor）を指定すると、読み込んだ日記からノイズ・重複・
+        長すぎるコードブロックを省いてからプロンプトを組み立てる（マニフェストのハッシュも前処理後の内容で計算する）。
+        """
         self.model_name = model
         # template_path引数が指定されていれば使用し、なければ環境変数から取得、それもなければデフォルト値
         template_path = template_path or os.environ.get("TEMPLATE_PATH", "./templates/zenn_template.md")
         self.template_manager = TemplateManager(template_path, debug)
         self.debug = debug
         self.prev_article_slug = prev_article_slug  # 前回の記事スラッグ
+        self.cache = ResponseCache(cache_dir, cache_max_age, cache_max_entries) if cache_dir else None
+        self.no_cache = no_cache
+        if incremental and not manifest_path:
+            manifest_path = DEFAULT_MANIFEST_PATH
+        self.manifest = BuildManifest(manifest_path) if manifest_path else None
+        self.incremental = incremental
+        self.stream = stream
+        self.document_processor = DocumentProcessor(debug=debug) if post_process else None
+        self.scheduler = RequestScheduler(
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            max_retries=max_retries
+        )
+        self.dry_run = dry_run
+        self.chunk_size = chunk_size
+        self.chunk_workers = chunk_workers
+        self.model_pool = model_pool
+        self.backend = backend
+        self.metrics = metrics
+        self.archive_index = ArchiveIndex(archive_index_path) if archive_index_path else None
+        self.output_writer = OutputWriter()
+        self.reuse_prefix = reuse_prefix
+        # 共有プレフィックス（システム指示）の利用状況と、再送を省いた入力トークン数（概算）
+        self.prefix_stats = {"requests": 0, "prefixes": 0, "prefix_tokens": 0}
+        self._seen_prefixes = set()
+        self._prefix_lock = threading.Lock()
+        self.hedge_after = hedge_after
+        self.fallback_models = list(fallback_models or [])
+        self.hedges = hedges
+        self.validate = validate
+        self.repair_attempts = repair_attempts
+        self.preprocessor = preprocessor
+        # 前処理で削った量の合計
+        self.preprocess_stats = {"files": 0, "bytes_removed": 0, "tokens_removed": 0,
+                                 "duplicate_blocks": 0, "truncated_fences": 0}
+        self._preprocess_lock = threading.Lock()
         self.setup_api()
 
     def setup_api(self):
-        """Gemini APIの設定"""
-        api_key = os.environ.get("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY 環境変数が設定されていません")
-        genai.configure(api_key=api_key)
+        """Gemini APIの設定（APIキーの確認のみ行い、SDKは初回のAPI呼び出し時に読み込む）"""
+        if self.backend is None:
+            api_key = os.environ.get("GOOGLE_API_KEY")
+            if not api_key and not self.dry_run:
+                raise ValueError("GOOGLE_API_KEY 環境変数が設定されていません")
+            self.backend = GeminiBackend(
+                self.model_name, api_key, GENERATION_CONFIG, SAFETY_SETTINGS, model_pool=self.model_pool
+            )
+        if self.hedge_after is not None or self.fallback_models:
+            # 遅い応答やエラーを重複リクエスト・代替モデルで補う
+            self.backend = HedgedBackend(
+                self.backend,
+                [self.backend.with_model(name) for name in self.fallback_models],
+                hedge_after=self.hedge_after,
+                hedges=self.hedges,
+                scheduler=self.scheduler
+            )
+
+    def _check_can_call(self):
+        """ドライランではバックエンドを呼び出さない"""
+        if self.dry_run:
+            raise RuntimeError("ドライランではAPIを呼び出せません")
 
     def read_source_diary(self, file_path):
-        """開発日記ファイルを読み込む"""
+        """開発日記ファイルを読み込む（バイナリで一定の大きさずつ読んでデコードし、ファイル全体のバイト列を一度に確保しない）"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-            return content
+            return read_text(file_path)
         except Exception as e:
             raise IOError(f"ファイル読み込み中にエラーが発生しました: {e}")
 
+    def output_settings(self):
+        """
+        生成される記事に影響する設定を返す
+
+        前処理・後処理・検証・分割変換・プレフィックス再利用・ストリーミング・代替モデルの設定で、
+        ビルドマニフェストではこのハッシュが前回と異なる日記を再変換する。
+        """
+        return {
+            "preprocess": self.preprocessor.settings() if self.preprocessor is not None else None,
+            "post_process": self.document_processor is not None,
+            "validate": self.validate,
+            "repair_attempts": self.repair_attempts if self.validate else None,
+            "chunk_size": self.chunk_size,
+            "reuse_prefix": self.reuse_prefix,
+            "stream": self.stream,
+            "fallback_models": self.fallback_models,
+        }
+
+    def settings_hash(self):
+        """output_settings() のハッシュを返す"""
+        return content_hash(json.dumps(self.output_settings(), sort_keys=True))
+
+    def preprocess_source(self, content):
+        """前処理が有効なら日記を圧縮し、削った量を統計とメトリクスに記録する"""
+        if self.preprocessor is None:
+            return content
+        with timed("preprocess"):
+            content, stats = self.preprocessor.process(content)
+        with self._preprocess_lock:
+            self.preprocess_stats["files"] += 1
+            for name in ("bytes_removed", "tokens_removed", "duplicate_blocks", "truncated_fences"):
+                self.preprocess_stats[name] += stats[name]
+        increment("preprocess_bytes_removed", stats["bytes_removed"])
+        increment("preprocess_tokens_removed", stats["tokens_removed"])
+        if self.debug:
+            print(f"前処理: {stats['bytes_removed']} バイト / 推定 {stats['tokens_removed']} トークンを削減"
+                  f"（重複 {stats['duplicate_blocks']} 件 / 省略したコードブロック {stats['truncated_fences']} 件）")
+        return content
+
     def extract_date_from_filename(self, file_path):
         """ファイル名から日付を抽出する"""
         filename = os.path.basename(file_path)
-        date_match = re.search(r'(\d{4}-\d{2}-\d{2})', filename)
+        date_match = DATE_PATTERN.search(filename)
         if date_match:
             return date_match.group(1)
         # 日付が見つからない場合はNoneを返すなど、エラーハンドリングを検討
@@ -144,9 +470,9 @@ class DiaryConverter:
         """ファイル名から通し番号を抽出する"""
         filename = os.path.basename(file_path)
         # 新しい命名規則 (YYYY-MM-DD_{通し番号}_development.md) から通し番号を抽出
-        match = re.search(r'^\d{4}-\d{2}-\d{2}_(\d+)_development\.md$', filename)
-        if match:
-            return match.group(1)
+        parsed = parse_diary_filename(filename)
+        if parsed:
+            return parsed[1]
         # 通し番号が見つからない場合はNoneを返すなど、エラーハンドリングを検討
         return None
 
@@ -155,12 +481,15 @@ class DiaryConverter:
         if not template_content:
             raise ValueError("テンプレート内容が提供されていません")
         
-        # LLM指示部分を抽出
-        llm_instructions_match = re.search(r'<!-- LLM_INSTRUCTIONS_START -->(.*?)<!-- LLM_INSTRUCTIONS_END -->', template_content, re.DOTALL)
-        llm_instructions = llm_instructions_match.group(1) if llm_instructions_match else ""
-        
-        # プロンプトを生成
-        prompt = f"""
+        with timed("prompt"):
+            # LLM指示部分を抽出（準備済みテンプレートは抽出済みの指示を持っている）
+            llm_instructions = getattr(template_content, "instructions", None)
+            if llm_instructions is None:
+                llm_instructions_match = _LLM_INSTRUCTIONS_PATTERN.search(template_content)
+                llm_instructions = llm_instructions_match.group(1) if llm_instructions_match else ""
+
+            # プロンプトを生成
+            prompt = f"""
 {llm_instructions}
 
 # 入力された開発日記
@@ -168,57 +497,228 @@ class DiaryConverter:
 """
         return prompt
 
+    def build_request(self, content, template_content):
+        """
+        送信するシステム指示とプロンプトの組を返す
+
+        プレフィックス再利用モードでない場合（またはテンプレートが固定の指示を持たない場合）は
+        システム指示をNoneとし、プロンプトにLLM指示を含める。
+        """
+        static_instructions = getattr(template_content, "static_instructions", None)
+        if not self.reuse_prefix or not static_instructions:
+            return None, self.generate_prompt(content, template_content)
+
+        with timed("prompt"):
+            lines = [f"- `{placeholder}`: {value}" for placeholder, value in template_content.variables.items()]
+            values = ""
+            if lines:
+                values = "# この記事の値\n指示の中のプレースホルダーは次の値に置き換えてください。\n" + "\n".join(lines) + "\n\n"
+            prompt = f"""
+{values}# 入力された開発日記
+{content}
+"""
+        return static_instructions, prompt
+
+    def response_cache_key(self, prompt, system_instruction=None):
+        """プロンプトに対する応答キャッシュのキーを返す（キャッシュが無効な場合はNone）"""
+        if self.cache is None:
+            return None
+        configs = self.backend.cache_configs()
+        if system_instruction is not None:
+            configs += ({"system_instruction": system_instruction},)
+        return ResponseCache.make_key(prompt, self.backend.model_name, *configs)
+
+    def _account_prefix(self, system_instruction, prefix_tokens):
+        """共有プレフィックスの利用を記録する（システム指示は呼び出しごとに送信されるため、毎回のトークン数を数える）"""
+        with self._prefix_lock:
+            self.prefix_stats["requests"] += 1
+            self.prefix_stats["prefix_tokens"] += prefix_tokens
+            if system_instruction not in self._seen_prefixes:
+                self._seen_prefixes.add(system_instruction)
+                self.prefix_stats["prefixes"] += 1
+        increment("prefix_tokens", prefix_tokens)
+
     def convert_with_gemini(self, content, template_content):
         """Gemini APIを使用して開発日記を変換する（シンプル化版）"""
-        prompt = self.generate_prompt(content, template_content)
+        system_instruction, prompt = self.build_request(content, template_content)
+        return self.generate_with_gemini(prompt, system_instruction=system_instruction)
+
+    def generate_with_gemini(self, prompt, system_instruction=None):
+        """プロンプトをGemini APIに送信し、生成されたテキストを返す（キャッシュ・再試行付き）"""
+        cache_key = self.response_cache_key(prompt, system_instruction)
+        if cache_key is not None:
+            if not self.no_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    if self.debug:
+                        print(f"キャッシュから応答を取得しました: {cache_key}")
+                    increment("cache_hits")
+                    return cached
 
+        prompt_tokens = estimate_tokens(prompt)
+        increment("prompt_tokens", prompt_tokens)
+        # システム指示もリクエストの入力トークンとしてレート制限の対象になる
+        prefix_tokens = estimate_tokens(system_instruction) if system_instruction else 0
         try:
-            # 最新バージョンのライブラリに対応した呼び出し方法
-            generation_config = {
-                "temperature": 0.2,
-                "top_p": 0.8,
-                "top_k": 40,
-                "max_output_tokens": 4096,
-            }
+            self._check_can_call()
+            with timed("api"):
+                text = self.scheduler.call(
+                    self.backend.generate, prompt, system_instruction=system_instruction,
+                    estimated_tokens=prompt_tokens + prefix_tokens
+                )
+            if system_instruction:
+                self._account_prefix(system_instruction, prefix_tokens)
+        except Exception as e:
+            raise RuntimeError(f"{self.backend.label}でのエラー: {e}")
+        increment("response_tokens", estimate_tokens(text))
+
+        if cache_key is not None:
+            self.cache.set(cache_key, text, model_name=self.backend.model_name)
+        return text
 
-            safety_settings = [
-                {
-                    "category": "HARM_CATEGORY_HARASSMENT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_HATE_SPEECH",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                }
+    def summarize_chunks(self, content, template_content):
+        """
+        長い開発日記を分割し、部分ごとに記事のセクション別の要点を並列に抽出する
+
+        抽出した要点を結合したものを返す。これを通常の変換の入力にすることで、
+        最後の統合パスがテンプレートのセクション構成に沿った記事にまとめる。
+        """
+        chunks = split_diary(content, self.chunk_size)
+        sections = extract_sections(template_content)
+        total = len(chunks)
+        if self.debug:
+            print(f"開発日記を{total}個の部分に分割して要点を抽出します")
+
+        prompts = [
+            build_chunk_prompt(chunk, index, total, sections)
+            for index, chunk in enumerate(chunks, 1)
+        ]
+        with timed("chunk_map"), ThreadPoolExecutor(max_workers=min(self.chunk_workers, total)) as executor:
+            # ワーカースレッドでも同じ変換のメトリクスに記録されるよう、コンテキストを引き継ぐ
+            futures = [
+                executor.submit(contextvars.copy_context().run, self.generate_with_gemini, prompt)
+                for prompt in prompts
             ]
+            notes = [future.result() for future in futures]
+        return merge_chunk_notes(notes)
 
-            model = genai.GenerativeModel(
-                model_name=self.model_name,
-                generation_config=generation_config,
-                safety_settings=safety_settings
-            )
+    def validate_and_repair(self, article, content, template_content):
+        """
+        記事をテンプレートの構成と照らし合わせ、問題のある部分だけを直した記事を返す
+
+        テンプレートで決まる部分はその場で直し、欠落したり壊れたりしたセクションと
+        Frontmatterの項目だけを1回のリクエストで再生成して差し込む（記事全体は再生成しない）。
+        """
+        with timed("validate"):
+            spec = ArticleSpec(template_content)
+            issues = validate_article(article, spec)
+        if not issues:
+            return article
+        increment("validation_issues", len(issues))
+        if self.debug:
+            print(f"記事の検証で{len(issues)}件の問題が見つかりました: {', '.join(map(str, issues))}")
 
-            response = model.generate_content(prompt)
-            return response.text
+        attempts = 0
+        while issues:
+            article, issues = repair_locally(article, spec, issues)
+            if not issues or attempts >= self.repair_attempts:
+                break
+            attempts += 1
+            if self.debug:
+                print(f"部分的に再生成します: {', '.join(issue.target for issue in issues)}")
+            response = self.generate_with_gemini(build_repair_prompt(content, spec, issues))
+            increment("regenerated_sections", len(issues))
+            with timed("validate"):
+                article = apply_repair(article, response, spec, issues)
+                issues = validate_article(article, spec)
+
+        if issues and self.debug:
+            print(f"修正できなかった問題: {', '.join(map(str, issues))}")
+        return article
+
+    def convert_with_gemini_stream(self, content, template_content):
+        """Gemini APIのストリーミング応答で開発日記を変換する（生成されたテキストを断片ごとに返す）"""
+        system_instruction, prompt = self.build_request(content, template_content)
+
+        cache_key = self.response_cache_key(prompt, system_instruction)
+        if cache_key is not None:
+            if not self.no_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    if self.debug:
+                        print(f"キャッシュから応答を取得しました: {cache_key}")
+                    increment("cache_hits")
+                    yield cached
+                    return
+
+        # キャッシュに保存する場合のみ全文を保持する
+        pieces = [] if cache_key is not None else None
+        prompt_tokens = estimate_tokens(prompt)
+        increment("prompt_tokens", prompt_tokens)
+        prefix_tokens = estimate_tokens(system_instruction) if system_instruction else 0
+        # API呼び出しの時間には、呼び出し元が断片を処理している間（yield中）を含めない
+        started = time.perf_counter()
+        try:
+            self._check_can_call()
+            # 再試行できるのは応答の受信を開始するまで
+            response = self.scheduler.call(
+                self.backend.generate_stream, prompt, system_instruction=system_instruction,
+                estimated_tokens=prompt_tokens + prefix_tokens
+            )
+            if system_instruction:
+                self._account_prefix(system_instruction, prefix_tokens)
+            for text in response:
+                if pieces is not None:
+                    pieces.append(text)
+                increment("response_tokens", estimate_tokens(text))
+                add_time("api", time.perf_counter() - started)
+                started = None
+                yield text
+                started = time.perf_counter()
         except Exception as e:
-            raise RuntimeError(f"Gemini APIでのエラー: {e}")
+            raise RuntimeError(f"{self.backend.label}でのエラー: {e}")
+        finally:
+            if started is not None:
+                add_time("api", time.perf_counter() - started)
+
+        if cache_key is not None:
+            self.cache.set(cache_key, "".join(pieces), model_name=self.backend.model_name)
+
+    def save_converted_article_stream(self, chunks, file_path):
+        """
+        ストリーミングで受け取った記事を後処理しながら一時ファイルに書き出し、
+        完了後にアトミックにリネームする（途中で失敗した場合は既存の出力を残し、
+        内容が既存の出力と同じ場合は既存の出力に触れない）
+        """
+        show_progress = sys.stderr.isatty()
+        written = 0
+        try:
+            if self.document_processor is not None:
+                chunks = self.document_processor.process_stream(chunks)
+            with self.output_writer.open_atomic(file_path) as file:
+                for piece in chunks:
+                    file.write(piece)
+                    written += len(piece)
+                    if show_progress:
+                        print(f"\r生成中: {written} 文字", end="", file=sys.stderr, flush=True)
+        finally:
+            if show_progress:
+                print(file=sys.stderr)
+
+        if self.debug:
+            print(f"記事を保存しました: {file_path} ({written} 文字)")
 
     def save_converted_article(self, content, file_path):
-        """変換された記事を保存する"""
+        """変換された記事をアトミックに保存する（内容が既存の記事と同じ場合は書き込まずにFalseを返す）"""
         try:
-            # 出力ディレクトリが存在しない場合は作成
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            # 出力ディレクトリの作成はライターが一度だけ行う
+            written = self.output_writer.write_text(file_path, content)
 
-            with open(file_path, 'w', encoding='utf-8') as file:
-                file.write(content)
+            if not written:
+                increment("unchanged_writes")
+                if self.debug:
+                    print(f"記事に変更がないため書き込みをスキップしました: {file_path}")
+                return False
 
             if self.debug:
                 print(f"記事を保存しました: {file_path}")
@@ -226,45 +726,154 @@ class DiaryConverter:
                 print("-----------------------------------")
                 print(content)
                 print("-----------------------------------")
+            return True
         except Exception as e:
             raise IOError(f"ファイル保存中にエラーが発生しました: {e}")
 
-    def convert(self, source_file, destination_file):
-        """開発日記をZenn記事に変換する（シンプル化版）"""
-        try:
-            # 入力ファイルを読み込む
-            content = self.read_source_diary(source_file)
+    def convert(self, source_file, destination_file, template_content=None):
+        """開発日記をZenn記事に変換する（シンプル化版）
 
-            # テンプレートを読み込む
-            template_content = self.template_manager.load_template()
+        インクリメンタルモードで出力が最新の場合は変換せずにFalseを返す。
+        """
+        converted = self._convert_file(source_file, destination_file, template_content)
+        if self.manifest is not None:
+            self.manifest.save()
+        if self.archive_index is not None:
+            self.archive_index.save()
+        return converted
 
-            # ファイル名から日付と通し番号を抽出
-            date = self.extract_date_from_filename(source_file)
-            serial_number = self.extract_serial_number_from_filename(source_file)
+    def resolve_prev_article_slug(self, source_file):
+        """前回の記事スラッグを返す（指定がなければアーカイブインデックスから引く）"""
+        if self.prev_article_slug or self.archive_index is None:
+            return self.prev_article_slug
+        slug = self.archive_index.previous_slug(source_file)
+        if self.debug:
+            print(f"前回の記事スラッグ（インデックス）: {slug}")
+        return slug
 
-            if not date or not serial_number:
-                raise ValueError(f"ファイル名から日付または通し番号を抽出できませんでした: {source_file}")
+    def prepare_source(self, source_file, template_content=None, content=None):
+        """
+        開発日記を読み込み、その日記用に準備したテンプレートと組にして返す
 
-            if self.debug:
-                print(f"日付: {date}")
-                print(f"通し番号: {serial_number}")
+        content を渡した場合は読み込みも前処理も行わない（前処理済みの内容を渡す）。
+        """
+        # 入力ファイルを読み込む
+        if content is None:
+            with timed("read"):
+                content = self.read_source_diary(source_file)
+            content = self.preprocess_source(content)
+
+        # テンプレートを読み込む（解析済みテンプレートはキャッシュから再利用される）
+        if template_content is None:
+            with timed("template_load"):
+                template_content = self.template_manager.load_compiled_template()
+
+        # ファイル名から日付と通し番号を抽出
+        date = self.extract_date_from_filename(source_file)
+        serial_number = self.extract_serial_number_from_filename(source_file)
+
+        if not date or not serial_number:
+            raise ValueError(f"ファイル名から日付または通し番号を抽出できませんでした: {source_file}")
+
+        if self.debug:
+            print(f"日付: {date}")
+            print(f"通し番号: {serial_number}")
 
-            # テンプレートを準備（プレースホルダーを置換）
+        # テンプレートを準備（プレースホルダーを置換）
+        with timed("template_prepare"):
             prepared_template = self.template_manager.prepare_template(
                 template_content,
                 self.model_name,
                 serial_number,
-                self.prev_article_slug
+                self.resolve_prev_article_slug(source_file)
             )
+        return content, prepared_template
 
-            # Gemini APIで変換
-            # LLMはテンプレート構造を含む完全な記事を生成すると期待される
-            llm_generated_content = self.convert_with_gemini(
-                content, prepared_template # プロンプト生成には準備済みテンプレートを使う
+    def _convert_file(self, source_file, destination_file, template_content=None, content=None, variant=None):
+        """
+        1ファイルを変換する（マニフェストへの記録は行うが保存はしない）
+
+        content を渡すと日記を読み込まずにその内容を使う。variant は同じ日記の2つ目以降の
+        出力（ファンアウト）を表し、マニフェストでは別の出力として記録し、
+        アーカイブインデックスには記録しない。
+        """
+        if self.metrics is None:
+            return self._convert_file_unrecorded(source_file, destination_file, template_content, content, variant)
+        with self.metrics.conversion(source_file) as record:
+            converted = self._convert_file_unrecorded(
+                source_file, destination_file, template_content, content, variant
             )
+            if not converted:
+                record.status = "skipped"
+            return converted
+
+    def _convert_file_unrecorded(self, source_file, destination_file, template_content=None,
+                                 content=None, variant=None):
+        """1ファイルを変換する（_convert_file の本体。メトリクスの記録は呼び出し元で行う）"""
+        try:
+            content, prepared_template = self.prepare_source(source_file, template_content, content)
+
+            if self.manifest is not None:
+                source_hash = content_hash(content)
+                template_hash = content_hash(prepared_template)
+                settings_hash = self.settings_hash()
+                if self.incremental and self.manifest.is_up_to_date(
+                        source_file, destination_file, source_hash, template_hash, self.backend.model_name,
+                        variant=variant, settings_hash=settings_hash):
+                    if self.debug:
+                        print(f"出力が最新のため変換をスキップします: {source_file}")
+                    return False
+
+            if self.chunk_size and len(content) > self.chunk_size:
+                # 長い日記は部分ごとの要点に置き換え、統合パスで記事にまとめる
+                content = self.summarize_chunks(content, prepared_template)
+
+            if self.stream:
+                # 生成されたそばから後処理を適用して一時ファイルに書き出す
+                # （書き出しの時間には後処理を含み、応答を待つ時間は含めない）
+                record = current_record()
+                api_before = record.stages.get("api", 0.0) if record else 0.0
+                with timed("write"):
+                    self.save_converted_article_stream(
+                        self.convert_with_gemini_stream(content, prepared_template),
+                        destination_file
+                    )
+                if record is not None:
+                    add_time("write", api_before - record.stages.get("api", 0.0))
+                if self.validate:
+                    # 書き出した記事を検証し、直した場合だけ書き直す
+                    article = self.read_source_diary(destination_file)
+                    repaired = self.validate_and_repair(article, content, prepared_template)
+                    if repaired != article:
+                        with timed("write"):
+                            self.save_converted_article(repaired, destination_file)
+            else:
+                # Gemini APIで変換
+                # LLMはテンプレート構造を含む完全な記事を生成すると期待される
+                llm_generated_content = self.convert_with_gemini(
+                    content, prepared_template # プロンプト生成には準備済みテンプレートを使う
+                )
+
+                # 書き出す前に後処理を適用する
+                if self.document_processor is not None:
+                    with timed("post_process"):
+                        llm_generated_content = self.document_processor.process_text(llm_generated_content)
+
+                if self.validate:
+                    llm_generated_content = self.validate_and_repair(
+                        llm_generated_content, content, prepared_template
+                    )
 
-            # LLMが生成した内容をそのまま保存
-            self.save_converted_article(llm_generated_content, destination_file)
+                with timed("write"):
+                    self.save_converted_article(llm_generated_content, destination_file)
+
+            if self.manifest is not None:
+                self.manifest.record(
+                    source_file, destination_file, source_hash, template_hash, self.backend.model_name,
+                    variant=variant, settings_hash=settings_hash
+                )
+            if self.archive_index is not None and variant is None:
+                self.archive_index.record_output(source_file, destination_file)
 
             return True
         except Exception as e:
@@ -272,31 +881,462 @@ class DiaryConverter:
                 print(f"エラー: {e}")
             raise
 
+    def dry_run_file(self, source_file, template_content=None):
+        """
+        APIを呼び出さずに、変換で送信するプロンプトと入出力トークン数の見積もりを返す
+
+        戻り値の辞書は source, prompt, system_instruction, input_tokens, prefix_tokens,
+        estimated_output_tokens, exceeds_output_limit, cached（キャッシュ済みでAPI呼び出しが不要か）,
+        chunks を持つ。prefix_tokens はプレフィックス再利用時のシステム指示のトークン数。
+        分割変換の対象になる日記では、prompt と input_tokens は部分ごとの要点抽出の
+        プロンプトのもの（統合パスの入力は要点の長さが分からないため含めない）になる。
+        """
+        content, prepared_template = self.prepare_source(source_file, template_content)
+        chunks = 1
+        system_instruction = None
+        if self.chunk_size and len(content) > self.chunk_size:
+            parts = split_diary(content, self.chunk_size)
+            sections = extract_sections(prepared_template)
+            chunks = len(parts)
+            prompt = "".join(
+                build_chunk_prompt(part, index, chunks, sections) for index, part in enumerate(parts, 1)
+            )
+        else:
+            system_instruction, prompt = self.build_request(content, prepared_template)
+        output_tokens = estimate_output_tokens(content, prepared_template)
+        cache_key = self.response_cache_key(prompt, system_instruction)
+        return {
+            "source": source_file,
+            "prompt": prompt,
+            "system_instruction": system_instruction,
+            "chunks": chunks,
+            "input_tokens": estimate_tokens(prompt),
+            "prefix_tokens": estimate_tokens(system_instruction) if system_instruction else 0,
+            "estimated_output_tokens": output_tokens,
+            "exceeds_output_limit": output_tokens > GENERATION_CONFIG["max_output_tokens"],
+            "cached": cache_key is not None and not self.no_cache and self.cache.get(cache_key) is not None,
+        }
+
+    def dry_run_batch(self, source):
+        """ディレクトリまたはglobパターンに一致する開発日記のドライラン結果を返す（失敗は error に記録）"""
+        source_files = collect_source_files(source)
+        if not source_files:
+            raise FileNotFoundError(f"変換対象の開発日記が見つかりません: {source}")
+        template_content = self.template_manager.load_compiled_template()
+        results = []
+        for source_file in source_files:
+            try:
+                result = self.dry_run_file(source_file, template_content)
+                result["error"] = None
+            except Exception as e:
+                result = {"source": source_file, "error": str(e)}
+            results.append(result)
+        return results
+
+    def convert_batch(self, source, output_dir, max_workers=4, output_pattern=None):
+        """ディレクトリまたはglobパターンに一致する開発日記をまとめて変換する
+
+        source にはディレクトリ・ファイル・globパターンのいずれか、またはそれらのリストを指定する。
+        出力先は output_dir 直下の同じファイル名で、output_pattern を指定した場合は
+        パターンから組み立てる（build_destination を参照）。
+        変換はスレッドプールで並列に実行され、APIの設定とテンプレートは
+        全ファイルで共有される。戻り値はファイルごとの結果の辞書のリスト
+        （source, destination, success, skipped, error）で、入力順に並ぶ。
+        """
+        source_files = collect_source_files(source)
+        if not source_files:
+            raise FileNotFoundError(f"変換対象の開発日記が見つかりません: {source}")
+        if max_workers < 1:
+            raise ValueError(f"max_workers は1以上で指定してください: {max_workers}")
+        destinations = {
+            source_file: build_destination(source_file, output_dir, output_pattern) for source_file in source_files
+        }
+        if len({os.path.abspath(path) for path in destinations.values()}) != len(destinations):
+            raise ValueError(f"出力先が重複しています。出力パターンを見直してください: {output_pattern}")
+
+        template_content = self.template_manager.load_compiled_template()
+
+        recorded = {}
+        if self.archive_index is not None:
+            # 並列に変換しても前回の記事スラッグが引けるよう、出力先を先に記録する
+            # （変換に失敗した日記は保存する前に元に戻す）
+            for source_file in source_files:
+                recorded[source_file] = self.archive_index.record_output(source_file, destinations[source_file])
+        succeeded = set()
+
+        def convert_one(source_file):
+            destination_file = destinations[source_file]
+            result = {
+                "source": source_file,
+                "destination": destination_file,
+                "success": False,
+                "skipped": False,
+                "error": None,
+            }
+            try:
+                converted = self._convert_file(source_file, destination_file, template_content)
+                result["success"] = True
+                result["skipped"] = not converted
+                succeeded.add(source_file)
+            except Exception as e:
+                result["error"] = str(e)
+            return result
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                return list(executor.map(convert_one, source_files))
+        finally:
+            if self.manifest is not None:
+                self.manifest.save()
+            if self.archive_index is not None:
+                for source_file, previous_slug in recorded.items():
+                    if source_file not in succeeded:
+                        self.archive_index.restore_output(source_file, previous_slug)
+                self.archive_index.save()
+
+
+    def convert_fanout(self, source_file, targets, max_workers=None):
+        """
+        1つの開発日記を複数のテンプレートで変換し、それぞれの出力先に書き出す
+
+        targets は (テンプレートのパス, 出力先) のリストで、テンプレートのパスがNoneの場合は
+        既定のテンプレートを使う。日記の読み込みは1回だけ行い、解析済みテンプレートと
+        バックエンドを共有して、最大 max_workers（省略時は出力先の数）並列で生成する。
+        最初の出力先は通常の変換と同じ扱いで、アーカイブインデックスにはこの記事を記録する。
+        戻り値は出力先ごとの結果の辞書のリスト（source, template, destination, success,
+        skipped, error）で、targets の順に並ぶ。
+        """
+        if not targets:
+            raise ValueError("出力先が指定されていません")
+        destinations = [os.path.abspath(destination) for _, destination in targets]
+        if len(set(destinations)) != len(destinations):
+            raise ValueError("ファンアウトの出力先が重複しています")
+
+        # 日記とテンプレートは出力先の数にかかわらず1回だけ読み込む
+        content = self.preprocess_source(self.read_source_diary(source_file))
+        compiled = {}
+        for template_path, _ in targets:
+            if template_path not in compiled:
+                manager = self.template_manager if template_path is None else TemplateManager(template_path, self.debug)
+                compiled[template_path] = (manager.resolve_template_path(), manager.load_compiled_template())
+
+        recorded = None
+        if self.archive_index is not None:
+            recorded = self.archive_index.record_output(source_file, targets[0][1])
+        succeeded = set()
+
+        def convert_one(index):
+            template_path, destination_file = targets[index]
+            resolved_path, template_content = compiled[template_path]
+            result = {
+                "source": source_file,
+                "template": resolved_path,
+                "destination": destination_file,
+                "success": False,
+                "skipped": False,
+                "error": None,
+            }
+            try:
+                converted = self._convert_file(
+                    source_file, destination_file, template_content, content,
+                    variant=None if index == 0 else destinations[index]
+                )
+                result["success"] = True
+                result["skipped"] = not converted
+                succeeded.add(index)
+            except Exception as e:
+                result["error"] = str(e)
+            return result
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers or len(targets)) as executor:
+                return list(executor.map(convert_one, range(len(targets))))
+        finally:
+            if self.manifest is not None:
+                self.manifest.save()
+            if self.archive_index is not None:
+                if 0 not in succeeded:
+                    self.archive_index.restore_output(source_file, recorded)
+                self.archive_index.save()
+
+
+def parse_fanout_target(value):
+    """--fanout の値（テンプレートのパス=出力先）を (テンプレートのパス, 出力先) に分解する"""
+    template_path, separator, destination = value.partition("=")
+    if not separator or not template_path or not destination:
+        raise argparse.ArgumentTypeError(f"テンプレートのパス=出力先 の形式で指定してください: {value}")
+    return template_path, destination
+
+
+def collect_source_files(source):
+    """
+    ディレクトリまたはglobパターンから変換対象の開発日記ファイルを収集する
+
+    source には複数のディレクトリ・globパターンのリストも指定できる。
+    複数のパターンに一致したファイルは1回だけ返す。
+    """
+    patterns = [source] if isinstance(source, str) else list(source)
+    source_files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*.md")
+        source_files.update(path for path in glob.glob(pattern) if os.path.isfile(path))
+    return sorted(source_files)
+
+
+def build_destination(source_file, output_dir, output_pattern=None):
+    """
+    開発日記の出力先のパスを組み立てる
+
+    output_pattern を省略した場合は output_dir 直下の同じファイル名を返す。
+    パターンには {name}（ファイル名）・{stem}（拡張子を除いたファイル名）・
+    {date}（日付）・{number}（通し番号）を使え、output_dir からの相対パスとして扱う
+    （日付と通し番号はファイル名から取れない場合は空文字列）。
+    """
+    filename = os.path.basename(source_file)
+    if output_pattern is None:
+        return os.path.join(output_dir, filename)
+    parsed = parse_diary_filename(filename)
+    date_match = DATE_PATTERN.search(filename)
+    fields = {
+        "name": filename,
+        "stem": os.path.splitext(filename)[0],
+        "date": parsed[0] if parsed else (date_match.group(1) if date_match else ""),
+        "number": parsed[1] if parsed else "",
+    }
+    try:
+        relative_path = output_pattern.format(**fields)
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(f"出力パターンが不正です（使える項目: {', '.join('{' + k + '}' for k in fields)}）: {output_pattern}") from e
+    return os.path.join(output_dir, relative_path)
+
+
+def print_dry_run_report(results):
+    """ドライランの見積もり結果を表示する"""
+    limit = GENERATION_CONFIG["max_output_tokens"]
+    estimated = [r for r in results if not r.get("error")]
+    for r in results:
+        if r.get("error"):
+            print(f"エラー: {r['source']}: {r['error']}")
+            continue
+        notes = []
+        if r["exceeds_output_limit"]:
+            notes.append(f"出力上限 {limit} トークンを超える見込み")
+        if r["cached"]:
+            notes.append("キャッシュ済み")
+        if r.get("chunks", 1) > 1:
+            notes.append(f"{r['chunks']} 分割")
+        if r.get("prefix_tokens"):
+            notes.append(f"共有指示 {r['prefix_tokens']} トークン")
+        note = f" ({', '.join(notes)})" if notes else ""
+        print(f"{r['source']}: 入力 {r['input_tokens']} トークン / 出力 {r['estimated_output_tokens']} トークン（見込み）{note}")
+    api_calls = [r for r in estimated if not r["cached"]]
+    print(f"合計: {len(estimated)} 件 / API呼び出し {len(api_calls)} 件 / "
+          f"入力 {sum(r['input_tokens'] for r in api_calls)} トークン / "
+          f"出力 {sum(r['estimated_output_tokens'] for r in api_calls)} トークン（見込み） / "
+          f"出力上限超過の見込み {sum(1 for r in estimated if r['exceeds_output_limit'])} 件")
+    prefixed = [r for r in api_calls if r.get("prefix_tokens")]
+    if prefixed:
+        total = sum(r["prefix_tokens"] for r in prefixed)
+        kinds = len({r["system_instruction"] for r in prefixed})
+        print(f"共有指示: {len(prefixed)} 件で {kinds} 種類 / {total} トークン（入力トークンに含む。呼び出しごとに送信）")
+
+
+def print_prefix_stats(stats):
+    """共有プレフィックス（システム指示）の利用の統計を表示する"""
+    print(f"共有指示: {stats['requests']} 回の呼び出しで {stats['prefixes']} 種類 / "
+          f"送信した指示 {stats['prefix_tokens']} トークン（概算）")
+
+
+def print_preprocess_stats(stats):
+    """前処理で削った量の統計を表示する"""
+    print(f"前処理: {stats['files']} 件で {stats['bytes_removed']} バイト / 推定 {stats['tokens_removed']} トークンを削減"
+          f"（重複したブロック {stats['duplicate_blocks']} 件 / 省略したコードブロック {stats['truncated_fences']} 件）")
+
+
+def print_scheduler_stats(stats):
+    """API呼び出しの再試行・待機の統計を表示する"""
+    print(f"API呼び出し: {stats['requests']:.0f} 回 / 再試行 {stats['retries']:.0f} 回 / "
+          f"レート制限待機 {stats['throttled_seconds']:.1f} 秒 / バックオフ待機 {stats['backoff_seconds']:.1f} 秒")
+
+
+def print_hedge_stats(stats):
+    """重複リクエスト・代替モデルの統計を表示する"""
+    wins = ", ".join(f"{name} {count} 回" for name, count in sorted(stats["wins"].items()))
+    print(f"レイテンシポリシー: 呼び出し {stats['requests']} 回 / 追加リクエスト {stats['hedged']} 回 / "
+          f"破棄した結果 {stats['discarded']} 件 / 採用: {wins or 'なし'}")
+
+
+def write_metrics(metrics, json_path=None, prom_path=None):
+    """メトリクスをJSONのサマリーとPrometheusのテキスト形式で書き出す"""
+    try:
+        if json_path:
+            metrics.write_json(json_path)
+        if prom_path:
+            metrics.write_prometheus(prom_path)
+    except OSError as e:
+        print(f"メトリクスの書き出しに失敗しました: {e}")
+
+
+def print_batch_summary(results):
+    """バッチ変換の結果サマリーを表示する"""
+    converted = [r for r in results if r["success"] and not r.get("skipped")]
+    skipped = [r for r in results if r.get("skipped")]
+    failed = [r for r in results if not r["success"]]
+    for r in skipped:
+        print(f"スキップ（最新）: {r['source']}")
+    for r in failed:
+        print(f"失敗: {r['source']}: {r['error']}")
+    print(f"バッチ変換完了: 変換 {len(converted)} 件 / スキップ {len(skipped)} 件 / "
+          f"失敗 {len(failed)} 件 / 合計 {len(results)} 件")
+
+
+def print_fanout_summary(results):
+    """ファンアウト変換の結果サマリーを表示する"""
+    for r in results:
+        if not r["success"]:
+            print(f"失敗: {r['destination']} ({r['template']}): {r['error']}")
+        elif r["skipped"]:
+            print(f"スキップ（最新）: {r['destination']}")
+        else:
+            print(f"変換: {r['destination']} ({r['template']})")
+    failed = sum(1 for r in results if not r["success"])
+    print(f"ファンアウト変換完了: {len(results) - failed} 件成功 / 失敗 {failed} 件")
+
+
 def main():
     """メイン関数"""
     parser = argparse.ArgumentParser(description="開発日記をZenn公開用に変換するツール")
-    parser.add_argument("source", help="変換元の開発日記ファイルパス")
-    parser.add_argument("destination", help="変換先のZenn記事ファイルパス")
+    parser.add_argument("source", nargs="+",
+                        help="変換元の開発日記ファイルパス（バッチ時はディレクトリまたはglobパターン、複数指定可）")
+    parser.add_argument("destination", help="変換先のZenn記事ファイルパス（バッチ時は出力ディレクトリ）")
     parser.add_argument("--model", default="gemini-2.0-flash-001", help="使用するGeminiモデル名")
     parser.add_argument("--debug", action="store_true", help="デバッグモードを有効にする")
     parser.add_argument("--template", default="./templates/zenn_template.md", help="使用するテンプレートファイルのパス")
     # --project-name と --issue-number は削除
     parser.add_argument("--prev-article", default="", help="前回の記事スラッグ")
+    parser.add_argument("--archive-index", nargs="?", const=DEFAULT_ARCHIVE_INDEX_PATH, default=None,
+                        help=f"アーカイブインデックスのパス。指定すると前回の記事スラッグを自動で補う（既定値: {DEFAULT_ARCHIVE_INDEX_PATH}）")
+    parser.add_argument("--fanout", action="append", type=parse_fanout_target, default=[], metavar="TEMPLATE=DEST",
+                        help="同じ開発日記を別のテンプレートでも変換して DEST に書き出す（複数指定可）")
+    parser.add_argument("--batch", action="store_true", help="ディレクトリまたはglobパターンの開発日記をまとめて変換する")
+    parser.add_argument("--max-workers", type=int, default=4, help="バッチ変換時の最大同時実行数")
+    parser.add_argument("--output-pattern", default=None,
+                        help="バッチ変換時の出力先のパターン（出力ディレクトリからの相対パス。{name}・{stem}・{date}・{number} を使える）")
+    parser.add_argument("--cache-dir", default=os.environ.get("DIARY_CONVERTER_CACHE_DIR"),
+                        help="API応答キャッシュのディレクトリ（指定時のみキャッシュを有効化）")
+    parser.add_argument("--no-cache", action="store_true", help="キャッシュを読まずにAPIを呼び出す（結果はキャッシュに保存）")
+    parser.add_argument("--cache-max-age", type=float, default=None, help="キャッシュの有効期間（秒）")
+    parser.add_argument("--cache-max-entries", type=int, default=None, help="キャッシュの最大エントリ数")
+    parser.add_argument("--manifest", default=None, help=f"ビルドマニフェストのパス（--incremental時の既定値: {DEFAULT_MANIFEST_PATH}）")
+    parser.add_argument("--incremental", action="store_true", help="変更のない開発日記の変換をスキップする")
+    parser.add_argument("--stream", action="store_true", help="ストリーミング応答を受け取りながら後処理して書き出す")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="この文字数より長い日記を分割し、部分ごとに並列で要点を抽出してから統合する")
+    parser.add_argument("--chunk-workers", type=int, default=4, help="分割変換時の部分ごとの最大同時実行数")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="APIを呼び出さず、送信するプロンプトとトークン数の見積もりを表示する（APIキー不要）")
+    parser.add_argument("--no-post-process", action="store_true", help="生成された記事に後処理（DocumentProcessor）を適用しない")
+    parser.add_argument("--max-retries", type=int, default=5, help="再試行可能なAPIエラーの最大再試行回数")
+    parser.add_argument("--rpm", type=float, default=None, help="1分あたりの最大APIリクエスト数")
+    parser.add_argument("--tpm", type=float, default=None, help="1分あたりの最大入力トークン数（概算）")
+    parser.add_argument("--reuse-prefix", action="store_true",
+                        help="テンプレートの固定のLLM指示をシステム指示として分離し、バッチ全体で同じ先頭部分にする")
+    parser.add_argument("--validate", action="store_true",
+                        help="生成された記事をテンプレートの構成で検証し、問題のある部分だけを再生成する")
+    parser.add_argument("--repair-attempts", type=int, default=1, help="部分的な再生成の最大回数")
+    parser.add_argument("--metrics-json", default=None, help="変換ごとの段階別メトリクスのサマリーを書き出すJSONファイル")
+    parser.add_argument("--metrics-prom", default=None, help="メトリクスを書き出すPrometheusテキスト形式のファイル")
+    add_backend_arguments(parser)
+    add_preprocess_arguments(parser)
     args = parser.parse_args()
+    try:
+        preprocessor = preprocessor_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
 
+    metrics = MetricsCollector() if args.metrics_json or args.metrics_prom else None
     converter = DiaryConverter(
         model=args.model,
         debug=args.debug,
         template_path=args.template,
         # project_name と issue_number は削除
-        prev_article_slug=args.prev_article
+        prev_article_slug=args.prev_article,
+        cache_dir=args.cache_dir,
+        no_cache=args.no_cache,
+        cache_max_age=args.cache_max_age,
+        cache_max_entries=args.cache_max_entries,
+        manifest_path=args.manifest,
+        incremental=args.incremental,
+        stream=args.stream,
+        max_retries=args.max_retries,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        post_process=not args.no_post_process,
+        dry_run=args.dry_run,
+        chunk_size=args.chunk_size,
+        chunk_workers=args.chunk_workers,
+        backend=backend_from_args(args),
+        metrics=metrics,
+        archive_index_path=args.archive_index,
+        reuse_prefix=args.reuse_prefix,
+        validate=args.validate,
+        repair_attempts=args.repair_attempts,
+        preprocessor=preprocessor,
+        **latency_policy_from_args(args)
     )
 
+    batch_mode = args.batch or len(args.source) > 1 or os.path.isdir(args.source[0])
+    if args.output_pattern and not batch_mode:
+        parser.error("--output-pattern はバッチ変換でのみ使えます")
+    source = args.source if batch_mode else args.source[0]
+    if args.fanout and (batch_mode or args.dry_run):
+        parser.error("--fanout は単一ファイルの変換でのみ使えます")
+    if args.dry_run:
+        try:
+            if batch_mode:
+                results = converter.dry_run_batch(source)
+            else:
+                results = [converter.dry_run_file(source)]
+                if results[0]["system_instruction"]:
+                    print(results[0]["system_instruction"])
+                print(results[0]["prompt"])
+        except Exception as e:
+            print(f"エラー: {e}")
+            sys.exit(1)
+        print_dry_run_report(results)
+        if preprocessor is not None:
+            print_preprocess_stats(converter.preprocess_stats)
+        return
+
     try:
-        converter.convert(args.source, args.destination)
+        if batch_mode:
+            results = converter.convert_batch(source, args.destination, max_workers=args.max_workers,
+                                              output_pattern=args.output_pattern)
+            print_batch_summary(results)
+            if not all(r["success"] for r in results):
+                sys.exit(1)
+        elif args.fanout:
+            results = converter.convert_fanout(source, [(None, args.destination)] + args.fanout)
+            print_fanout_summary(results)
+            if not all(r["success"] for r in results):
+                sys.exit(1)
+        elif not converter.convert(source, args.destination):
+            print(f"スキップ（最新）: {source}")
     except Exception as e:
         print(f"エラー: {e}")
         sys.exit(1)
+    finally:
+        if batch_mode or args.debug:
+            print_scheduler_stats(converter.scheduler.stats)
+            if args.reuse_prefix:
+                print_prefix_stats(converter.prefix_stats)
+            if preprocessor is not None:
+                print_preprocess_stats(converter.preprocess_stats)
+            if isinstance(converter.backend, HedgedBackend):
+                print_hedge_stats(converter.backend.stats)
+        if metrics is not None:
+            write_metrics(metrics, args.metrics_json, args.metrics_prom)
 
 if __name__ == "__main__":
     main()
@@ -4,140 +4,547 @@
 
 Diary-Converterで生成されたドキュメントの後処理を行うモジュール。
 LLMによって生成されたドキュメントの一般的な問題を修正します。
+
+修正内容はルールとしてレジストリに登録され、各ルールは適用対象の領域
+（フロントマター・本文・コードブロック）と対象行のパターンを宣言する。
+エンジンはドキュメントを先頭から1行ずつ1回だけ走査し、その行の領域と
+パターンに一致するルールだけを適用する。
 """
 
 import os
 import sys
 import re
+import glob
 import argparse
 import logging
-from typing import List, Callable, Dict, Any, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Pattern, Type
+
+from .output_writer import OutputWriter
+from .source_reader import iter_text
+
+
+# ストリーミング処理で末尾に保留する部分（空白と閉じのコードブロックマーカー候補）
+_STREAM_TAIL_PATTERN = re.compile(r'\s*`{0,3}\Z')
+_MARKDOWN_OPENERS = ('```markdown', '```Markdown')
+
+# コードブロックの開始・終了行
+_FENCE_PATTERN = re.compile(r'^ {0,3}(`{3,}|~{3,})(.*)$')
+_FENCE_FIRST_CHARS = ' `~'
+
+# ルールの適用対象の領域
+SCOPE_DOCUMENT = "document"
+SCOPE_FRONTMATTER = "frontmatter"
+SCOPE_BODY = "body"
+SCOPE_CODE = "code"
+
+
+class Rule:
+    """後処理ルールの基底クラス"""
+
+    # ルール名（レジストリのキー）
+    name: str = ""
+    # 適用対象の領域
+    scope: str = SCOPE_BODY
+    # 適用対象の行のパターン（Noneの場合は領域内の全行）
+    pattern: Optional[Pattern] = None
+
+
+class LineRule(Rule):
+    """1行単位で適用するルール"""
+
+    def matches(self, line: str) -> bool:
+        """行がこのルールの対象か判定する"""
+        return self.pattern is None or self.pattern.search(line) is not None
+
+    def apply(self, line: str) -> str:
+        """
+        行を修正する
+
+        Args:
+            line: 改行を含まない行
+
+        Returns:
+            修正後の行
+        """
+        raise NotImplementedError
+
+
+class DocumentRule(Rule):
+    """ドキュメント全体の先頭・末尾に作用するルール（行分割の前に適用される）"""
+
+    scope = SCOPE_DOCUMENT
+
+    def transform(self, chunks: Iterable[str], logger: logging.Logger) -> Iterator[str]:
+        """ドキュメントの断片を受け取り、修正後の断片を返す"""
+        raise NotImplementedError
+
+
+# 登録済みルール（ルール名 → ルールクラス）
+RULE_REGISTRY: Dict[str, Type[Rule]] = {}
+
+
+def register_rule(rule_class: Type[Rule]) -> Type[Rule]:
+    """ルールクラスをレジストリに登録するデコレーター"""
+    if not rule_class.name:
+        raise ValueError(f"ルール名が設定されていません: {rule_class.__name__}")
+    RULE_REGISTRY[rule_class.name] = rule_class
+    return rule_class
+
+
+def remove_markdown_code_block(content: str, logger: logging.Logger) -> str:
+    """マークダウンファイル全体を囲むコードブロックを削除する（ドキュメント全体版）"""
+    # 文書全体がコードブロックで囲まれているかチェック
+    if content.startswith('```') and content.endswith('```'):
+        logger.debug("ドキュメント全体がコードブロックで囲まれています。削除します。")
+
+        # 先頭行を削除
+        first_line_end = content.find('\n')
+        if first_line_end != -1:
+            content = content[first_line_end + 1:]
+
+        # 末尾の```を削除
+        if content.endswith('```'):
+            content = content[:-3].rstrip()
+
+        logger.debug("コードブロックを削除しました。")
+
+    # 先頭が```markdownで始まるケース
+    if content.startswith(_MARKDOWN_OPENERS):
+        logger.debug("ドキュメントが```markdownで始まっています。削除します。")
+
+        # 先頭行を削除
+        first_line_end = content.find('\n')
+        if first_line_end != -1:
+            content = content[first_line_end + 1:]
+
+        # 末尾の```を削除
+        if content.endswith('```'):
+            content = content[:-3].rstrip()
+
+        logger.debug("```markdownブロックを削除しました。")
+
+    return content
+
+
+@register_rule
+class CodeBlockWrapperRule(DocumentRule):
+    """
+    ドキュメント全体を囲むコードブロックを削除するルール
+
+    remove_markdown_code_block と同じ結果になるように、先頭行が確定するまでと、
+    末尾の閉じマーカーになり得る部分（空白と```）だけを保留し、それ以外は
+    到着したそばから返す。先頭が```markdown以外のコードブロックで始まる場合は
+    末尾を見るまで判定できないため、全体を受け取ってから処理する。
+    """
+
+    name = "remove_markdown_code_block"
+
+    def transform(self, chunks: Iterable[str], logger: logging.Logger) -> Iterator[str]:
+        pending = ""
+        strip_closing = None  # 先頭行の判定前はNone
+        buffer_all = False
+
+        for chunk in chunks:
+            pending += chunk
+            if strip_closing is None:
+                if any(opener.startswith(pending) for opener in _MARKDOWN_OPENERS):
+                    # ```markdown かどうかまだ判定できない
+                    continue
+                if pending.startswith(_MARKDOWN_OPENERS):
+                    first_line_end = pending.find('\n')
+                    if first_line_end == -1:
+                        continue
+                    logger.debug("ドキュメントが```markdownで始まっています。先頭行を削除します。")
+                    pending = pending[first_line_end + 1:]
+                    strip_closing = True
+                else:
+                    buffer_all = pending.startswith('```')
+                    strip_closing = False
+            if buffer_all:
+                continue
+            if strip_closing:
+                cut = _STREAM_TAIL_PATTERN.search(pending).start()
+                if cut:
+                    yield pending[:cut]
+                    pending = pending[cut:]
+            elif pending:
+                yield pending
+                pending = ""
+
+        if buffer_all or strip_closing is None:
+            # 先頭行を判定できなかった場合はドキュメント全体版にフォールバックする
+            pending = remove_markdown_code_block(pending, logger)
+        elif strip_closing and pending.endswith('```'):
+            pending = pending[:-3].rstrip()
+            logger.debug("```markdownブロックを削除しました。")
+        if pending:
+            yield pending
+
+
+@register_rule
+class FrontmatterFormatRule(LineRule):
+    """
+    フロントマターの値のうち、引用符なしでコロンを含むもの（YAMLとして壊れる）を
+    ダブルクォートで囲むルール
+    """
+
+    name = "fix_frontmatter_format"
+    scope = SCOPE_FRONTMATTER
+    pattern = re.compile(r'^([A-Za-z_][\w-]*):[ \t]+(\S.*?)[ \t]*$')
+    _needs_quoting = re.compile(r':(?:[ \t]|$)')
+
+    def matches(self, line: str) -> bool:
+        match = self.pattern.match(line)
+        if not match:
+            return False
+        value = match.group(2)
+        # 引用符・フロー形式・ブロック形式の値と、コメントを含む値はそのままにする
+        if value[0] in '"\'[{|>' or ' #' in value:
+            return False
+        return self._needs_quoting.search(value) is not None
+
+    def apply(self, line: str) -> str:
+        key, value = self.pattern.match(line).groups()
+        escaped = value.replace('\\', '\\\\').replace('"', '\\"')
+        return f'{key}: "{escaped}"'
+
+
+@register_rule
+class HeadingSpaceRule(LineRule):
+    """見出し記号の直後に空白がない見出し（例: ##はじめに）に空白を補うルール"""
+
+    name = "normalize_headings"
+    scope = SCOPE_BODY
+    # 行頭の#1つはハッシュタグの可能性があるため対象外
+    pattern = re.compile(r'^(#{2,6})(?=[^#\s])')
+
+    def apply(self, line: str) -> str:
+        return self.pattern.sub(r'\1 ', line, count=1)
+
+
+@register_rule
+class ImagePathRule(LineRule):
+    """画像の相対パス（images/ や ./images/）をZennの /images/ 形式に直すルール"""
+
+    name = "fix_image_paths"
+    scope = SCOPE_BODY
+    pattern = re.compile(r'(!\[[^\]]*\]\()(?:\.{1,2}/)*(images/)')
+
+    def apply(self, line: str) -> str:
+        return self.pattern.sub(lambda m: f"{m.group(1)}/{m.group(2)}", line)
+
+
+# 既定で有効なルール（登録順に適用される）
+DEFAULT_RULES = [
+    "remove_markdown_code_block",
+    "fix_frontmatter_format",
+    "normalize_headings",
+    "fix_image_paths",
+]
 
 
 class DocumentProcessor:
     """ドキュメント処理クラス"""
 
-    def __init__(self, debug: bool = False):
-        """初期化"""
+    def __init__(self, debug: bool = False, rules: Optional[List[str]] = None):
+        """
+        初期化
+
+        Args:
+            debug: デバッグモード
+            rules: 適用するルール名のリスト（Noneの場合は DEFAULT_RULES）
+        """
         self.debug = debug
         self.setup_logging()
-        # 処理関数のリスト（順番に実行される）
-        self.processors: List[Callable[[str], str]] = [
-            self.remove_markdown_code_block,
-            # 将来的に他の処理関数を追加可能
-            # self.fix_frontmatter_format,
-            # self.normalize_headings,
-            # self.fix_image_paths,
-            # など
-        ]
+        rule_names = DEFAULT_RULES if rules is None else rules
+        unknown = [name for name in rule_names if name not in RULE_REGISTRY]
+        if unknown:
+            raise ValueError(f"未登録のルールです: {', '.join(unknown)}")
+        self.rules: List[Rule] = [RULE_REGISTRY[name]() for name in rule_names]
+        self.document_rules = [r for r in self.rules if isinstance(r, DocumentRule)]
+        # 領域ごとの行ルール
+        self.line_rules: Dict[str, List[LineRule]] = {
+            scope: [r for r in self.rules if isinstance(r, LineRule) and r.scope == scope]
+            for scope in (SCOPE_FRONTMATTER, SCOPE_BODY, SCOPE_CODE)
+        }
+        # 領域ごとに、いずれかの行ルールの対象になり得る行を一度で判定する事前フィルター
+        self.line_filters: Dict[str, Optional[Pattern]] = {
+            scope: _combine_patterns(rules) for scope, rules in self.line_rules.items()
+        }
+        # 直近の処理でルールが修正した回数（ルール名 → 回数）
+        self.last_changes: Dict[str, int] = {}
+        self.output_writer = OutputWriter()
 
     def setup_logging(self):
-        """ロギングの設定"""
-        level = logging.DEBUG if self.debug else logging.INFO
-        logging.basicConfig(
-            level=level,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
+        """ロガーの取得（ハンドラーの設定はCLIのmain()で行う）"""
         self.logger = logging.getLogger('DocumentProcessor')
 
     def remove_markdown_code_block(self, content: str) -> str:
         """
         マークダウンファイル全体を囲むコードブロックを削除する
-        
+
         LLMが生成したマークダウンファイルでは、しばしば全体が```markdownと```で囲まれている
         この関数は、そのようなコードブロックを検出して削除する
-        
+
         Args:
             content: 処理対象のドキュメント内容
-            
+
         Returns:
             コードブロックを削除したドキュメント内容
         """
-        # 文書全体がコードブロックで囲まれているかチェック
-        if content.startswith('```') and content.endswith('```'):
-            self.logger.debug("ドキュメント全体がコードブロックで囲まれています。削除します。")
-            
-            # 先頭行を削除
-            first_line_end = content.find('\n')
-            if first_line_end != -1:
-                content = content[first_line_end + 1:]
-            
-            # 末尾の```を削除
-            if content.endswith('```'):
-                content = content[:-3].rstrip()
-                
-            self.logger.debug("コードブロックを削除しました。")
-        
-        # 先頭が```markdownで始まるケース
-        if content.startswith('```markdown') or content.startswith('```Markdown'):
-            self.logger.debug("ドキュメントが```markdownで始まっています。削除します。")
-            
-            # 先頭行を削除
-            first_line_end = content.find('\n')
-            if first_line_end != -1:
-                content = content[first_line_end + 1:]
-                
-            # 末尾の```を削除
-            if content.endswith('```'):
-                content = content[:-3].rstrip()
-                
-            self.logger.debug("```markdownブロックを削除しました。")
-        
-        return content
+        return remove_markdown_code_block(content, self.logger)
+
+    def process_stream(self, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        チャンク単位で届くドキュメントを1回の走査で処理する
+
+        ドキュメントルールを適用した後、行単位で領域（フロントマター・本文・
+        コードブロック）を判定し、該当する行ルールを適用して逐次返す。
+
+        Args:
+            chunks: ドキュメント内容の断片のイテラブル
+
+        Returns:
+            処理済みのドキュメント内容の断片を返すイテレータ
+        """
+        changes: Dict[str, int] = {}
+        self.last_changes = changes
+
+        for rule in self.document_rules:
+            chunks = self._count_document_changes(rule, chunks, changes)
+
+        in_frontmatter = False
+        fence = None  # 開いているコードブロックのマーカー
+        for index, line in enumerate(_iter_lines(chunks)):
+            if line[-1:] != '\n':
+                text, newline = line, ''
+            elif line[-2:] == '\r\n':
+                text, newline = line[:-2], '\r\n'
+            else:
+                text, newline = line[:-1], '\n'
+
+            if index == 0 and text == '---':
+                in_frontmatter = True
+                yield line
+                continue
+            if in_frontmatter:
+                if text == '---':
+                    in_frontmatter = False
+                    yield line
+                    continue
+                scope = SCOPE_FRONTMATTER
+            else:
+                match = _FENCE_PATTERN.match(text) if text[:1] in _FENCE_FIRST_CHARS else None
+                if fence is None and match:
+                    fence = match.group(1)
+                    yield line
+                    continue
+                if fence is not None:
+                    if (match and match.group(1)[0] == fence[0]
+                            and len(match.group(1)) >= len(fence) and not match.group(2).strip()):
+                        fence = None
+                        yield line
+                        continue
+                    scope = SCOPE_CODE
+                else:
+                    scope = SCOPE_BODY
+
+            line_filter = self.line_filters[scope]
+            if line_filter is not None and not line_filter.search(text):
+                yield line
+                continue
+            for rule in self.line_rules[scope]:
+                if rule.matches(text):
+                    fixed = rule.apply(text)
+                    if fixed != text:
+                        changes[rule.name] = changes.get(rule.name, 0) + 1
+                        self.logger.debug(f"{rule.name}: {text!r} -> {fixed!r}")
+                        text = fixed
+            yield text + newline
+
+    def _count_document_changes(self, rule: DocumentRule, chunks: Iterable[str],
+                                changes: Dict[str, int]) -> Iterator[str]:
+        """ドキュメントルールを適用し、内容が変わった場合は修正回数に数える"""
+        consumed = 0
+        produced = 0
+
+        def counting(source):
+            nonlocal consumed
+            for chunk in source:
+                consumed += len(chunk)
+                yield chunk
+
+        for piece in rule.transform(counting(chunks), self.logger):
+            produced += len(piece)
+            yield piece
+        # 削除のみを行うルールなので、長さの差で変更の有無を判定できる
+        if produced != consumed:
+            changes[rule.name] = changes.get(rule.name, 0) + 1
+
+    def process_text(self, content: str) -> str:
+        """
+        ドキュメント内容を処理する
+
+        Args:
+            content: 処理対象のドキュメント内容
+
+        Returns:
+            処理後のドキュメント内容
+        """
+        return "".join(self.process_stream([content]))
 
     def process(self, input_file: str, output_file: Optional[str] = None) -> bool:
         """
         ドキュメントを処理する
-        
+
         Args:
             input_file: 入力ファイルのパス
             output_file: 出力ファイルのパス（Noneの場合は入力ファイルを上書き）
-            
+
         Returns:
             処理が成功したかどうか
         """
         try:
-            # 入力ファイルを読み込む
-            with open(input_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-                
-            self.logger.debug(f"ファイル読み込み: {input_file}")
-            
-            # 各処理関数を順番に適用
-            original_content = content
-            for processor in self.processors:
-                content = processor(content)
-                
-            # 変更があったかチェック
-            if content == original_content:
-                self.logger.info("ドキュメントに変更はありませんでした。")
-            else:
-                self.logger.info("ドキュメントを修正しました。")
-                
-            # 出力ファイルに書き込む
-            output_path = output_file if output_file else input_file
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-                
-            self.logger.debug(f"ファイル書き込み: {output_path}")
+            self._process_file(input_file, output_file)
             return True
-            
         except Exception as e:
             self.logger.error(f"処理中にエラーが発生しました: {e}")
             return False
 
+    def _process_file(self, input_file: str, output_file: Optional[str] = None) -> bool:
+        """ファイルを処理し、ルールによる修正があったかを返す（エラーはそのまま送出する）"""
+        self.logger.debug(f"ファイル読み込み: {input_file}")
+
+        # 入力を少しずつ読みながら全ルールを1回の走査で適用し、一時ファイルに書き出す
+        # （ファイル全体の処理前と処理後の内容を同時にメモリに持たない）
+        # 内容が変わらない場合はライターが一時ファイルを破棄し、出力ファイルに触れない
+        output_path = output_file if output_file else input_file
+        unchanged = self.output_writer.stats["unchanged"]
+        with self.output_writer.open_atomic(output_path) as out:
+            for piece in self.process_stream(iter_text(input_file)):
+                out.write(piece)
+        changes = self.last_changes
+        written = self.output_writer.stats["unchanged"] == unchanged
+
+        # 変更があったかチェック
+        if not changes:
+            self.logger.info(f"ドキュメントに変更はありませんでした。({input_file})")
+        else:
+            summary = ", ".join(f"{name}: {count}" for name, count in changes.items())
+            self.logger.info(f"ドキュメントを修正しました。({input_file}: {summary})")
+
+        if written:
+            self.logger.debug(f"ファイル書き込み: {output_path}")
+        else:
+            self.logger.debug(f"内容に変更がないため書き込みをスキップしました: {output_path}")
+        return bool(changes)
+
+    def process_files(self, input_files: Iterable[str], max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        複数のドキュメントを処理する（各ファイルは上書きされる）
+
+        Args:
+            input_files: 入力ファイルのパスのイテラブル
+            max_workers: 2以上を指定するとプロセスプールで並列に処理する
+
+        Returns:
+            ファイルごとの結果の辞書（input, success, changed, error）のリスト（入力順）
+        """
+        input_files = list(input_files)
+        if max_workers and max_workers > 1 and len(input_files) > 1:
+            rule_names = [rule.name for rule in self.rules]
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                return list(executor.map(
+                    _process_file_worker,
+                    input_files,
+                    [self.debug] * len(input_files),
+                    [rule_names] * len(input_files),
+                    chunksize=max(1, len(input_files) // (max_workers * 4)),
+                ))
+        return [self._process_file_result(path) for path in input_files]
+
+    def _process_file_result(self, input_file: str) -> Dict[str, Any]:
+        """ファイルを処理し、結果を辞書で返す"""
+        result = {"input": input_file, "success": False, "changed": False, "error": None}
+        try:
+            result["changed"] = self._process_file(input_file)
+            result["success"] = True
+        except Exception as e:
+            self.logger.error(f"処理中にエラーが発生しました: {input_file}: {e}")
+            result["error"] = str(e)
+        return result
+
+
+def _process_file_worker(input_file: str, debug: bool, rules: List[str]) -> Dict[str, Any]:
+    """プロセスプールのワーカーで1ファイルを処理する"""
+    return DocumentProcessor(debug=debug, rules=rules)._process_file_result(input_file)
+
+
+def collect_documents(paths: Iterable[str]) -> List[str]:
+    """ファイルとディレクトリ（配下の *.md を再帰的に探す）のリストから処理対象を集める"""
+    documents = []
+    for path in paths:
+        if os.path.isdir(path):
+            documents.extend(sorted(glob.glob(os.path.join(path, "**", "*.md"), recursive=True)))
+        else:
+            documents.append(path)
+    return documents
+
+
+def configure_logging(debug: bool = False) -> None:
+    """CLI用のロギングを設定する"""
+    logging.basicConfig(
+        level=logging.DEBUG if debug else logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+
+def _combine_patterns(rules: List[LineRule]) -> Optional[Pattern]:
+    """行ルールのパターンを1つの正規表現にまとめる（パターンのないルールがあればNone）"""
+    if not rules or any(rule.pattern is None for rule in rules):
+        return None if rules else re.compile(r'(?!)')
+    return re.compile("|".join(f"(?:{rule.pattern.pattern})" for rule in rules))
+
+
+def _iter_lines(chunks: Iterable[str]) -> Iterator[str]:
+    """断片の列を改行を含む行の列に変換する（最後の行は改行を含まない場合がある）"""
+    buffer = ""
+    for chunk in chunks:
+        if '\n' not in chunk:
+            buffer += chunk
+            continue
+        lines = (buffer + chunk).split('\n')
+        buffer = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    if buffer:
+        yield buffer
+
 
 def main():
     """メイン関数"""
     parser = argparse.ArgumentParser(description="ドキュメント処理ツール")
-    parser.add_argument("input", help="入力ファイルのパス")
-    parser.add_argument("-o", "--output", help="出力ファイルのパス（指定しない場合は入力ファイルを上書き）")
+    parser.add_argument("input", nargs="+", help="入力ファイルまたはディレクトリ（配下の *.md を処理）のパス")
+    parser.add_argument("-o", "--output", help="出力ファイルのパス（入力が1ファイルの場合のみ。指定しない場合は入力ファイルを上書き）")
     parser.add_argument("--debug", action="store_true", help="デバッグモードを有効にする")
+    parser.add_argument("--disable-rule", action="append", default=[], choices=sorted(RULE_REGISTRY),
+                        help="無効にするルール名（複数指定可）")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="複数ファイルを処理する際の並列プロセス数")
     args = parser.parse_args()
-    
-    processor = DocumentProcessor(debug=args.debug)
-    success = processor.process(args.input, args.output)
-    
+
+    configure_logging(args.debug)
+    rules = [name for name in DEFAULT_RULES if name not in args.disable_rule]
+    processor = DocumentProcessor(debug=args.debug, rules=rules)
+
+    if args.output:
+        if len(args.input) != 1 or os.path.isdir(args.input[0]):
+            parser.error("--output は入力ファイルが1つの場合のみ指定できます")
+        success = processor.process(args.input[0], args.output)
+    else:
+        results = processor.process_files(collect_documents(args.input), max_workers=args.jobs)
+        success = all(r["success"] for r in results)
+
     if not success:
         sys.exit(1)
 
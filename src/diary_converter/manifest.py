@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+ビルドマニフェストモジュール
+
+変換済みの開発日記について、変換元・テンプレート・モデル・変換の設定・出力の情報を
+JSONファイルに記録する。インクリメンタル変換では、この記録と一致する
+（変更のない）日記の変換をスキップする。
+"""
+
+import os
+import json
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+from .output_writer import write_text_atomic
+from .source_reader import text_sha256
+
+
+def content_hash(content: str) -> str:
+    """文字列のSHA-256ハッシュを返す（大きな文字列も区切ってエンコードする）"""
+    return text_sha256(content)
+
+
+def file_hash(path: str) -> Optional[str]:
+    """ファイル内容のSHA-256ハッシュを返す（ファイルが存在しない場合はNone）"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """変換結果を記録するマニフェストクラス"""
+
+    VERSION = 1
+
+    def __init__(self, path: str):
+        """初期化（既存のマニフェストがあれば読み込む）"""
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.load()
+
+    @staticmethod
+    def _key(source_file: str, variant: Optional[str] = None) -> str:
+        """
+        変換元ファイルのパスをマニフェストのキーに正規化する
+
+        1つの日記から複数の記事を生成する場合は、2つ目以降の出力を variant
+        （出力先のパス）で区別する。
+        """
+        key = os.path.abspath(source_file)
+        return key if variant is None else f"{key}#{variant}"
+
+    def load(self) -> None:
+        """マニフェストファイルを読み込む"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            raise IOError(f"マニフェストファイルの形式が不正です: {self.path}: {e}")
+        if data.get("version") == self.VERSION:
+            self.entries = data.get("entries", {})
+
+    def is_up_to_date(self, source_file: str, destination_file: str,
+                      source_hash: str, template_hash: str, model_name: str,
+                      variant: Optional[str] = None, settings_hash: Optional[str] = None) -> bool:
+        """
+        前回の変換結果が現在の入力と一致し、出力が手つかずで残っているか判定する
+
+        Args:
+            source_file: 変換元ファイルのパス
+            destination_file: 変換先ファイルのパス
+            source_hash: 変換元の内容のハッシュ
+            template_hash: 準備済みテンプレートのハッシュ
+            model_name: 使用するモデル名
+            variant: 同じ日記の別の出力を区別する値
+            settings_hash: 出力に影響する変換の設定（前処理・後処理・検証など）のハッシュ
+
+        Returns:
+            変換をスキップしてよい場合はTrue
+        """
+        with self._lock:
+            entry = self.entries.get(self._key(source_file, variant))
+        if not entry:
+            return False
+        if (entry.get("source_hash") != source_hash
+                or entry.get("template_hash") != template_hash
+                or entry.get("model") != model_name
+                or entry.get("settings_hash") != settings_hash
+                or entry.get("output") != os.path.abspath(destination_file)):
+            return False
+        return file_hash(destination_file) == entry.get("output_hash")
+
+    def record(self, source_file: str, destination_file: str,
+               source_hash: str, template_hash: str, model_name: str,
+               variant: Optional[str] = None, settings_hash: Optional[str] = None) -> None:
+        """変換結果を記録する（保存はsave()で行う）"""
+        entry = {
+            "source_hash": source_hash,
+            "template_hash": template_hash,
+            "model": model_name,
+            "settings_hash": settings_hash,
+            "output": os.path.abspath(destination_file),
+            "output_hash": file_hash(destination_file),
+        }
+        with self._lock:
+            self.entries[self._key(source_file, variant)] = entry
+            self._dirty = True
+
+    def save(self) -> None:
+        """変更があればマニフェストファイルをアトミックに書き出す"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": self.VERSION, "entries": self.entries}
+            write_text_atomic(self.path, json.dumps(data, ensure_ascii=False, indent=2, sort_keys=True))
+            self._dirty = False
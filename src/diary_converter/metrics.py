@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+メトリクスモジュール
+
+変換1件ごとに、段階別の所要時間（テンプレートの読み込み・プロンプト生成・API呼び出し・
+後処理・書き出しなど）と、API呼び出し回数・再試行回数・トークン数などのカウンターを記録する。
+集計結果はJSONのサマリーと、Prometheusのテキスト形式のファイルとして書き出せる。
+
+記録中の変換はコンテキスト変数で保持するため、バッチ変換の各スレッドの記録は混ざらない。
+記録中の変換がない場合、timed() と increment() は何もしない。
+"""
+
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from .output_writer import write_text_atomic
+
+_current_record: contextvars.ContextVar = contextvars.ContextVar("diary_converter_metrics_record", default=None)
+
+# 記録するカウンター
+COUNTERS = ["api_calls", "retries", "cache_hits", "prompt_tokens", "response_tokens",
+            "throttled_seconds", "backoff_seconds", "unchanged_writes", "prefix_tokens",
+            "hedged_requests", "hedge_wins", "validation_issues", "regenerated_sections",
+            "preprocess_bytes_removed", "preprocess_tokens_removed"]
+
+
+def percentile(values: List[float], p: float) -> float:
+    """線形補間によるパーセンタイル（pは0〜100）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * p / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class ConversionRecord:
+    """変換1件分のメトリクス"""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.status: Optional[str] = None
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, float] = {name: 0 for name in COUNTERS}
+        # 分割変換では同じ記録に複数のスレッドから書き込む
+        self._lock = threading.Lock()
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        """段階の所要時間を加算する"""
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add(self, counter: str, value: float = 1) -> None:
+        """カウンターを加算する"""
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"source": self.source, "status": self.status,
+                    "stages": dict(self.stages), "counters": dict(self.counters)}
+
+
+def current_record() -> Optional[ConversionRecord]:
+    """記録中の変換を返す（なければNone）"""
+    return _current_record.get()
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """ブロックの所要時間を記録中の変換の段階として加算する"""
+    record = _current_record.get()
+    if record is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record.add_time(stage, time.perf_counter() - start)
+
+
+def add_time(stage: str, seconds: float) -> None:
+    """記録中の変換の段階に所要時間を加算する（timed() で囲めない処理向け）"""
+    record = _current_record.get()
+    if record is not None:
+        record.add_time(stage, seconds)
+
+
+def increment(counter: str, value: float = 1) -> None:
+    """記録中の変換のカウンターを加算する"""
+    record = _current_record.get()
+    if record is not None:
+        record.add(counter, value)
+
+
+class MetricsCollector:
+    """変換ごとのメトリクスを集めて集計するクラス"""
+
+    def __init__(self):
+        self.records: List[ConversionRecord] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def conversion(self, source: str) -> Iterator[ConversionRecord]:
+        """
+        ブロック内を1件の変換として記録する
+
+        例外で抜けた場合は status を "failed" にする。それ以外の場合は、
+        ブロック内で設定された status（未設定なら "converted"）を記録する。
+        """
+        record = ConversionRecord(source)
+        token = _current_record.set(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            record.status = "failed"
+            raise
+        finally:
+            _current_record.reset(token)
+            record.add_time("total", time.perf_counter() - start)
+            if record.status is None:
+                record.status = "converted"
+            with self._lock:
+                self.records.append(record)
+
+    def summary(self) -> Dict[str, Any]:
+        """段階ごとの集計・カウンターの合計・変換ごとの記録をまとめた辞書を返す"""
+        with self._lock:
+            records = [record.to_dict() for record in self.records]
+
+        statuses: Dict[str, int] = {}
+        stage_values: Dict[str, List[float]] = {}
+        counters = {name: 0 for name in COUNTERS}
+        for record in records:
+            statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+            for stage, seconds in record["stages"].items():
+                stage_values.setdefault(stage, []).append(seconds)
+            for name, value in record["counters"].items():
+                counters[name] = counters.get(name, 0) + value
+
+        stages = {
+            stage: {
+                "count": len(values),
+                "total": sum(values),
+                "mean": sum(values) / len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+            }
+            for stage, values in sorted(stage_values.items())
+        }
+        return {
+            "conversions": len(records),
+            "status": statuses,
+            "stages": stages,
+            "counters": counters,
+            "files": records,
+        }
+
+    def to_prometheus(self) -> str:
+        """集計結果をPrometheusのテキスト形式で返す"""
+        summary = self.summary()
+        lines = [
+            "# HELP diary_converter_conversions_total Conversions by result.",
+            "# TYPE diary_converter_conversions_total counter",
+        ]
+        for status, count in sorted(summary["status"].items()):
+            lines.append(f'diary_converter_conversions_total{{status="{status}"}} {count}')
+
+        lines += [
+            "# HELP diary_converter_stage_seconds Time spent in each conversion stage per file.",
+            "# TYPE diary_converter_stage_seconds summary",
+        ]
+        for stage, stats in summary["stages"].items():
+            lines.append(f'diary_converter_stage_seconds{{stage="{stage}",quantile="0.5"}} {stats["p50"]:.6f}')
+            lines.append(f'diary_converter_stage_seconds{{stage="{stage}",quantile="0.95"}} {stats["p95"]:.6f}')
+            lines.append(f'diary_converter_stage_seconds_sum{{stage="{stage}"}} {stats["total"]:.6f}')
+            lines.append(f'diary_converter_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+
+        for name, value in summary["counters"].items():
+            metric = f"diary_converter_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path: str) -> None:
+        """集計結果をJSONファイルに書き出す"""
+        write_text_atomic(path, json.dumps(self.summary(), ensure_ascii=False, indent=2) + "\n")
+
+    def write_prometheus(self, path: str) -> None:
+        """集計結果をPrometheusのテキスト形式のファイルに書き出す（node_exporterのtextfile collector向け）"""
+        write_text_atomic(path, self.to_prometheus())
+
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+出力書き込みモジュール
+
+記事やマニフェストなどの出力ファイルを、同じディレクトリの一時ファイルに書き出してから
+リネームすることでアトミックに更新する。書き込む内容がディスク上の内容と同じ場合は
+ファイルに触れず、更新時刻も変えない（公開リポジトリでの不要な差分や再デプロイを防ぐ）。
+作成済みのディレクトリは記録し、バッチ変換中に何度も作成を試みない。
+"""
+
+import os
+import stat
+import uuid
+import threading
+from contextlib import contextmanager
+from typing import IO, Iterator, Set
+
+_COMPARE_BLOCK_SIZE = 1024 * 1024
+_WRITE_BUFFER_SIZE = 64 * 1024
+
+
+def _same_bytes(path: str, data: bytes) -> bool:
+    """ファイルの内容がdataと一致するか判定する"""
+    try:
+        if os.stat(path).st_size != len(data):
+            return False
+        with open(path, 'rb') as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+
+def _same_files(path_a: str, path_b: str) -> bool:
+    """2つのファイルの内容が一致するか判定する"""
+    try:
+        if os.stat(path_a).st_size != os.stat(path_b).st_size:
+            return False
+        with open(path_a, 'rb') as a, open(path_b, 'rb') as b:
+            while True:
+                block_a = a.read(_COMPARE_BLOCK_SIZE)
+                if block_a != b.read(_COMPARE_BLOCK_SIZE):
+                    return False
+                if not block_a:
+                    return True
+    except OSError:
+        return False
+
+
+class OutputWriter:
+    """アトミックで、内容が変わらない場合は書き込まない出力ライター"""
+
+    def __init__(self):
+        self._directories: Set[str] = set()
+        self._lock = threading.Lock()
+        self.stats = {"written": 0, "unchanged": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def ensure_directory(self, directory: str) -> None:
+        """ディレクトリを作成する（このライターで作成・確認済みの場合は何もしない）"""
+        directory = os.path.abspath(directory or ".")
+        with self._lock:
+            if directory in self._directories:
+                return
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._directories.add(directory)
+
+    def _open_temp(self, path: str, mode: str, **kwargs) -> IO:
+        """出力先と同じディレクトリに一時ファイルを作成して開く"""
+        directory = os.path.dirname(path) or "."
+        tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp")
+        self.ensure_directory(directory)
+        try:
+            return open(tmp_path, mode, **kwargs)
+        except FileNotFoundError:
+            # 記録後にディレクトリが削除された場合は作り直す
+            with self._lock:
+                self._directories.discard(os.path.abspath(directory))
+            self.ensure_directory(directory)
+            return open(tmp_path, mode, **kwargs)
+
+    @staticmethod
+    def _replace(tmp_path: str, path: str) -> None:
+        """既存ファイルのパーミッションを引き継いで一時ファイルをリネームする"""
+        try:
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _discard(tmp_path: str) -> None:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+    def write_text(self, path: str, text: str, skip_unchanged: bool = True) -> bool:
+        """
+        テキストをファイルにアトミックに書き込む
+
+        Args:
+            path: 出力ファイルのパス
+            text: 書き込む内容
+            skip_unchanged: Trueの場合、内容がディスク上と同じなら書き込まない
+
+        Returns:
+            書き込んだ場合はTrue、内容が同じで書き込まなかった場合はFalse
+        """
+        data = text.encode('utf-8')
+        if skip_unchanged and _same_bytes(path, data):
+            self._count("unchanged")
+            return False
+
+        f = self._open_temp(path, 'xb')
+        try:
+            with f:
+                f.write(data)
+            self._replace(f.name, path)
+        except BaseException:
+            self._discard(f.name)
+            raise
+        self._count("written")
+        return True
+
+    @contextmanager
+    def open_atomic(self, path: str, skip_unchanged: bool = True) -> Iterator[IO[str]]:
+        """
+        少しずつ書き込むためのテキストファイルを開く
+
+        ブロックを正常に抜けると出力先にリネームする（内容が同じ場合は一時ファイルを破棄する）。
+        例外で抜けた場合は一時ファイルを削除し、既存の出力をそのまま残す。
+        """
+        f = self._open_temp(path, 'x', encoding='utf-8', buffering=_WRITE_BUFFER_SIZE)
+        try:
+            with f:
+                yield f
+            if skip_unchanged and _same_files(f.name, path):
+                self._discard(f.name)
+                self._count("unchanged")
+                return
+            self._replace(f.name, path)
+        except BaseException:
+            self._discard(f.name)
+            raise
+        self._count("written")
+
+
+# マニフェストやキャッシュなど、ライターを持たない書き込みで共有するライター
+default_writer = OutputWriter()
+
+
+def write_text_atomic(path: str, text: str, skip_unchanged: bool = True) -> bool:
+    """共有のライターでテキストをファイルにアトミックに書き込む"""
+    return default_writer.write_text(path, text, skip_unchanged=skip_unchanged)
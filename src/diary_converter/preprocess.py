@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+日記の前処理モジュール
+
+開発日記をLLMに送る前に、プロンプトを小さくするための前処理を行う。
+貼り付けたターミナル出力の制御文字や進捗表示などのノイズを除き、同じ内容の
+ブロック（繰り返し貼られたスタックトレースや会話ログの発言など）を省き、
+長すぎるコードブロック・ログの中ほどと長すぎる行を省略する。省略した箇所には
+「[前処理]」で始まる目印を残し、削った量をバイト数と推定トークン数で報告する。
+"""
+
+import re
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from .tokens import estimate_tokens
+from .source_reader import TEXT_CHUNK_CHARS
+
+# コードブロックの最大行数と、省略するときに末尾に残す行数（エラーは末尾に出ることが多い）
+DEFAULT_MAX_FENCE_LINES = 60
+DEFAULT_FENCE_TAIL_LINES = 15
+# 1行の最大文字数（圧縮されたJSONなど）
+DEFAULT_MAX_LINE_CHARS = 1000
+# 重複とみなすブロックの最小文字数（短い相づちや見出しは重複していても残す）
+DEFAULT_MIN_DUPLICATE_CHARS = 80
+# 同じ行がこの回数以上続いたら1行にまとめる
+REPEATED_LINE_THRESHOLD = 3
+
+MARKER = "[前処理]"
+
+_ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;?]*[ -/]*[@-~]|\x1b\][^\x07]*\x07')
+_FENCE = re.compile(r'^\s*(`{3,}|~{3,})')
+# 進捗表示の判定に使うパターン（_is_progress_line を参照）。どれも互いに重なる繰り返しを
+# 含まないため、長い罫線やブロック文字だけの行でも行の長さに比例した時間で判定できる
+_PERCENT = re.compile(r'\b\d{1,3}(?:\.\d+)?%')
+_PERCENT_AT_END = re.compile(r'\b\d{1,3}(?:\.\d+)?%$')
+_TQDM_BAR = re.compile(r'\|[#█▉▊▋▌▍▎▏ ]*\|')
+_BRACKET_BAR = re.compile(r'\[[#=>\-. ]{5,}\]\s*\d{1,3}(?:\.\d+)?%')
+_BLOCK_BAR = re.compile(r'[━█▉▊▋▌▍▎▏]{5}')
+_TABLE_ROW = re.compile(r'^\s*\|')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _is_progress_line(line: str) -> bool:
+    """
+    tqdm（`45%|####  |`）・角括弧（`[=====>    ] 45%`）・ブロック文字の棒グラフの進捗表示かどうかを返す
+
+    進捗表示の部分は最初の `|` より前から始まる必要があり、説明部分に `|` を含む行
+    （Markdownの表の行など）は進捗表示とみなさない。
+    """
+    if '%' not in line:
+        return False
+    head, separator, _ = line.partition('|')
+    if separator and _PERCENT_AT_END.search(head) and _TQDM_BAR.match(line, len(head)):
+        return True
+    if _BRACKET_BAR.search(head):
+        return True
+    bar = _BLOCK_BAR.search(head)
+    return bar is not None and _PERCENT.search(head, bar.end()) is not None
+
+
+def _utf8_size(text: str) -> int:
+    """UTF-8でのバイト数を返す（全体のエンコード結果を確保しない）"""
+    if text.isascii():
+        return len(text)
+    return sum(len(text[start:start + TEXT_CHUNK_CHARS].encode('utf-8'))
+               for start in range(0, len(text), TEXT_CHUNK_CHARS))
+
+
+class SourcePreprocessor:
+    """開発日記をプロンプトに含める前に圧縮する前処理"""
+
+    def __init__(self, dedupe: bool = True, strip_noise: bool = True,
+                 max_fence_lines: Optional[int] = DEFAULT_MAX_FENCE_LINES,
+                 fence_tail_lines: int = DEFAULT_FENCE_TAIL_LINES,
+                 max_line_chars: Optional[int] = DEFAULT_MAX_LINE_CHARS,
+                 min_duplicate_chars: int = DEFAULT_MIN_DUPLICATE_CHARS):
+        """
+        Args:
+            dedupe: 前に出てきたものと同じ内容のブロックを省く
+            strip_noise: 制御文字・進捗表示・行末の空白・連続する空行・繰り返される行を除く
+            max_fence_lines: コードブロックの最大行数（Noneで省略しない）
+            fence_tail_lines: コードブロックを省略するときに末尾に残す行数
+            max_line_chars: 1行の最大文字数（Noneで省略しない）
+            min_duplicate_chars: 重複とみなすブロックの最小文字数
+        """
+        if max_fence_lines is not None and not 0 <= fence_tail_lines < max_fence_lines:
+            raise ValueError(
+                f"fence_tail_lines は0以上 max_fence_lines 未満で指定してください: {fence_tail_lines}"
+            )
+        if max_line_chars is not None and max_line_chars < 1:
+            raise ValueError(f"max_line_chars は1以上で指定してください: {max_line_chars}")
+        self.dedupe = dedupe
+        self.strip_noise = strip_noise
+        self.max_fence_lines = max_fence_lines
+        self.fence_tail_lines = fence_tail_lines
+        self.max_line_chars = max_line_chars
+        self.min_duplicate_chars = min_duplicate_chars
+
+    def settings(self) -> Dict[str, Any]:
+        """前処理の結果に影響する設定を返す（ビルドマニフェストの設定のハッシュに使う）"""
+        return {
+            "dedupe": self.dedupe,
+            "strip_noise": self.strip_noise,
+            "max_fence_lines": self.max_fence_lines,
+            "fence_tail_lines": self.fence_tail_lines,
+            "max_line_chars": self.max_line_chars,
+            "min_duplicate_chars": self.min_duplicate_chars,
+        }
+
+    def process(self, text: str) -> Tuple[str, Dict[str, int]]:
+        """
+        日記を前処理する
+
+        Returns:
+            前処理後の日記と統計の辞書（bytes_before, bytes_after, bytes_removed,
+            tokens_removed, duplicate_blocks, truncated_fences, truncated_lines, noise_lines）
+        """
+        stats = {"duplicate_blocks": 0, "truncated_fences": 0, "truncated_lines": 0, "noise_lines": 0}
+        lines = text.split('\n')
+        if self.strip_noise:
+            lines = self._strip_noise(lines, stats)
+
+        output: List[str] = []
+        seen = set()
+        for kind, block in _split_blocks(lines):
+            if kind == "blank":
+                # 連続する空行は1行にまとめる
+                output.extend([""] if self.strip_noise else block)
+                continue
+            if self.dedupe:
+                normalized = _WHITESPACE.sub(' ', "\n".join(block)).strip()
+                if len(normalized) >= self.min_duplicate_chars:
+                    digest = hashlib.sha1(normalized.encode('utf-8')).digest()
+                    if digest in seen:
+                        stats["duplicate_blocks"] += 1
+                        output.append(f"{MARKER} 前に出てきた内容と同じため省略しました（{len(normalized)} 文字）")
+                        continue
+                    seen.add(digest)
+            if kind == "fence":
+                block = self._compact_fence(block, stats)
+            output.extend(self._truncate_line(line, stats) for line in block)
+
+        processed = "\n".join(output)
+        if self.strip_noise:
+            processed = processed.strip('\n') + ('\n' if text.endswith('\n') else '')
+
+        stats["bytes_before"] = _utf8_size(text)
+        stats["bytes_after"] = _utf8_size(processed)
+        stats["bytes_removed"] = stats["bytes_before"] - stats["bytes_after"]
+        stats["tokens_removed"] = estimate_tokens(text) - estimate_tokens(processed)
+        return processed, stats
+
+    def _strip_noise(self, lines: List[str], stats: Dict[str, int]) -> List[str]:
+        """
+        制御文字と行末の空白を除き、続けて表示された進捗表示は最後の1行だけを残す
+
+        省略した進捗表示の位置には目印を残す。表の行は進捗表示とみなさない。
+        """
+        cleaned: List[str] = []
+        progress: List[str] = []
+
+        def flush():
+            if len(progress) > 1:
+                cleaned.append(f"{MARKER} 進捗表示 {len(progress) - 1} 行を省略しました")
+                stats["noise_lines"] += len(progress) - 1
+            cleaned.extend(progress[-1:])
+            progress.clear()
+
+        for line in lines:
+            line = _ANSI_ESCAPE.sub('', line).rstrip()
+            if not _TABLE_ROW.match(line) and _is_progress_line(line):
+                progress.append(line)
+                continue
+            flush()
+            cleaned.append(line)
+        flush()
+        return cleaned
+
+    def _compact_fence(self, block: List[str], stats: Dict[str, int]) -> List[str]:
+        """コードブロックの繰り返される行をまとめ、長すぎる場合は中ほどを省略する"""
+        opening, body = block[0], block[1:]
+        closing = []
+        if body and _FENCE.match(body[-1]):
+            body, closing = body[:-1], body[-1:]
+
+        if self.strip_noise:
+            collapsed = []
+            index = 0
+            while index < len(body):
+                end = index
+                while end + 1 < len(body) and body[end + 1] == body[index]:
+                    end += 1
+                repeats = end - index + 1
+                collapsed.append(body[index])
+                if repeats >= REPEATED_LINE_THRESHOLD and body[index].strip():
+                    collapsed.append(f"{MARKER} 前の行が {repeats - 1} 回繰り返されています")
+                    stats["noise_lines"] += repeats - 1
+                else:
+                    collapsed.extend(body[index + 1:end + 1])
+                index = end + 1
+            body = collapsed
+
+        if self.max_fence_lines is not None and len(body) > self.max_fence_lines:
+            head = self.max_fence_lines - self.fence_tail_lines
+            omitted = len(body) - self.max_fence_lines
+            tail = body[len(body) - self.fence_tail_lines:] if self.fence_tail_lines else []
+            body = body[:head] + [f"... {MARKER} {omitted} 行を省略しました ..."] + tail
+            stats["truncated_fences"] += 1
+        return [opening] + body + closing
+
+    def _truncate_line(self, line: str, stats: Dict[str, int]) -> str:
+        if self.max_line_chars is None or len(line) <= self.max_line_chars:
+            return line
+        stats["truncated_lines"] += 1
+        return line[:self.max_line_chars] + f" ... {MARKER} 以降の {len(line) - self.max_line_chars} 文字を省略しました"
+
+
+def _split_blocks(lines: List[str]) -> List[Tuple[str, List[str]]]:
+    """
+    行をブロックに分ける
+
+    ブロックは (種類, 行のリスト) で、種類は fence（開始と終了の行を含むコードブロック）、
+    text（空行で区切られた段落）、blank（連続する空行）のいずれか。閉じていない
+    コードブロックは最後の行までをコードブロックとみなす。
+    """
+    blocks: List[Tuple[str, List[str]]] = []
+    index = 0
+    while index < len(lines):
+        line = lines[index]
+        fence = _FENCE.match(line)
+        if fence:
+            marker = fence.group(1)
+            end = index + 1
+            while end < len(lines):
+                stripped = lines[end].strip()
+                if stripped.startswith(marker[0] * len(marker)) and not stripped.strip(marker[0]):
+                    end += 1
+                    break
+                end += 1
+            blocks.append(("fence", lines[index:end]))
+            index = end
+            continue
+        kind = "blank" if not line.strip() else "text"
+        end = index + 1
+        while end < len(lines) and (not lines[end].strip()) == (kind == "blank") and not (
+                kind == "text" and _FENCE.match(lines[end])):
+            end += 1
+        blocks.append((kind, lines[index:end]))
+        index = end
+    return blocks
+
+
+def add_preprocess_arguments(parser) -> None:
+    """前処理に関するコマンドライン引数を追加する"""
+    parser.add_argument("--preprocess", action="store_true",
+                        help="日記を送る前にノイズ・重複したブロック・長すぎるコードブロックを省いてプロンプトを小さくする")
+    parser.add_argument("--max-fence-lines", type=int, default=DEFAULT_MAX_FENCE_LINES,
+                        help="前処理でコードブロック・ログを省略せずに残す最大行数（0で省略しない）")
+    parser.add_argument("--fence-tail-lines", type=int, default=DEFAULT_FENCE_TAIL_LINES,
+                        help="前処理でコードブロックを省略するときに末尾に残す行数")
+    parser.add_argument("--max-line-chars", type=int, default=DEFAULT_MAX_LINE_CHARS,
+                        help="前処理で省略せずに残す1行の最大文字数（0で省略しない）")
+    parser.add_argument("--no-dedupe", action="store_true", help="前処理で重複したブロックを省かない")
+
+
+def preprocessor_from_args(args) -> Optional[SourcePreprocessor]:
+    """コマンドライン引数から前処理を生成する（--preprocess を指定しない場合はNone）"""
+    if not args.preprocess:
+        return None
+    return SourcePreprocessor(
+        dedupe=not args.no_dedupe,
+        max_fence_lines=args.max_fence_lines or None,
+        fence_tail_lines=args.fence_tail_lines,
+        max_line_chars=args.max_line_chars or None
+    )
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+リクエストスケジューラーモジュール
+
+LLM APIの呼び出しに対して、トークンバケットによる分間リクエスト数・
+トークン数の制限と、再試行可能なエラーに対する指数バックオフ（ジッター付き）の
+再試行を行う。サーバーから再試行までの待ち時間が示された場合はそれに従う
+（ただしバックオフの上限 max_delay を超えては待たない）。
+"""
+
+import re
+import time
+import random
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from .metrics import increment
+
+
+# 再試行の対象とするHTTPステータスコード
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# エラーメッセージ中の再試行までの待ち時間の表現
+_RETRY_AFTER_PATTERNS = [
+    re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)'),
+    re.compile(r'retry in ([\d.]+)\s*s', re.IGNORECASE),
+    re.compile(r'retry-after:?\s*([\d.]+)', re.IGNORECASE),
+]
+
+
+def is_retryable(error: Exception) -> bool:
+    """エラーが再試行で回復する可能性のあるものか判定する"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    code = getattr(error, 'code', None)
+    try:
+        return int(code) in RETRYABLE_STATUS_CODES
+    except (TypeError, ValueError):
+        return False
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """エラーに含まれる再試行までの待ち時間（秒）を返す（指定がなければNone）"""
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is None:
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None) or {}
+        retry_after = headers.get('Retry-After') if hasattr(headers, 'get') else None
+    if retry_after is not None:
+        try:
+            return max(0.0, float(retry_after))
+        except (TypeError, ValueError):
+            pass
+
+    message = str(error)
+    for pattern in _RETRY_AFTER_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class TokenBucket:
+    """分あたりの上限で補充されるトークンバケット"""
+
+    def __init__(self, rate_per_minute: float, clock: Callable[[], float] = time.monotonic):
+        """
+        初期化
+
+        Args:
+            rate_per_minute: 1分あたりに補充される量（バケットの容量も同じ値）
+            clock: 現在時刻（秒）を返す関数
+        """
+        if rate_per_minute <= 0:
+            raise ValueError(f"rate_per_minute は正の値で指定してください: {rate_per_minute}")
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """
+        指定量を予約し、予約分が利用可能になるまでの待ち時間（秒）を返す
+
+        残量が足りない場合も予約は行われ（残量は負になる）、以降の予約はその分だけ待たされる。
+        """
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class RequestScheduler:
+    """レート制限と再試行を行うリクエストスケジューラー"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+                 sleep: Callable[[float], None] = time.sleep,
+                 clock: Callable[[], float] = time.monotonic,
+                 rng: Callable[[], float] = random.random):
+        """
+        初期化
+
+        Args:
+            requests_per_minute: 1分あたりの最大リクエスト数（Noneの場合は無制限）
+            tokens_per_minute: 1分あたりの最大トークン数（Noneの場合は無制限）
+            max_retries: 再試行の最大回数
+            base_delay: バックオフの基準となる待ち時間（秒）
+            max_delay: バックオフの待ち時間の上限（秒）。サーバーが示した待ち時間にも適用する
+            sleep: 待機に使う関数
+            clock: 現在時刻（秒）を返す関数
+            rng: 0以上1未満の乱数を返す関数（ジッターに使う）
+        """
+        self.request_bucket = TokenBucket(requests_per_minute, clock) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute, clock) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.rng = rng
+        self.stats: Dict[str, float] = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "throttled_seconds": 0.0,
+            "backoff_seconds": 0.0,
+        }
+        self._lock = threading.Lock()
+
+    def _count(self, name: str, value: float = 1) -> None:
+        """統計値を加算する"""
+        with self._lock:
+            self.stats[name] += value
+
+    def _throttle(self, estimated_tokens: int) -> None:
+        """レート制限に従って必要なだけ待機する"""
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = max(wait, self.request_bucket.reserve(1))
+        if self.token_bucket is not None and estimated_tokens:
+            wait = max(wait, self.token_bucket.reserve(estimated_tokens))
+        if wait > 0:
+            self._count("throttled_seconds", wait)
+            increment("throttled_seconds", wait)
+            self.sleep(wait)
+
+    def reserve(self, estimated_tokens: int = 0) -> None:
+        """
+        call を通さずに送る追加のリクエスト（重複リクエストや代替モデルへのリクエスト）の分の
+        レート制限を予約し、必要なだけ待機する（API呼び出しの回数にも数える）
+        """
+        self._throttle(estimated_tokens)
+        self._count("requests")
+        increment("api_calls")
+
+    def backoff_delay(self, attempt: int) -> float:
+        """attempt回目の再試行前の待ち時間（フルジッター付き指数バックオフ）を返す"""
+        return self.rng() * min(self.max_delay, self.base_delay * (2 ** attempt))
+
+    def call(self, func: Callable[..., Any], *args: Any, estimated_tokens: int = 0, **kwargs: Any) -> Any:
+        """
+        レート制限と再試行を適用して関数を呼び出す
+
+        Args:
+            func: 呼び出す関数
+            estimated_tokens: このリクエストで消費する概算トークン数
+            *args, **kwargs: funcに渡す引数
+
+        Returns:
+            funcの戻り値
+
+        Raises:
+            再試行できないエラー、または再試行回数を使い切った場合の最後のエラー
+        """
+        attempt = 0
+        while True:
+            self._throttle(estimated_tokens)
+            self._count("requests")
+            increment("api_calls")
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = self.backoff_delay(attempt)
+                else:
+                    # サーバーの指定が極端に長くても、ワーカーを上限より長く止めない
+                    delay = min(delay, self.max_delay)
+                self._count("retries")
+                self._count("backoff_seconds", delay)
+                increment("retries")
+                increment("backoff_seconds", delay)
+                self.sleep(delay)
+                attempt += 1
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+変換サービスモジュール
+
+常駐プロセスとして変換ジョブを受け付けるHTTPサーバー。ジョブはSQLiteの
+永続キューに保存され、ワーカースレッドのプールが順に変換する。CIのステップや
+エディタからはジョブを登録するだけでよく、インタプリタの起動・依存関係の
+読み込み・APIの設定といったコストは常駐プロセスで一度だけ支払われる。
+
+エンドポイント:
+    POST /jobs        {"source": ..., "destination": ...} を登録し、ジョブを返す
+                      （Content-Type は application/json、destination は出力先ルート以下に限る）
+    GET  /jobs        最近のジョブの一覧を返す
+    GET  /jobs/<id>   ジョブの状態を返す
+    GET  /health      キューの状態を返す
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# ジョブの状態
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_SKIPPED = "skipped"
+STATUS_FAILED = "failed"
+
+_JOB_COLUMNS = ("id", "source", "destination", "status", "error", "created", "started", "finished")
+
+
+class JobStore:
+    """SQLiteに保存する永続ジョブキュー"""
+
+    def __init__(self, path: str):
+        """
+        初期化
+
+        前回の終了時に実行中だったジョブは、キューに戻して再実行する。
+
+        Args:
+            path: データベースファイルのパス（":memory:" も指定可能）
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, source TEXT NOT NULL, destination TEXT NOT NULL,"
+                " status TEXT NOT NULL, error TEXT,"
+                " created REAL NOT NULL, started REAL, finished REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, started = NULL WHERE status = ?",
+                (STATUS_QUEUED, STATUS_RUNNING)
+            )
+
+    @staticmethod
+    def _to_dict(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        return dict(zip(_JOB_COLUMNS, row)) if row is not None else None
+
+    def submit(self, source: str, destination: str) -> Dict[str, Any]:
+        """ジョブを登録する"""
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, source, destination, status, created) VALUES (?, ?, ?, ?, ?)",
+                (job_id, source, destination, STATUS_QUEUED, time.time())
+            )
+        return self.get(job_id)
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """最も古い待機中のジョブを実行中にして返す（なければNone）"""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE status = ? ORDER BY created LIMIT 1",
+                (STATUS_QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, started = ? WHERE id = ?",
+                (STATUS_RUNNING, time.time(), row["id"])
+            )
+        job = self._to_dict(row)
+        job["status"] = STATUS_RUNNING
+        return job
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        """ジョブの結果を記録する"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?",
+                (status, error, time.time(), job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """ジョブを取得する"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._to_dict(row)
+
+    def list(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """新しい順にジョブを返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs ORDER BY created DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """状態ごとのジョブ数を返す"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self) -> None:
+        """データベースを閉じる"""
+        with self._lock:
+            self._conn.close()
+
+
+class ConversionService:
+    """ジョブキューからジョブを取り出して変換するワーカープール"""
+
+    def __init__(self, converter: Any, store: JobStore, workers: int = 4, poll_interval: float = 1.0,
+                 output_root: str = "."):
+        """
+        初期化
+
+        Args:
+            converter: convert(source, destination) を持つ変換器（DiaryConverterなど）
+            store: ジョブキュー
+            workers: ワーカースレッド数
+            poll_interval: 新しいジョブの通知がない場合にキューを確認する間隔（秒）
+            output_root: 出力先ルート。ジョブの出力先はこのディレクトリ以下に限る
+        """
+        self.converter = converter
+        self.store = store
+        self.output_root = os.path.realpath(output_root)
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """ワーカーを起動する"""
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run_worker, name=f"diary-converter-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """ワーカーを停止する（実行中のジョブは完了を待つ）"""
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def resolve_destination(self, destination: str) -> str:
+        """
+        出力先を出力先ルートからのパスとして解決する
+
+        Raises:
+            ValueError: 出力先が出力先ルートの外を指す場合（絶対パス・".."・シンボリックリンク）
+        """
+        resolved = os.path.realpath(os.path.join(self.output_root, destination))
+        if resolved == self.output_root or os.path.commonpath([self.output_root, resolved]) != self.output_root:
+            raise ValueError(f"出力先は出力先ルート {self.output_root} 以下のファイルを指定してください: {destination}")
+        return resolved
+
+    def submit(self, source: str, destination: str) -> Dict[str, Any]:
+        """
+        ジョブを登録し、待機中のワーカーに通知する
+
+        Raises:
+            ValueError: 出力先が出力先ルートの外を指す場合
+        """
+        job = self.store.submit(os.path.abspath(source), self.resolve_destination(destination))
+        with self._wakeup:
+            self._wakeup.notify()
+        return job
+
+    def _run_worker(self) -> None:
+        while not self._stopping.is_set():
+            job = self.store.claim_next()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            self.run_job(job)
+
+    def run_job(self, job: Dict[str, Any]) -> None:
+        """ジョブを1件実行し、結果をキューに記録する"""
+        try:
+            converted = self.converter.convert(job["source"], job["destination"])
+            status = STATUS_SKIPPED if converted is False else STATUS_SUCCEEDED
+            self.store.finish(job["id"], status)
+        except Exception as e:
+            self.store.finish(job["id"], STATUS_FAILED, str(e))
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """変換サービスのHTTPリクエストハンドラー"""
+
+    service: ConversionService = None
+
+    def _send_json(self, status: int, body: Any) -> None:
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/health":
+            self._send_json(200, {"status": "ok", "jobs": self.service.store.counts()})
+        elif path == "/jobs":
+            self._send_json(200, {"jobs": self.service.store.list()})
+        elif path.startswith("/jobs/"):
+            job = self.service.store.get(path[len("/jobs/"):])
+            if job is None:
+                self._send_json(404, {"error": "ジョブが見つかりません"})
+            else:
+                self._send_json(200, job)
+        else:
+            self._send_json(404, {"error": "不明なパスです"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._send_json(404, {"error": "不明なパスです"})
+            return
+        # text/plain などのフォーム送信はブラウザからオリジンをまたいで送れるため、JSONだけを受け付ける
+        if self.headers.get_content_type() != "application/json":
+            self._send_json(415, {"error": "Content-Type: application/json で送信してください"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            source = body["source"]
+            destination = body["destination"]
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": f"source と destination を含むJSONを送信してください: {e}"})
+            return
+        try:
+            job = self.service.submit(source, destination)
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        self._send_json(202, job)
+
+    def log_message(self, format, *args):
+        if getattr(self.service.converter, "debug", False):
+            super().log_message(format, *args)
+
+
+def create_server(service: ConversionService, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """変換サービスのHTTPサーバーを生成する（port=0 で空いているポートを使う）"""
+    handler = type("RequestHandler", (_RequestHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    """メイン関数"""
+    from .diary_converter import DiaryConverter
+    from .backends import add_backend_arguments, backend_from_args, latency_policy_from_args
+    from .preprocess import add_preprocess_arguments, preprocessor_from_args
+
+    parser = argparse.ArgumentParser(description="開発日記変換サービス（常駐モード）")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けるホスト")
+    parser.add_argument("--port", type=int, default=8765, help="待ち受けるポート")
+    parser.add_argument("--queue-db", default=".diary-converter-jobs.sqlite3", help="ジョブキューのデータベースファイル")
+    parser.add_argument("--workers", type=int, default=4, help="ワーカースレッド数")
+    parser.add_argument("--output-root", default=".",
+                        help="出力先ルート。ジョブの出力先はこのディレクトリからの相対パスで、この外には書き込まない")
+    parser.add_argument("--model", default="gemini-2.0-flash-001", help="使用するGeminiモデル名")
+    parser.add_argument("--template", default="./templates/zenn_template.md", help="使用するテンプレートファイルのパス")
+    parser.add_argument("--cache-dir", default=os.environ.get("DIARY_CONVERTER_CACHE_DIR"),
+                        help="API応答キャッシュのディレクトリ")
+    parser.add_argument("--debug", action="store_true", help="デバッグモードを有効にする")
+    add_backend_arguments(parser)
+    add_preprocess_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        converter = DiaryConverter(
+            model=args.model,
+            debug=args.debug,
+            template_path=args.template,
+            cache_dir=args.cache_dir,
+            backend=backend_from_args(args),
+            preprocessor=preprocessor_from_args(args),
+            **latency_policy_from_args(args)
+        )
+    except Exception as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+
+    store = JobStore(args.queue_db)
+    service = ConversionService(converter, store, workers=args.workers, output_root=args.output_root)
+    server = create_server(service, args.host, args.port)
+    service.start()
+    print(f"変換サービスを開始しました: http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+ソース読み込みモジュール
+
+大きな開発日記（貼り付けたログやコマンド出力を含むもの）を、余分な全体のコピーを
+作らずに読み込み、ハッシュを計算するための関数をまとめる。ファイル全体を一度に
+デコードすると、CPythonのデコーダーはファイルのバイト数の数倍の作業領域を確保するため、
+読み込みはバイナリで一定の大きさずつ読んでデコードし、最後に連結する（テキストモードの
+read(n) も1文字あたりの作業領域が大きいため使わない）。ハッシュやトークン数の計算も
+文字列を一定の大きさに区切って行う。
+"""
+
+import io
+import codecs
+import hashlib
+from typing import Iterator
+
+# 区切って処理する1回分の文字数
+TEXT_CHUNK_CHARS = 256 * 1024
+# ストリーミングで読み込む1回分のバイト数
+READ_CHUNK_BYTES = 64 * 1024
+
+
+def read_text(path: str) -> str:
+    """
+    UTF-8のテキストファイルを読み込む（open(path, encoding='utf-8').read() と同じ結果を返す）
+
+    一定の大きさずつデコードして連結するため、読み込み中の最大のメモリ使用量は
+    デコード後の文字列のおよそ2倍に収まる（一度に read() する場合はバイト数の約3倍）。
+    """
+    return "".join(iter_text(path))
+
+
+def iter_text(path: str, chunk_bytes: int = READ_CHUNK_BYTES) -> Iterator[str]:
+    """
+    UTF-8のテキストファイルを少しずつデコードして返す
+
+    改行はテキストモードと同じく \\r\\n と \\r を \\n に変換する。
+    """
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(), translate=True)
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_bytes)
+            text = decoder.decode(data, final=not data)
+            if text:
+                yield text
+            if not data:
+                return
+
+
+def update_digest(digest, text: str) -> None:
+    """文字列をUTF-8で区切りながらハッシュに加える（全体のエンコード結果を確保しない）"""
+    for start in range(0, len(text), TEXT_CHUNK_CHARS):
+        digest.update(text[start:start + TEXT_CHUNK_CHARS].encode('utf-8'))
+
+
+def text_sha256(text: str) -> str:
+    """文字列のUTF-8エンコードのSHA-256ハッシュを返す"""
+    digest = hashlib.sha256()
+    update_digest(digest, text)
+    return digest.hexdigest()
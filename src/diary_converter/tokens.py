@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+トークン数見積もりモジュール
+
+APIを呼び出さずにテキストのトークン数を概算する。レート制限や
+ドライランの見積もりに使う目安であり、正確な値ではない。
+"""
+
+import re
+
+from .source_reader import TEXT_CHUNK_CHARS
+
+# ASCII文字は平均して約4文字で1トークンになる
+ASCII_CHARS_PER_TOKEN = 4
+
+# 生成される記事の長さの、入力された開発日記に対する比率の目安
+OUTPUT_TO_INPUT_RATIO = 1.2
+
+_LLM_INSTRUCTIONS_BLOCK = re.compile(
+    r'<!-- LLM_INSTRUCTIONS_START -->.*?<!-- LLM_INSTRUCTIONS_END -->', re.DOTALL
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    テキストのトークン数を概算する
+
+    ASCII文字は約4文字で1トークン、日本語などの非ASCII文字は1文字1トークンとして数える。
+
+    Args:
+        text: 対象のテキスト
+
+    Returns:
+        概算トークン数
+    """
+    if not text:
+        return 0
+    if text.isascii():
+        ascii_chars = len(text)
+    else:
+        # ASCII文字だけのコピーを丸ごと作らないよう、区切って数える
+        ascii_chars = sum(
+            len(text[start:start + TEXT_CHUNK_CHARS].encode('ascii', 'ignore'))
+            for start in range(0, len(text), TEXT_CHUNK_CHARS)
+        )
+    non_ascii_chars = len(text) - ascii_chars
+    return non_ascii_chars + -(-ascii_chars // ASCII_CHARS_PER_TOKEN)
+
+
+def estimate_output_tokens(content: str, template_content: str) -> int:
+    """
+    生成される記事のトークン数を概算する
+
+    記事はテンプレートの骨組み（LLM指示部分を除く）に、開発日記を再構成した本文を
+    加えたものになるため、骨組みのトークン数と日記のトークン数×比率の和を目安とする。
+
+    Args:
+        content: 開発日記の内容
+        template_content: 準備済みテンプレート
+
+    Returns:
+        概算トークン数
+    """
+    skeleton = _LLM_INSTRUCTIONS_BLOCK.sub('', template_content)
+    return estimate_tokens(skeleton) + int(estimate_tokens(content) * OUTPUT_TO_INPUT_RATIO)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+記事検証モジュール
+
+生成された記事を、準備済みテンプレートで定義されたFrontmatterの項目・メッセージボックス・
+セクション構成と照らし合わせて検証する。テンプレートから決まる部分（固定値の項目・
+メッセージボックス・関連リンク）はその場で修正し、欠落したり壊れたりしたセクションと
+Frontmatterの項目だけをLLMに再生成させて、記事に差し込むためのプロンプトを組み立てる。
+"""
+
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# テンプレートの値から変えてはいけないFrontmatterの項目
+FIXED_FRONTMATTER_KEYS = ("type", "published")
+
+_LLM_INSTRUCTIONS_BLOCK = re.compile(
+    r'<!-- LLM_INSTRUCTIONS_START -->.*?<!-- LLM_INSTRUCTIONS_END -->', re.DOTALL
+)
+_FRONTMATTER_KEY = re.compile(r'^([A-Za-z_][\w-]*):')
+_MESSAGE_BOX = re.compile(r'^:::message\n.*?\n:::$', re.MULTILINE | re.DOTALL)
+_SECTION_GUIDANCE = re.compile(r'`## (.+?)`\s*[:：]\s*(.+)$', re.MULTILINE)
+_FENCE = re.compile(r'^\s*(```|~~~)')
+_GENERATED_PLACEHOLDER = '<!-- LLMが生成 -->'
+
+
+class Issue:
+    """検証で見つかった問題"""
+
+    def __init__(self, kind: str, target: str, message: str):
+        """
+        Args:
+            kind: 問題の種類（frontmatter, message, missing_section, empty_section, unbalanced_fence）
+            target: 対象（Frontmatterの項目名、セクション見出しなど）
+            message: 説明
+        """
+        self.kind = kind
+        self.target = target
+        self.message = message
+
+    def __repr__(self):
+        return f"Issue({self.kind!r}, {self.target!r})"
+
+    def __str__(self):
+        return self.message
+
+
+class Article:
+    """Frontmatter・前文・セクションに分解した記事"""
+
+    def __init__(self, frontmatter: Optional[List[str]], preamble: str, sections: List[List[str]]):
+        # frontmatter は区切り線を除いた行のリスト、sections は [見出し, 本文] のリスト
+        self.frontmatter = frontmatter
+        self.preamble = preamble
+        self.sections = sections
+
+    @classmethod
+    def parse(cls, text: str, headings: Sequence[str] = ()) -> "Article":
+        """
+        記事を分解する（コードブロック内の見出しはセクションの区切りとみなさない）
+
+        headings（テンプレートのセクション見出し）に一致する見出しは、閉じていない
+        コードブロックの中にあってもセクションの区切りとみなす。
+        """
+        frontmatter = None
+        lines = text.splitlines(keepends=True)
+        position = 0
+        if lines and lines[0].rstrip() == '---':
+            for index in range(1, len(lines)):
+                if lines[index].rstrip() == '---':
+                    frontmatter = [line.rstrip('\n') for line in lines[1:index]]
+                    position = index + 1
+                    break
+
+        preamble = []
+        sections: List[List[str]] = []
+        in_fence = False
+        for line in lines[position:]:
+            if _FENCE.match(line):
+                in_fence = not in_fence
+            elif line.startswith('## ') and (not in_fence or line[3:].strip() in headings):
+                in_fence = False
+                sections.append([line[3:].strip(), ""])
+                continue
+            if sections:
+                sections[-1][1] += line
+            else:
+                preamble.append(line)
+        return cls(frontmatter, "".join(preamble), sections)
+
+    def frontmatter_values(self) -> Dict[str, str]:
+        """Frontmatterの項目と値（行の残り）の辞書を返す"""
+        values = {}
+        for line in self.frontmatter or []:
+            match = _FRONTMATTER_KEY.match(line)
+            if match:
+                values[match.group(1)] = line[match.end():].strip()
+        return values
+
+    def set_frontmatter(self, key: str, line: str) -> None:
+        """Frontmatterの項目の行を置き換える（なければ末尾に追加する）"""
+        if self.frontmatter is None:
+            self.frontmatter = []
+        for index, existing in enumerate(self.frontmatter):
+            match = _FRONTMATTER_KEY.match(existing)
+            if match and match.group(1) == key:
+                self.frontmatter[index] = line
+                return
+        self.frontmatter.append(line)
+
+    def section(self, heading: str) -> Optional[List[str]]:
+        for section in self.sections:
+            if section[0] == heading:
+                return section
+        return None
+
+    def render(self) -> str:
+        parts = []
+        if self.frontmatter is not None:
+            parts.append("---\n" + "".join(line + "\n" for line in self.frontmatter) + "---\n")
+        parts.append(self.preamble)
+        for heading, body in self.sections:
+            parts.append(f"## {heading}\n{body}")
+        return "".join(parts).rstrip("\n") + "\n"
+
+
+def _strip_comment(value: str) -> str:
+    """Frontmatterの値から行末のコメントを除く"""
+    return re.sub(r'\s+#.*$', '', value).strip()
+
+
+def _is_empty(body: str) -> bool:
+    return not body.replace(_GENERATED_PLACEHOLDER, '').strip()
+
+
+def _has_unbalanced_fence(body: str) -> bool:
+    return sum(1 for line in body.splitlines() if _FENCE.match(line)) % 2 == 1
+
+
+class ArticleSpec:
+    """準備済みテンプレートから読み取った記事の構成"""
+
+    def __init__(self, template_content: str):
+        """準備済みテンプレート（プレースホルダー置換済み）から構成を読み取る"""
+        instructions = _LLM_INSTRUCTIONS_BLOCK.search(template_content)
+        skeleton = Article.parse(_LLM_INSTRUCTIONS_BLOCK.sub('', template_content))
+
+        values = skeleton.frontmatter_values()
+        self.frontmatter_keys = list(values)
+        self.fixed_frontmatter = {
+            key: f"{key}: {_strip_comment(values[key])}" for key in FIXED_FRONTMATTER_KEYS if key in values
+        }
+        match = _MESSAGE_BOX.search(skeleton.preamble)
+        self.message_box = match.group(0) if match else None
+
+        # LLM指示より前のセクションは内容までテンプレートで決まっている
+        head = Article.parse(template_content[:instructions.start()] if instructions else "")
+        self.static_sections = {heading: body for heading, body in head.sections}
+        self.sections = [heading for heading, _ in skeleton.sections]
+        self.guidance = dict(_SECTION_GUIDANCE.findall(instructions.group(0))) if instructions else {}
+
+
+def validate_article(article_text: str, spec: ArticleSpec) -> List[Issue]:
+    """記事をテンプレートの構成と照らし合わせ、見つかった問題のリストを返す"""
+    article = Article.parse(article_text, spec.sections)
+    issues = []
+    if article.frontmatter is None:
+        issues.append(Issue("frontmatter", "*", "Frontmatterがありません"))
+    else:
+        values = article.frontmatter_values()
+        for key in spec.frontmatter_keys:
+            if not values.get(key):
+                issues.append(Issue("frontmatter", key, f"Frontmatterに {key} がありません"))
+            elif key in spec.fixed_frontmatter and f"{key}: {_strip_comment(values[key])}" != spec.fixed_frontmatter[key]:
+                issues.append(Issue("frontmatter", key, f"Frontmatterの {key} がテンプレートの値と異なります"))
+
+    if spec.message_box and spec.message_box not in article.preamble:
+        issues.append(Issue("message", ":::message", "メッセージボックスがないか、内容が異なります"))
+
+    for heading in spec.sections:
+        section = article.section(heading)
+        if section is None:
+            issues.append(Issue("missing_section", heading, f"セクション「{heading}」がありません"))
+        elif _is_empty(section[1]):
+            issues.append(Issue("empty_section", heading, f"セクション「{heading}」が空です"))
+        elif _has_unbalanced_fence(section[1]):
+            issues.append(Issue("unbalanced_fence", heading, f"セクション「{heading}」のコードブロックが閉じていません"))
+    return issues
+
+
+def repair_locally(article_text: str, spec: ArticleSpec, issues: List[Issue]) -> Tuple[str, List[Issue]]:
+    """
+    テンプレートだけで直せる問題を修正する
+
+    固定値のFrontmatterの項目、メッセージボックス、内容がテンプレートで決まっている
+    セクションを直す。戻り値は修正後の記事と、LLMによる再生成が必要な残りの問題。
+    """
+    article = Article.parse(article_text, spec.sections)
+    remaining = []
+    for issue in issues:
+        if issue.kind == "frontmatter" and issue.target in spec.fixed_frontmatter:
+            article.set_frontmatter(issue.target, spec.fixed_frontmatter[issue.target])
+        elif issue.kind == "message":
+            preamble = _MESSAGE_BOX.sub('', article.preamble).strip()
+            article.preamble = "\n" + spec.message_box + "\n\n" + (preamble + "\n\n" if preamble else "")
+        elif issue.kind != "frontmatter" and issue.target in spec.static_sections:
+            _splice_section(article, spec, issue.target, spec.static_sections[issue.target])
+        else:
+            remaining.append(issue)
+    return article.render(), remaining
+
+
+def build_repair_prompt(content: str, spec: ArticleSpec, issues: List[Issue]) -> str:
+    """再生成が必要なFrontmatterの項目とセクションだけを書かせるプロンプトを生成する"""
+    keys = [issue.target for issue in issues if issue.kind == "frontmatter"]
+    if "*" in keys:
+        keys = [key for key in spec.frontmatter_keys if key not in spec.fixed_frontmatter]
+    headings = [issue.target for issue in issues if issue.kind != "frontmatter"]
+
+    requests = []
+    if keys:
+        requests.append(
+            "- Frontmatterの次の項目だけを、`---` の行で囲んで出力してください: " + ", ".join(keys)
+        )
+    for heading in headings:
+        guidance = spec.guidance.get(heading)
+        requests.append(f"- `## {heading}`" + (f": {guidance}" if guidance else ""))
+
+    return f"""
+# 記事の部分的な再生成の指示
+
+以下の開発日記から生成したZenn記事の一部が欠けているか壊れています。
+次の部分だけを、記事に差し込める形で出力してください。
+
+{chr(10).join(requests)}
+
+- セクションは `## 見出し` の行から始めて、上の順に出力してください。
+- 指定していない部分、前置きや結びの文は出力しないでください。
+- コードブロックは必ず閉じてください。出力全体をコードブロックで囲まないでください。
+
+# 入力された開発日記
+{content}
+"""
+
+
+def apply_repair(article_text: str, response: str, spec: ArticleSpec, issues: List[Issue]) -> str:
+    """再生成した部分を記事に差し込む（応答に含まれない部分は元のまま残す）"""
+    article = Article.parse(article_text, spec.sections)
+    repaired = Article.parse(response.strip() + "\n", spec.sections)
+    if repaired.frontmatter is not None:
+        for key, value in repaired.frontmatter_values().items():
+            if key in spec.frontmatter_keys and key not in spec.fixed_frontmatter:
+                article.set_frontmatter(key, f"{key}: {value}")
+    targets = {issue.target for issue in issues if issue.kind != "frontmatter"}
+    for heading, body in repaired.sections:
+        if heading in targets and not _is_empty(body):
+            _splice_section(article, spec, heading, body)
+    return article.render()
+
+
+def _splice_section(article: Article, spec: ArticleSpec, heading: str, body: str) -> None:
+    """セクションの本文を置き換える（なければテンプレートの順序に合う位置に挿入する）"""
+    if not body.endswith("\n\n"):
+        body = body.rstrip("\n") + "\n\n"
+    section = article.section(heading)
+    if section is not None:
+        section[1] = body
+        return
+
+    order = list(spec.static_sections) + [h for h in spec.sections if h not in spec.static_sections]
+    rank = {h: index for index, h in enumerate(order)}
+    position = len(article.sections)
+    for index, (existing, _) in enumerate(article.sections):
+        if existing in rank and rank[existing] > rank.get(heading, len(order)):
+            position = index
+            break
+    if position > 0 and not article.sections[position - 1][1].endswith("\n\n"):
+        article.sections[position - 1][1] = article.sections[position - 1][1].rstrip("\n") + "\n\n"
+    article.sections.insert(position, [heading, body])
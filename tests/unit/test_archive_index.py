@@ -0,0 +1,110 @@
+"""
+Unit tests for the diary archive index
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from diary_converter.archive_index import ArchiveIndex, parse_diary_filename
+from diary_converter.backends import StubBackend
+from diary_converter.diary_converter import DiaryConverter
+
+TEMPLATE = str(Path(__file__).parent.parent.parent / "templates" / "zenn_template.md")
+
+
+class TestArchiveIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.logs = os.path.join(self.tmp_dir, "logs")
+        os.makedirs(self.logs)
+        self.index_path = os.path.join(self.tmp_dir, "index.json")
+        # 通し番号の順はファイル名の辞書順と一致しない（9 < 10）
+        for name in ["2025-03-01_9_development.md", "2025-03-02_10_development.md",
+                     "2025-03-03_11_development.md", "notes.md"]:
+            self.write(name)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name):
+        path = os.path.join(self.logs, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"# {name}\n")
+        return path
+
+    def test_parse_diary_filename(self):
+        self.assertEqual(parse_diary_filename("2025-03-01_9_development.md"), ("2025-03-01", "9"))
+        self.assertIsNone(parse_diary_filename("2025-03-01-development.md"))
+
+    def test_previous_follows_serial_order_and_scans_incrementally(self):
+        """Entries are ordered by serial number; unchanged directories are not rescanned."""
+        index = ArchiveIndex(self.index_path)
+        self.assertTrue(index.scan(self.logs))
+        self.assertEqual(len(index.entries), 3)
+        self.assertFalse(index.scan(self.logs))
+
+        self.assertIsNone(index.previous(os.path.join(self.logs, "2025-03-01_9_development.md")))
+        self.assertEqual(index.previous(os.path.join(self.logs, "2025-03-02_10_development.md"))["serial"], "9")
+        self.assertIsNone(index.previous_slug(os.path.join(self.logs, "2025-03-02_10_development.md")))
+
+        index.record_output(os.path.join(self.logs, "2025-03-01_9_development.md"), "/articles/dev-diary-9.md")
+        self.assertEqual(index.previous_slug(os.path.join(self.logs, "2025-03-02_10_development.md")), "dev-diary-9")
+        index.save()
+
+        reloaded = ArchiveIndex(self.index_path)
+        with patch("diary_converter.archive_index.os.scandir", side_effect=AssertionError("rescanned")):
+            self.assertEqual(
+                reloaded.previous_slug(os.path.join(self.logs, "2025-03-02_10_development.md")), "dev-diary-9"
+            )
+
+        os.remove(os.path.join(self.logs, "2025-03-02_10_development.md"))
+        new_file = self.write("2025-03-04_12_development.md")
+        self.assertEqual(reloaded.previous(new_file)["serial"], "11")
+        self.assertEqual(reloaded.previous(os.path.join(self.logs, "2025-03-03_11_development.md"))["serial"], "9")
+
+    def test_batch_chains_previous_article_slugs(self):
+        """A batch fills in each article's previous-article link from the index."""
+        with patch.dict(os.environ):
+            os.environ.pop("GOOGLE_API_KEY", None)
+            converter = DiaryConverter(template_path=TEMPLATE, backend=StubBackend(),
+                                       archive_index_path=self.index_path)
+        prompts = []
+        generate = converter.generate_with_gemini
+        converter.generate_with_gemini = lambda prompt, **kwargs: prompts.append(prompt) or generate(prompt, **kwargs)
+
+        results = converter.convert_batch(os.path.join(self.logs, "*_development.md"), os.path.join(self.tmp_dir, "articles"), max_workers=3)
+        self.assertTrue(all(r["success"] for r in results))
+        self.assertTrue(os.path.exists(self.index_path))
+
+        linked = [p for p in prompts if "articles/2025-03-01_9_development)" in p]
+        self.assertEqual(len(linked), 1)
+        self.assertIn("# 2025-03-02_10_development.md", linked[0])
+        self.assertTrue(any("articles/2025-03-02_10_development)" in p for p in prompts))
+
+    def test_failed_conversion_does_not_keep_slug(self):
+        """Slugs recorded before a batch are rolled back for diaries whose conversion failed."""
+        class FailingBackend(StubBackend):
+            def generate(self, prompt, system_instruction=None):
+                if "# 2025-03-02_10_development.md" in prompt:
+                    raise ValueError("変換に失敗しました")
+                return super().generate(prompt, system_instruction=system_instruction)
+
+        with patch.dict(os.environ):
+            os.environ.pop("GOOGLE_API_KEY", None)
+            converter = DiaryConverter(template_path=TEMPLATE, backend=FailingBackend(),
+                                       archive_index_path=self.index_path)
+        results = converter.convert_batch(os.path.join(self.logs, "*_development.md"), os.path.join(self.tmp_dir, "articles"))
+        self.assertEqual([r["success"] for r in results], [True, False, True])
+
+        reloaded = ArchiveIndex(self.index_path)
+        self.assertEqual(reloaded.get(os.path.join(self.logs, "2025-03-03_11_development.md"))["slug"],
+                         "2025-03-03_11_development")
+        self.assertIsNone(reloaded.get(os.path.join(self.logs, "2025-03-02_10_development.md"))["slug"])
+
+
+if __name__ == '__main__':
+    unittest.main()
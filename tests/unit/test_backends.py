@@ -0,0 +1,218 @@
+"""
+Unit tests for the LLM backends
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+from diary_converter.backends import BackendError, HedgedBackend, StubBackend
+from diary_converter.cache import ResponseCache
+from diary_converter.diary_converter import DiaryConverter
+from diary_converter.metrics import MetricsCollector
+from diary_converter.scheduler import RequestScheduler, is_retryable
+from diary_converter.tokens import estimate_tokens
+
+TEMPLATE = str(Path(__file__).parent.parent.parent / "templates" / "zenn_template.md")
+
+
+class TestStubBackend(unittest.TestCase):
+    def test_output_is_deterministic_and_sized(self):
+        """The same seed and prompt give the same article of roughly the requested size."""
+        first = StubBackend(output_chars=3000, seed=1).generate("prompt")
+        self.assertEqual(first, StubBackend(output_chars=3000, seed=1).generate("prompt"))
+        self.assertNotEqual(first, StubBackend(output_chars=3000, seed=2).generate("prompt"))
+        self.assertTrue(first.startswith("---\ntitle:"))
+        self.assertGreaterEqual(len(first), 3000)
+        self.assertLess(len(first), 3300)
+
+        backend = StubBackend(output_chars=1000, stream_chunk_chars=100)
+        chunks = list(backend.generate_stream("prompt"))
+        self.assertGreater(len(chunks), 5)
+        self.assertEqual("".join(chunks), StubBackend(output_chars=1000).generate("prompt"))
+
+    def test_latency_and_failures_are_reproducible(self):
+        """Failures are retryable and depend only on the seed, prompt and attempt, not on thread order."""
+        def outcomes():
+            sleeps = []
+            backend = StubBackend(latency=0.5, jitter=0.2, failure_rate=0.3, seed=7, sleep=sleeps.append)
+
+            def attempt(prompt):
+                try:
+                    backend.generate(prompt)
+                    return "ok"
+                except BackendError as e:
+                    self.assertTrue(is_retryable(e))
+                    return "failed"
+
+            prompts = [f"prompt-{i % 10}" for i in range(40)]
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(attempt, prompts))
+            self.assertTrue(all(0.4 <= delay <= 0.6 for delay in sleeps))
+            self.assertEqual(backend.stats["calls"], 40)
+            return sorted(zip(prompts, results)), backend.stats["failures"]
+
+        first, failures = outcomes()
+        self.assertEqual(outcomes(), (first, failures))
+        self.assertTrue(0 < failures < 40)
+
+
+class TestHedgedBackend(unittest.TestCase):
+    def setUp(self):
+        # 遅い主バックエンドは、テストの終わりに解放されるまで応答しない
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.slow = StubBackend("primary", latency=1.0, sleep=lambda seconds: self.release.wait(5))
+
+    def test_fallback_wins_when_primary_is_slow(self):
+        """A slow primary is hedged to the fallback model and the first result is used."""
+        fast = StubBackend("fallback", seed=1)
+        backend = HedgedBackend(self.slow, [fast], hedge_after=0.01)
+        start = time.monotonic()
+        self.assertEqual(backend.generate("prompt"), StubBackend(seed=1).generate("prompt"))
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(backend.stats["wins"], {"fallback:fallback": 1})
+        self.assertEqual(backend.stats["hedged"], 1)
+        self.assertEqual(backend.stats["discarded"], 1)
+        self.assertEqual(backend.model_name, "primary")
+
+        chunks = list(backend.generate_stream("prompt"))
+        self.assertEqual("".join(chunks), StubBackend(seed=1).generate("prompt"))
+
+    def test_failover_and_errors(self):
+        """Without a deadline the next path is tried only after an error; if all fail the last error is raised."""
+        failing = StubBackend("primary", failure_rate=1.0)
+        backend = HedgedBackend(failing, [StubBackend("fallback")])
+        self.assertTrue(backend.generate("prompt").startswith("---"))
+        self.assertEqual(backend.stats["wins"], {"fallback:fallback": 1})
+
+        backend = HedgedBackend(failing, hedge_after=0.01, hedges=2)
+        with self.assertRaises(BackendError) as caught:
+            backend.generate("prompt")
+        self.assertEqual(caught.exception.code, 503)
+        self.assertEqual(backend.stats["hedged"], 2)
+
+    def test_extra_requests_reserve_rate_limit(self):
+        """Duplicate and fallback requests each take their own share of the RPM/TPM budget."""
+        failing = StubBackend("primary", failure_rate=1.0)
+        scheduler = RequestScheduler(requests_per_minute=60, tokens_per_minute=10000, max_retries=0,
+                                     sleep=lambda seconds: None, clock=lambda: 0.0)
+        backend = HedgedBackend(failing, hedge_after=0.01, hedges=2, scheduler=scheduler)
+        with self.assertRaises(BackendError):
+            scheduler.call(backend.generate, "prompt", estimated_tokens=estimate_tokens("prompt"))
+        self.assertEqual(failing.stats["calls"], 3)
+        self.assertEqual(scheduler.stats["requests"], 3)
+        self.assertEqual(scheduler.request_bucket.tokens, 60 - 3)
+        self.assertEqual(scheduler.token_bucket.tokens, 10000 - 3 * estimate_tokens("prompt"))
+
+    def test_primary_within_deadline_sends_no_hedge(self):
+        """A primary that answers before the deadline is used without extra requests."""
+        backend = HedgedBackend(StubBackend("primary"), hedge_after=5.0)
+        backend.generate("prompt")
+        self.assertEqual(backend.stats["hedged"], 0)
+        self.assertEqual(backend.stats["wins"], {"primary:primary": 1})
+
+
+class TestConverterWithStubBackend(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.source_dir = os.path.join(self.tmp_dir, "logs")
+        os.makedirs(self.source_dir)
+        for i in range(1, 6):
+            with open(os.path.join(self.source_dir, f"2025-03-0{i}_{i:03d}_development.md"), 'w', encoding='utf-8') as f:
+                f.write(f"# 開発日記 {i}\n\n作業内容 {i}\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_batch_with_retries_and_cache_offline(self):
+        """A batch runs offline on the stub: failures are retried and a second run is served from the cache."""
+        with patch.dict(os.environ):
+            os.environ.pop("GOOGLE_API_KEY", None)
+            backend = StubBackend(failure_rate=0.3, seed=3)
+            converter = DiaryConverter(
+                template_path=TEMPLATE, backend=backend, max_retries=10,
+                cache_dir=os.path.join(self.tmp_dir, "cache")
+            )
+        converter.scheduler.sleep = lambda seconds: None
+        output_dir = os.path.join(self.tmp_dir, "articles")
+
+        results = converter.convert_batch(self.source_dir, output_dir)
+        self.assertTrue(all(r["success"] for r in results))
+        self.assertEqual(backend.stats["calls"] - backend.stats["failures"], 5)
+        self.assertEqual(converter.scheduler.stats["retries"], backend.stats["failures"])
+
+        calls = backend.stats["calls"]
+        converter.convert_batch(self.source_dir, output_dir)
+        self.assertEqual(backend.stats["calls"], calls)
+
+    def test_reuse_prefix_shares_system_instruction(self):
+        """With prefix reuse the fixed instructions go as one shared system instruction, counted on every call."""
+        requests = []
+
+        class RecordingBackend(StubBackend):
+            def generate(self, prompt, system_instruction=None):
+                requests.append((prompt, system_instruction))
+                return super().generate(prompt, system_instruction=system_instruction)
+
+        backend = RecordingBackend()
+        converter = DiaryConverter(template_path=TEMPLATE, backend=backend, reuse_prefix=True,
+                                   archive_index_path=os.path.join(self.tmp_dir, "index.json"))
+        results = converter.convert_batch(self.source_dir, os.path.join(self.tmp_dir, "articles"))
+        self.assertTrue(all(r["success"] for r in results))
+
+        instructions = {system_instruction for _, system_instruction in requests}
+        self.assertEqual(len(instructions), 1)
+        instruction = instructions.pop()
+        self.assertIn("[連番]", instruction)
+        for prompt, _ in requests:
+            self.assertNotIn(instruction.strip(), prompt)
+        self.assertTrue(any("`[連番]`: 003" in prompt and "作業内容 3" in prompt for prompt, _ in requests))
+        self.assertTrue(any("`[前回の記事スラッグ]`: 2025-03-02" in prompt for prompt, _ in requests))
+        self.assertEqual(converter.prefix_stats["requests"], 5)
+        self.assertEqual(converter.prefix_stats["prefixes"], 1)
+        # システム指示は呼び出しごとに送信されるので、毎回のトークン数を数える
+        self.assertEqual(converter.prefix_stats["prefix_tokens"], 5 * estimate_tokens(instruction))
+
+    def test_converter_wraps_backend_for_latency_policy(self):
+        """The converter hedges to fallback models and records the extra requests in its metrics."""
+        release = threading.Event()
+        self.addCleanup(release.set)
+        metrics = MetricsCollector()
+        converter = DiaryConverter(
+            template_path=TEMPLATE, metrics=metrics, hedge_after=0.01, fallback_models=["fast"],
+            backend=StubBackend("slow", latency=1.0, sleep=lambda seconds: release.wait(5))
+        )
+        # 代替モデルは主バックエンドの設定を引き継ぐので、待機だけを外す
+        converter.backend.paths[1][1].sleep = lambda seconds: None
+        source = os.path.join(self.source_dir, "2025-03-01_001_development.md")
+        self.assertTrue(converter.convert(source, os.path.join(self.tmp_dir, "out.md")))
+        self.assertEqual(converter.backend.model_name, "slow")
+        self.assertEqual(converter.backend.stats["wins"], {"fallback:fast": 1})
+        counters = metrics.summary()["counters"]
+        self.assertEqual((counters["hedged_requests"], counters["hedge_wins"]), (1, 1))
+
+    def test_cache_keys_unchanged_without_prefix_reuse(self):
+        """Without prefix reuse the request and its cache key are the same as before."""
+        converter = DiaryConverter(template_path=TEMPLATE, backend=StubBackend(),
+                                   cache_dir=os.path.join(self.tmp_dir, "cache"))
+        source = os.path.join(self.source_dir, "2025-03-01_001_development.md")
+        result = converter.dry_run_file(source)
+        self.assertIsNone(result["system_instruction"])
+        self.assertEqual(result["prefix_tokens"], 0)
+        self.assertEqual(
+            converter.response_cache_key(result["prompt"]),
+            ResponseCache.make_key(result["prompt"], "stub", *converter.backend.cache_configs())
+        )
+        self.assertNotEqual(converter.response_cache_key(result["prompt"]),
+                            converter.response_cache_key(result["prompt"], "指示"))
+
+
+if __name__ == '__main__':
+    unittest.main()
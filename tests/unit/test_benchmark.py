@@ -0,0 +1,77 @@
+"""
+Unit tests for the pipeline benchmark harness
+"""
+
+import os
+import copy
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from diary_converter.benchmark import (
+    STAGES, compare_to_baseline, generate_corpus, measure_memory, percentile, run_benchmark,
+)
+
+TEMPLATE = str(Path(__file__).parent.parent.parent / "templates" / "zenn_template.md")
+
+
+class TestBenchmark(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_percentile(self):
+        """Percentiles interpolate between samples."""
+        values = [4.0, 1.0, 3.0, 2.0, 5.0]
+        self.assertEqual(percentile(values, 50), 3.0)
+        self.assertAlmostEqual(percentile(values, 95), 4.8)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_corpus_is_reproducible(self):
+        """The synthetic corpus is sized as requested and identical for the same seed."""
+        first = generate_corpus(os.path.join(self.tmp_dir, "a"), 3, 5000, seed=1)
+        second = generate_corpus(os.path.join(self.tmp_dir, "b"), 3, 5000, seed=1)
+        self.assertEqual([os.path.basename(p) for p in first], [os.path.basename(p) for p in second])
+        for a, b in zip(first, second):
+            text = Path(a).read_text(encoding='utf-8')
+            self.assertEqual(text, Path(b).read_text(encoding='utf-8'))
+            self.assertGreaterEqual(len(text), 5000)
+            self.assertIn("- ユーザー:", text)
+
+    def test_run_and_compare_to_baseline(self):
+        """A run reports every stage and the batch throughput, and slower local stages are flagged."""
+        results = run_benchmark([3], [1000], TEMPLATE, latency=0.0, work_dir=self.tmp_dir)
+        scenario = results["scenarios"]["3x1000"]
+        self.assertEqual(list(scenario["stages"]), STAGES)
+        self.assertEqual(scenario["stages"]["read"]["count"], 3)
+        self.assertEqual(scenario["throughput"]["failures"], 0)
+        self.assertGreater(scenario["throughput"]["files_per_second"], 0)
+
+        self.assertEqual(compare_to_baseline(results, results), [])
+        baseline = copy.deepcopy(results)
+        for stats in baseline["scenarios"]["3x1000"]["stages"].values():
+            stats["p50"] = stats["p50"] / 10 - 0.001
+        regressed = {r["stage"] for r in compare_to_baseline(results, baseline)}
+        self.assertIn("local", regressed)
+        self.assertNotIn("llm", regressed)
+        self.assertNotIn("total", regressed)
+
+    def test_measure_memory(self):
+        """A large diary converts with heap use well under three copies of the source, and post-processing streams."""
+        result = measure_memory(2000000, TEMPLATE, work_dir=self.tmp_dir, timeout=300)
+        self.assertGreater(result["source_bytes"], 4 * 1024 * 1024)
+        self.assertLess(result["convert_heap_peak"], 2.5 * result["source_bytes"])
+        self.assertLess(result["process_file_heap_peak"], result["process_file_bytes"])
+
+    def test_measure_memory_worker_failure(self):
+        """A worker that dies without a result raises instead of hanging."""
+        missing = os.path.join(self.tmp_dir, "missing_template.md")
+        with self.assertRaises(RuntimeError):
+            measure_memory(1000, missing, work_dir=self.tmp_dir, timeout=60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Unit tests for the response cache module
+"""
+
+import os
+import json
+import time
+import hashlib
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+from diary_converter.cache import ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        """Set up a temporary cache directory."""
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the temporary cache directory."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_key_depends_on_prompt_model_and_config(self):
+        """Keys change when any input of the request changes."""
+        base = ResponseCache.make_key("prompt", "model-a", {"temperature": 0.2})
+        self.assertEqual(base, ResponseCache.make_key("prompt", "model-a", {"temperature": 0.2}))
+        self.assertNotEqual(base, ResponseCache.make_key("prompt!", "model-a", {"temperature": 0.2}))
+        self.assertNotEqual(base, ResponseCache.make_key("prompt", "model-b", {"temperature": 0.2}))
+        self.assertNotEqual(base, ResponseCache.make_key("prompt", "model-a", {"temperature": 0.3}))
+
+    def test_key_matches_json_of_whole_request(self):
+        """Keys of large prompts are hashed in slices but equal the hash of the whole request's JSON."""
+        prompt = ("日本語の\"引用\"\n\tタブ\\ \u2028 " * 40000) + "end"
+        configs = ({"temperature": 0.2, "safety": [{"category": "x"}]},)
+        payload = json.dumps({"prompt": prompt, "model": "model-a", "configs": configs},
+                             sort_keys=True, ensure_ascii=False)
+        self.assertEqual(ResponseCache.make_key(prompt, "model-a", *configs),
+                         hashlib.sha256(payload.encode('utf-8')).hexdigest())
+
+    def test_set_and_get(self):
+        """Stored responses are returned on lookup."""
+        cache = ResponseCache(self.cache_dir)
+        key = ResponseCache.make_key("prompt", "model")
+        self.assertIsNone(cache.get(key))
+        cache.set(key, "応答テキスト")
+        self.assertEqual(cache.get(key), "応答テキスト")
+
+    def test_expired_entries_are_ignored(self):
+        """Entries older than max_age are treated as misses and removed."""
+        cache = ResponseCache(self.cache_dir, max_age=60)
+        key = ResponseCache.make_key("prompt", "model")
+        cache.set(key, "old")
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        # 作成時刻を過去に書き換えて期限切れにする
+        with open(path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        entry["created"] = time.time() - 3600
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        self.assertIsNone(cache.get(key))
+        self.assertFalse(os.path.exists(path))
+
+    def test_max_entries_evicts_least_recently_used(self):
+        """The least recently used entries are evicted beyond max_entries."""
+        cache = ResponseCache(self.cache_dir, max_entries=2)
+        keys = [ResponseCache.make_key(f"prompt{i}", "model") for i in range(3)]
+        now = time.time()
+        for i, key in enumerate(keys[:2]):
+            cache.set(key, str(i))
+            os.utime(os.path.join(self.cache_dir, f"{key}.json"), (now - 100 + i, now - 100 + i))
+        cache.set(keys[2], "2")
+        self.assertIsNone(cache.get(keys[0]))
+        self.assertEqual(cache.get(keys[1]), "1")
+        self.assertEqual(cache.get(keys[2]), "2")
+
+    def test_lookup_keeps_creation_time_and_unlimited_set_does_not_scan(self):
+        """Lookups refresh only the last-use time, so entries expire by creation; no limits means no scan."""
+        cache = ResponseCache(self.cache_dir, max_age=60)
+        keys = [ResponseCache.make_key(f"prompt{i}", "model") for i in range(2)]
+        paths = [os.path.join(self.cache_dir, f"{key}.json") for key in keys]
+        for key in keys:
+            cache.set(key, "text")
+        with open(paths[0], 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["created"], os.stat(paths[0]).st_mtime)
+
+        # 1件目を1時間前に作成されたエントリにする（最終利用時刻は現在）
+        old = time.time() - 3600
+        with open(paths[0], 'w', encoding='utf-8') as f:
+            json.dump({"created": old, "model": "model", "text": "text"}, f)
+        os.utime(paths[0], (time.time(), old))
+        created = os.stat(paths[1]).st_mtime
+        self.assertEqual(cache.get(keys[1]), "text")
+        self.assertEqual(os.stat(paths[1]).st_mtime, created)
+        # 作成から max_age を過ぎたエントリは、直前に利用されていても削除される
+        self.assertEqual(cache.evict(), 1)
+        self.assertFalse(os.path.exists(paths[0]))
+
+        unlimited = ResponseCache(self.cache_dir)
+        with unittest.mock.patch("diary_converter.cache.os.scandir", side_effect=AssertionError("scanned")):
+            unlimited.set(keys[0], "new")
+            self.assertEqual(unlimited.evict(), 0)
+        self.assertEqual(unlimited.get(keys[0]), "new")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+"""
+Unit tests for the chunked conversion helpers
+"""
+
+import unittest
+from pathlib import Path
+
+from diary_converter.chunking import split_diary, extract_sections, build_chunk_prompt, merge_chunk_notes
+
+
+class TestChunking(unittest.TestCase):
+    def setUp(self):
+        """Build a long multi-session diary."""
+        self.template_file = Path(__file__).parent.parent.parent / "templates" / "zenn_template.md"
+        turns = "".join(f"- ユーザー: 質問{i} " + "詳細" * 40 + f"\n- LLM: 回答{i} " + "説明" * 40 + "\n" for i in range(10))
+        self.diary = (
+            "# 2025-04-02 開発日記\n\n"
+            "## 今日の開発テーマ\n\nバッチ変換の実装\n\n"
+            "## 会話ログ\n\n" + turns +
+            "\n## まとめ\n\n今日は分割変換を実装した。\n"
+        )
+
+    def test_split_preserves_content_and_respects_size(self):
+        """Chunks reassemble to the original and stay within the size limit when possible."""
+        chunks = split_diary(self.diary, 500)
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual("".join(chunks), self.diary)
+        self.assertTrue(all(len(chunk) <= 500 for chunk in chunks))
+        # 会話ログは発言の途中では分割されない
+        for chunk in chunks[1:]:
+            self.assertTrue(chunk.startswith(("- ユーザー:", "- LLM:", "## ", "\n")), chunk[:20])
+
+    def test_small_diary_is_one_chunk(self):
+        """Diaries shorter than the limit are not split."""
+        self.assertEqual(split_diary(self.diary, len(self.diary)), [self.diary])
+
+    def test_sections_and_prompts(self):
+        """Template sections drive the per-chunk extraction prompts."""
+        sections = extract_sections(self.template_file.read_text(encoding='utf-8'))
+        self.assertEqual(sections[0], "はじめに")
+        self.assertEqual(sections[-1], "まとめ")
+        self.assertNotIn("関連リンク", sections)
+
+        prompt = build_chunk_prompt("本文", 2, 3, sections)
+        self.assertIn("（2/3）", prompt)
+        self.assertIn("## 所感", prompt)
+        self.assertTrue(prompt.rstrip().endswith("本文"))
+
+        merged = merge_chunk_notes(["## はじめに\n- A\n", "## まとめ\n- B\n"])
+        self.assertIn("# 部分 1/2 の要点\n## はじめに\n- A", merged)
+        self.assertIn("# 部分 2/2 の要点\n## まとめ\n- B", merged)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+"""
+Unit tests for the shared model client pool
+"""
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from diary_converter.client_pool import ModelPool
+
+CONFIG = {"temperature": 0.2, "max_output_tokens": 4096}
+SAFETY = [{"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"}]
+
+
+class TestModelPool(unittest.TestCase):
+    @patch('google.generativeai.configure')
+    def test_configure_once_per_key(self, mock_configure):
+        """The SDK is configured once per API key."""
+        pool = ModelPool()
+        for _ in range(3):
+            pool.configure("key-a")
+        pool.configure("key-b")
+        self.assertEqual(mock_configure.call_count, 2)
+
+    @patch('google.generativeai.GenerativeModel')
+    def test_models_are_reused_per_name_and_config(self, MockGenerativeModel):
+        """Models are built once per model name and configuration, even across threads."""
+        MockGenerativeModel.side_effect = lambda **kwargs: object()
+        pool = ModelPool()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            models = list(executor.map(lambda _: pool.get("gemini-a", dict(CONFIG), SAFETY), range(32)))
+        self.assertEqual(len({id(m) for m in models}), 1)
+        self.assertEqual(pool.stats, {"created": 1, "reused": 31})
+
+        self.assertIsNot(pool.get("gemini-b", CONFIG, SAFETY), models[0])
+        self.assertIsNot(pool.get("gemini-a", dict(CONFIG, temperature=0.5), SAFETY), models[0])
+        self.assertEqual(MockGenerativeModel.call_count, 3)
+
+        pool.clear()
+        self.assertIsNot(pool.get("gemini-a", CONFIG, SAFETY), models[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,10 +3,13 @@ Unit tests for the diary converter module
 """
 
 import os
+import shutil
+import tempfile
 import unittest
 from pathlib import Path
 from unittest.mock import patch, MagicMock # MagicMock を追加
-from diary_converter.diary_converter import DiaryConverter
+from diary_converter.diary_converter import DiaryConverter, TemplateManager
+from diary_converter.preprocess import SourcePreprocessor
 
 class TestDiaryConverter(unittest.TestCase):
     def setUp(self):
@@ -89,11 +92,373 @@ Mocked LLM response content for unit test.
             # モック応答に含まれるFrontmatterの一部を確認
             self.assertIn("emoji: \"🧪\"", content)
 
+    @patch('diary_converter.diary_converter.genai.GenerativeModel')
+    def test_post_process_before_write(self, MockGenerativeModel):
+        """Test that generated text is post-processed in memory before it is written."""
+        mock_response = MagicMock()
+        mock_response.text = "```markdown\n---\ntitle: \"Mock\"\n---\n##はじめに\nWrapped response.\n```"
+        MockGenerativeModel.return_value.generate_content.return_value = mock_response
+
+        converter = DiaryConverter(template_path=str(self.template_file))
+        converter.convert(str(self.input_file), str(self.output_file))
+        self.assertEqual(
+            self.output_file.read_text(encoding='utf-8'),
+            "---\ntitle: \"Mock\"\n---\n## はじめに\nWrapped response."
+        )
+
+        raw = DiaryConverter(template_path=str(self.template_file), post_process=False)
+        raw.convert(str(self.input_file), str(self.output_file))
+        self.assertEqual(self.output_file.read_text(encoding='utf-8'), mock_response.text)
+
+    @patch('diary_converter.diary_converter.genai.GenerativeModel')
+    def test_convert_batch(self, MockGenerativeModel):
+        """Test batch conversion of a directory with a bounded worker pool."""
+        mock_response = MagicMock()
+        mock_response.text = "## はじめに\nMocked batch response.\n"
+        MockGenerativeModel.return_value.generate_content.return_value = mock_response
+
+        work_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, work_dir)
+        source_dir = work_dir / "diaries"
+        source_dir.mkdir()
+        for serial in ("001", "002", "003"):
+            shutil.copy(self.input_file, source_dir / f"2025-04-0{serial[-1]}_{serial}_development.md")
+        # ファイル名から通し番号を抽出できない日記は失敗として集計される
+        shutil.copy(self.input_file, source_dir / "invalid.md")
+        output_dir = work_dir / "articles"
+
+        converter = DiaryConverter(template_path=str(self.template_file))
+        results = converter.convert_batch(str(source_dir), str(output_dir), max_workers=2)
+
+        self.assertEqual(len(results), 4)
+        self.assertEqual([r["success"] for r in results], [True, True, True, False])
+        self.assertIsNotNone(results[-1]["error"])
+        for r in results[:3]:
+            self.assertTrue(Path(r["destination"]).exists())
+            self.assertEqual(Path(r["destination"]).parent, output_dir)
+        self.assertEqual(MockGenerativeModel.return_value.generate_content.call_count, 3)
+        # モデルは全ファイルで共有される
+        MockGenerativeModel.assert_called_once()
+
+    @patch('diary_converter.diary_converter.genai.GenerativeModel')
+    def test_response_cache(self, MockGenerativeModel):
+        """Test that unchanged diaries are served from the response cache."""
+        mock_response = MagicMock()
+        mock_response.text = "## はじめに\nMocked cached response.\n"
+        mock_instance = MockGenerativeModel.return_value
+        mock_instance.generate_content.return_value = mock_response
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+
+        converter = DiaryConverter(template_path=str(self.template_file), cache_dir=cache_dir)
+        converter.convert(str(self.input_file), str(self.output_file))
+        converter.convert(str(self.input_file), str(self.output_file))
+        self.assertEqual(mock_instance.generate_content.call_count, 1)
+        self.assertIn("Mocked cached response.", self.output_file.read_text(encoding='utf-8'))
+
+        # no_cache=True の場合はキャッシュを読まずにAPIを呼び出す
+        bypass = DiaryConverter(template_path=str(self.template_file), cache_dir=cache_dir, no_cache=True)
+        bypass.convert(str(self.input_file), str(self.output_file))
+        self.assertEqual(mock_instance.generate_content.call_count, 2)
+
+    @patch('diary_converter.diary_converter.genai.GenerativeModel')
+    def test_incremental_batch(self, MockGenerativeModel):
+        """Test that incremental batches skip diaries whose outputs are up to date."""
+        mock_response = MagicMock()
+        mock_response.text = "## はじめに\nMocked incremental response.\n"
+        mock_instance = MockGenerativeModel.return_value
+        mock_instance.generate_content.return_value = mock_response
+
+        work_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, work_dir)
+        source_dir = work_dir / "diaries"
+        source_dir.mkdir()
+        for serial in ("001", "002"):
+            shutil.copy(self.input_file, source_dir / f"2025-04-0{serial[-1]}_{serial}_development.md")
+        output_dir = work_dir / "articles"
+        manifest_path = work_dir / "manifest.json"
+
+        def run_batch():
+            converter = DiaryConverter(
+                template_path=str(self.template_file),
+                manifest_path=str(manifest_path),
+                incremental=True
+            )
+            return converter.convert_batch(str(source_dir), str(output_dir))
+
+        first = run_batch()
+        self.assertEqual([r["skipped"] for r in first], [False, False])
+        self.assertTrue(manifest_path.exists())
+
+        # 1件だけ変更して再実行すると、変更のない日記はスキップされる
+        changed = source_dir / "2025-04-02_002_development.md"
+        changed.write_text(changed.read_text(encoding='utf-8') + "\n追記\n", encoding='utf-8')
+        second = run_batch()
+        self.assertEqual([r["skipped"] for r in second], [True, False])
+        self.assertTrue(all(r["success"] for r in second))
+        self.assertEqual(mock_instance.generate_content.call_count, 3)
+
+    @patch('diary_converter.diary_converter.genai.GenerativeModel')
+    def test_incremental_reconverts_when_settings_change(self, MockGenerativeModel):
+        """Test that changing an option that affects the article invalidates the manifest entry."""
+        mock_response = MagicMock()
+        mock_response.text = "## はじめに\nMocked settings response.\n"
+        mock_instance = MockGenerativeModel.return_value
+        mock_instance.generate_content.return_value = mock_response
+
+        work_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, work_dir)
+        manifest_path = work_dir / "manifest.json"
+        output_file = work_dir / "article.md"
+
+        def convert(**options):
+            converter = DiaryConverter(template_path=str(self.template_file), manifest_path=str(manifest_path),
+                                       incremental=True, **options)
+            return converter.convert(str(self.input_file), str(output_file))
+
+        self.assertTrue(convert())
+        self.assertFalse(convert())
+        # 日記が前処理で変わらなくても、前処理・その上限・後処理・検証・分割の設定を変えると再変換する
+        for options in ({"preprocessor": SourcePreprocessor()},
+                        {"preprocessor": SourcePreprocessor(max_line_chars=500)},
+                        {"post_process": False},
+                        {"validate": True},
+                        {"chunk_size": 100000},
+                        {"reuse_prefix": True}):
+            self.assertTrue(convert(**options), options)
+            self.assertFalse(convert(**options), options)
+        # 検証では記事の修復のための呼び出しが加わることがある
+        self.assertGreaterEqual(mock_instance.generate_content.call_count, 7)
+
+    @patch('diary_converter.diary_converter.genai.GenerativeModel')
+    def test_stream_conversion(self, MockGenerativeModel):
+        """Test streaming conversion with on-the-fly post-processing."""
+        chunks = []
+        for text in ("```markdown\n---\ntitle: \"Mock\"\n", "---\n## はじめに\n", "Streamed content.\n```"):
+            chunk = MagicMock()
+            chunk.text = text
+            chunks.append(chunk)
+        mock_instance = MockGenerativeModel.return_value
+        mock_instance.generate_content.return_value = iter(chunks)
+
+        converter = DiaryConverter(template_path=str(self.template_file), stream=True)
+        converter.convert(str(self.input_file), str(self.output_file))
+
+        mock_instance.generate_content.assert_called_once()
+        self.assertTrue(mock_instance.generate_content.call_args.kwargs["stream"])
+        self.assertEqual(
+            self.output_file.read_text(encoding='utf-8'),
+            "---\ntitle: \"Mock\"\n---\n## はじめに\nStreamed content."
+        )
+        # 一時ファイルが残っていないこと
+        self.assertEqual([p for p in self.output_file.parent.iterdir() if p.name.endswith(".tmp")], [])
+
+    @patch('diary_converter.diary_converter.genai.GenerativeModel')
+    def test_retry_on_rate_limit(self, MockGenerativeModel):
+        """Test that a transient 429 is retried instead of aborting the run."""
+        rate_limited = Exception("429 Resource has been exhausted. Please retry in 2s.")
+        rate_limited.code = 429
+        mock_response = MagicMock()
+        mock_response.text = "## はじめに\nRecovered after retry.\n"
+        mock_instance = MockGenerativeModel.return_value
+        mock_instance.generate_content.side_effect = [rate_limited, mock_response]
+
+        converter = DiaryConverter(template_path=str(self.template_file))
+        sleeps = []
+        converter.scheduler.sleep = sleeps.append
+        converter.convert(str(self.input_file), str(self.output_file))
+
+        self.assertEqual(sleeps, [2.0])
+        self.assertEqual(converter.scheduler.stats["retries"], 1)
+        self.assertIn("Recovered after retry.", self.output_file.read_text(encoding='utf-8'))
+
+    @patch('diary_converter.diary_converter.genai.GenerativeModel')
+    def test_dry_run(self, MockGenerativeModel):
+        """Test that dry runs build prompts and estimates offline without an API key."""
+        with patch.dict(os.environ):
+            os.environ.pop("GOOGLE_API_KEY", None)
+            with self.assertRaises(ValueError):
+                DiaryConverter(template_path=str(self.template_file))
+            converter = DiaryConverter(template_path=str(self.template_file), dry_run=True)
+
+        result = converter.dry_run_file(str(self.input_file))
+        source = self.input_file.read_text(encoding='utf-8')
+        self.assertIn(source, result["prompt"])
+        self.assertIn("# LLM変換指示", result["prompt"])
+        self.assertGreater(result["input_tokens"], 0)
+        self.assertGreater(result["estimated_output_tokens"], 0)
+        self.assertFalse(result["exceeds_output_limit"])
+        self.assertFalse(result["cached"])
+
+        # 出力上限を超えそうな巨大な日記を検出できる
+        work_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, work_dir)
+        huge = work_dir / "2025-04-03_002_development.md"
+        huge.write_text(source * 20, encoding='utf-8')
+        results = converter.dry_run_batch(str(work_dir))
+        self.assertTrue(results[0]["exceeds_output_limit"])
+        MockGenerativeModel.assert_not_called()
+
+        with self.assertRaises(RuntimeError):
+            converter.convert(str(self.input_file), str(self.output_file))
+
+    @patch('diary_converter.diary_converter.genai.GenerativeModel')
+    def test_chunked_conversion(self, MockGenerativeModel):
+        """Test that oversized diaries are split, summarized per chunk and consolidated."""
+        def generate(prompt, **kwargs):
+            response = MagicMock()
+            if "# 要点抽出の指示" in prompt:
+                response.text = "## 実装内容\n- 部分の要点\n"
+            else:
+                self.assertIn("# 部分 1/", prompt)
+                response.text = "## はじめに\nConsolidated article.\n"
+            return response
+
+        mock_instance = MockGenerativeModel.return_value
+        mock_instance.generate_content.side_effect = generate
+
+        converter = DiaryConverter(template_path=str(self.template_file), chunk_size=300)
+        converter.convert(str(self.input_file), str(self.output_file))
+
+        chunk_count = converter.dry_run_file(str(self.input_file))["chunks"]
+        self.assertGreater(chunk_count, 1)
+        self.assertEqual(mock_instance.generate_content.call_count, chunk_count + 1)
+        self.assertIn("Consolidated article.", self.output_file.read_text(encoding='utf-8'))
+
+    @patch('diary_converter.diary_converter.genai.GenerativeModel')
+    def test_fanout_conversion(self, MockGenerativeModel):
+        """Test that one diary is read once and rendered through several templates."""
+        def generate(prompt, **kwargs):
+            response = MagicMock()
+            response.text = "## Summary\nShort.\n" if "要約だけ" in prompt else "## はじめに\nFull.\n"
+            return response
+
+        mock_instance = MockGenerativeModel.return_value
+        mock_instance.generate_content.side_effect = generate
+
+        work_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, work_dir)
+        source = work_dir / "2025-04-01_001_development.md"
+        shutil.copy(self.input_file, source)
+        summary_template = work_dir / "summary.md"
+        summary_template.write_text(
+            "<!-- LLM_INSTRUCTIONS_START -->\n要約だけを書いてください。No.[連番]\n<!-- LLM_INSTRUCTIONS_END -->\n",
+            encoding='utf-8'
+        )
+        targets = [(None, str(work_dir / "zenn.md")), (str(summary_template), str(work_dir / "summary_out.md"))]
+
+        def run_fanout():
+            converter = DiaryConverter(template_path=str(self.template_file), incremental=True,
+                                       manifest_path=str(work_dir / "manifest.json"))
+            with patch.object(converter, "read_source_diary", wraps=converter.read_source_diary) as read:
+                results = converter.convert_fanout(str(source), targets)
+            self.assertEqual(read.call_count, 1)
+            return results
+
+        results = run_fanout()
+        self.assertTrue(all(r["success"] and not r["skipped"] for r in results))
+        self.assertEqual(mock_instance.generate_content.call_count, 2)
+        self.assertIn("Full.", (work_dir / "zenn.md").read_text(encoding='utf-8'))
+        self.assertIn("Short.", (work_dir / "summary_out.md").read_text(encoding='utf-8'))
+
+        # 出力ごとにマニフェストに記録されるので、再実行ではどちらもスキップされる
+        self.assertEqual([r["skipped"] for r in run_fanout()], [True, True])
+        self.assertEqual(mock_instance.generate_content.call_count, 2)
+
+    @patch('diary_converter.diary_converter.genai.GenerativeModel')
+    def test_batch_with_source_list_and_output_pattern(self, MockGenerativeModel):
+        """Test a batch over several patterns whose destinations come from an output pattern."""
+        mock_response = MagicMock()
+        mock_response.text = "## はじめに\nMocked pattern response.\n"
+        MockGenerativeModel.return_value.generate_content.return_value = mock_response
+
+        work_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, work_dir)
+        for directory, serial in (("team-a", "001"), ("team-a", "002"), ("team-b", "003")):
+            (work_dir / directory).mkdir(exist_ok=True)
+            shutil.copy(self.input_file, work_dir / directory / f"2025-04-0{serial[-1]}_{serial}_development.md")
+        output_dir = work_dir / "articles"
+
+        converter = DiaryConverter(template_path=str(self.template_file))
+        # 複数のパターンに一致した日記は1回だけ変換する
+        sources = [str(work_dir / "team-a"), str(work_dir / "team-*" / "*_001_development.md"), str(work_dir / "team-b")]
+        results = converter.convert_batch(sources, str(output_dir), max_workers=2,
+                                          output_pattern="{date}/dev-diary-{number}.md")
+
+        self.assertTrue(all(r["success"] for r in results))
+        self.assertEqual(
+            [Path(r["destination"]).relative_to(output_dir).as_posix() for r in results],
+            ["2025-04-01/dev-diary-001.md", "2025-04-02/dev-diary-002.md", "2025-04-03/dev-diary-003.md"]
+        )
+        self.assertTrue(all(Path(r["destination"]).exists() for r in results))
+        self.assertEqual(MockGenerativeModel.return_value.generate_content.call_count, 3)
+
+        # 出力先が重複するパターンや未知の項目は変換を始める前にエラーになる
+        with self.assertRaises(ValueError):
+            converter.convert_batch(sources, str(output_dir), output_pattern="article.md")
+        with self.assertRaises(ValueError):
+            converter.convert_batch(sources, str(output_dir), output_pattern="{slug}.md")
+        self.assertEqual(MockGenerativeModel.return_value.generate_content.call_count, 3)
+
     def tearDown(self):
         """Clean up after each test method."""
         # Remove output file if it exists
         if self.output_file.exists():
             self.output_file.unlink()
 
+class TestTemplateManager(unittest.TestCase):
+    def setUp(self):
+        """Set up a temporary template file."""
+        self.work_dir = Path(tempfile.mkdtemp())
+        self.template_file = self.work_dir / "template.md"
+        self.template_file.write_text(
+            "title: No.[連番]\n"
+            "<!-- LLM_INSTRUCTIONS_START -->\n[LLM Model名]で[連番]を生成\n<!-- LLM_INSTRUCTIONS_END -->\n"
+            "- [前回](https://zenn.dev/centervil/articles/[前回の記事スラッグ])\n",
+            encoding='utf-8'
+        )
+
+    def tearDown(self):
+        """Remove the temporary template file."""
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_prepare_template(self):
+        """Placeholders are replaced in one pass and the instructions are pre-extracted."""
+        manager = TemplateManager(str(self.template_file))
+        template = manager.load_compiled_template()
+
+        prepared = manager.prepare_template(template, "gemini", "012", "prev-slug")
+        self.assertEqual(
+            prepared,
+            "title: No.012\n"
+            "<!-- LLM_INSTRUCTIONS_START -->\ngeminiで012を生成\n<!-- LLM_INSTRUCTIONS_END -->\n"
+            "- [前回](https://zenn.dev/centervil/articles/prev-slug)\n"
+        )
+        self.assertEqual(prepared.instructions, "\ngeminiで012を生成\n")
+
+        # スラッグがない場合はプレースホルダーが残る。文字列のテンプレートも受け付ける
+        unprepared = manager.prepare_template(manager.load_template(), "gemini", "012", "")
+        self.assertIn("[前回の記事スラッグ]", unprepared)
+
+        converter = DiaryConverter(template_path=str(self.template_file))
+        converter_prompt = converter.generate_prompt("日記本文", prepared)
+        self.assertIn("geminiで012を生成", converter_prompt)
+        self.assertNotIn("title:", converter_prompt)
+
+    def test_compiled_template_is_cached_until_modified(self):
+        """Compiled templates are reused until the file changes on disk."""
+        manager = TemplateManager(str(self.template_file))
+        first = manager.load_compiled_template()
+        self.assertIs(TemplateManager(str(self.template_file)).load_compiled_template(), first)
+
+        self.template_file.write_text("updated [連番]\n", encoding='utf-8')
+        stat = self.template_file.stat()
+        os.utime(self.template_file, ns=(stat.st_atime_ns, first.mtime[0] + 10 ** 9))
+        updated = manager.load_compiled_template()
+        self.assertIsNot(updated, first)
+        self.assertEqual(updated.content, "updated [連番]\n")
+
+
 if __name__ == '__main__':
     unittest.main()
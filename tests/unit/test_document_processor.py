@@ -0,0 +1,128 @@
+"""
+Unit tests for the document processor module
+"""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from diary_converter.document_processor import DocumentProcessor
+
+
+class TestDocumentProcessor(unittest.TestCase):
+    def setUp(self):
+        """Set up a processor instance."""
+        self.processor = DocumentProcessor()
+
+    def test_remove_markdown_code_block(self):
+        """Documents wrapped in a markdown code block are unwrapped."""
+        content = "```markdown\n---\ntitle: \"t\"\n---\n## はじめに\n本文\n```"
+        self.assertEqual(
+            self.processor.remove_markdown_code_block(content),
+            "---\ntitle: \"t\"\n---\n## はじめに\n本文"
+        )
+
+    def test_process_stream_matches_whole_document_processing(self):
+        """Streaming unwrapping matches whole-document processing for any chunking."""
+        processor = DocumentProcessor(rules=["remove_markdown_code_block"])
+        documents = [
+            "```markdown\n---\ntitle: a\n---\n## 実装内容\n```python\nx = 1\n```\n\n```",
+            "```Markdown\n本文  \n\n```",
+            "```markdown\n閉じマーカーなし\n",
+            "```\nコードブロックのみ\n```",
+            "```python\nprint(1)\n",
+            "---\ntitle: a\n---\n通常の記事\n```\n",
+            "```",
+            "",
+        ]
+        for document in documents:
+            expected = processor.remove_markdown_code_block(document)
+            for size in (1, 2, 3, 7, len(document) + 1):
+                chunks = [document[i:i + size] for i in range(0, len(document), size)]
+                with self.subTest(document=document, size=size):
+                    self.assertEqual("".join(processor.process_stream(chunks)), expected)
+
+    def test_process_stream_yields_before_end(self):
+        """Content is emitted before the stream has finished."""
+        def chunks():
+            yield "```markdown\n"
+            yield "## はじめに\n"
+            yield "本文"
+            raise AssertionError("the first line should be available before the stream ends")
+
+        stream = self.processor.process_stream(chunks())
+        self.assertEqual(next(stream), "## はじめに\n")
+
+
+    def test_rules_apply_in_a_single_pass(self):
+        """Frontmatter, heading and image rules fix only the lines in their scope."""
+        content = (
+            "```markdown\n"
+            "---\n"
+            "title: 開発日記: 後処理（開発日記 No.007）\n"
+            "emoji: \"📝\"\n"
+            "topics: [\"開発日記\"]\n"
+            "---\n"
+            "##はじめに\n"
+            "![構成図](./images/diagram.png)\n"
+            "#タグ\n"
+            "```python\n"
+            "##not a heading\n"
+            "```\n"
+            "![外部](https://example.com/images/a.png)\n"
+            "```"
+        )
+        expected = (
+            "---\n"
+            "title: \"開発日記: 後処理（開発日記 No.007）\"\n"
+            "emoji: \"📝\"\n"
+            "topics: [\"開発日記\"]\n"
+            "---\n"
+            "## はじめに\n"
+            "![構成図](/images/diagram.png)\n"
+            "#タグ\n"
+            "```python\n"
+            "##not a heading\n"
+            "```\n"
+            "![外部](https://example.com/images/a.png)"
+        )
+        self.assertEqual(self.processor.process_text(content), expected)
+        self.assertEqual(self.processor.last_changes, {
+            "remove_markdown_code_block": 1,
+            "fix_frontmatter_format": 1,
+            "normalize_headings": 1,
+            "fix_image_paths": 1,
+        })
+
+        # 修正済みのドキュメントは変更されない
+        self.assertEqual(self.processor.process_text(expected), expected)
+        self.assertEqual(self.processor.last_changes, {})
+
+    def test_process_files(self):
+        """Many files are processed in one call, sequentially or with a process pool."""
+        work_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, work_dir)
+        paths = []
+        for i in range(4):
+            path = work_dir / f"article{i}.md"
+            path.write_text("```markdown\n##はじめに\n```" if i % 2 else "## はじめに\n", encoding='utf-8')
+            paths.append(str(path))
+        missing = str(work_dir / "missing.md")
+
+        for max_workers in (None, 2):
+            with self.subTest(max_workers=max_workers):
+                results = self.processor.process_files(paths + [missing], max_workers=max_workers)
+                self.assertEqual([r["success"] for r in results], [True, True, True, True, False])
+                self.assertIsNotNone(results[-1]["error"])
+                for path in paths:
+                    self.assertEqual(Path(path).read_text(encoding='utf-8'), "## はじめに\n" if path.endswith(("0.md", "2.md")) else "## はじめに")
+
+    def test_unknown_rule(self):
+        """Unknown rule names are rejected."""
+        with self.assertRaises(ValueError):
+            DocumentProcessor(rules=["no_such_rule"])
+
+
+if __name__ == '__main__':
+    unittest.main()
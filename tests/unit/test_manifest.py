@@ -0,0 +1,67 @@
+"""
+Unit tests for the build manifest module
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from diary_converter.manifest import BuildManifest, content_hash
+
+
+class TestBuildManifest(unittest.TestCase):
+    def setUp(self):
+        """Set up a temporary working directory with one converted article."""
+        self.work_dir = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.work_dir, "manifest.json")
+        self.source = os.path.join(self.work_dir, "2025-04-02_001_development.md")
+        self.output = os.path.join(self.work_dir, "articles", "2025-04-02_001_development.md")
+        os.makedirs(os.path.dirname(self.output))
+        with open(self.output, 'w', encoding='utf-8') as f:
+            f.write("converted")
+
+    def tearDown(self):
+        """Remove the temporary working directory."""
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _record(self, manifest):
+        manifest.record(self.source, self.output, content_hash("src"), content_hash("tpl"), "model")
+
+    def test_round_trip(self):
+        """Recorded entries survive a save/load cycle."""
+        manifest = BuildManifest(self.manifest_path)
+        self._record(manifest)
+        manifest.save()
+
+        reloaded = BuildManifest(self.manifest_path)
+        self.assertTrue(reloaded.is_up_to_date(
+            self.source, self.output, content_hash("src"), content_hash("tpl"), "model"))
+
+    def test_changes_invalidate_entry(self):
+        """Any changed input or a modified output makes the entry stale."""
+        manifest = BuildManifest(self.manifest_path)
+        self._record(manifest)
+        args = (self.source, self.output, content_hash("src"), content_hash("tpl"), "model")
+        self.assertTrue(manifest.is_up_to_date(*args))
+        self.assertFalse(manifest.is_up_to_date(self.source, self.output, content_hash("changed"), content_hash("tpl"), "model"))
+        self.assertFalse(manifest.is_up_to_date(self.source, self.output, content_hash("src"), content_hash("changed"), "model"))
+        self.assertFalse(manifest.is_up_to_date(self.source, self.output, content_hash("src"), content_hash("tpl"), "other"))
+        self.assertFalse(manifest.is_up_to_date(*args, settings_hash=content_hash("settings")))
+
+        manifest.record(*args, settings_hash=content_hash("settings"))
+        self.assertTrue(manifest.is_up_to_date(*args, settings_hash=content_hash("settings")))
+        self.assertFalse(manifest.is_up_to_date(*args, settings_hash=content_hash("other settings")))
+        self.assertFalse(manifest.is_up_to_date(*args))
+        self._record(manifest)
+
+        with open(self.output, 'w', encoding='utf-8') as f:
+            f.write("edited by hand")
+        self.assertFalse(manifest.is_up_to_date(*args))
+
+        os.remove(self.output)
+        self.assertFalse(manifest.is_up_to_date(*args))
+
+
+if __name__ == '__main__':
+    unittest.main()
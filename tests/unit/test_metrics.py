@@ -0,0 +1,89 @@
+"""
+Unit tests for per-stage conversion metrics
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from diary_converter.backends import StubBackend
+from diary_converter.diary_converter import DiaryConverter
+from diary_converter.metrics import MetricsCollector, current_record, increment, timed
+
+TEMPLATE = str(Path(__file__).parent.parent.parent / "templates" / "zenn_template.md")
+
+
+class TestMetricsCollector(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.source_dir = os.path.join(self.tmp_dir, "logs")
+        os.makedirs(self.source_dir)
+        for i in range(1, 4):
+            with open(os.path.join(self.source_dir, f"2025-03-0{i}_{i:03d}_development.md"), 'w', encoding='utf-8') as f:
+                f.write(f"# 開発日記 {i}\n\n" + "作業内容を記録した。\n\n" * (40 * i))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_helpers_are_no_ops_outside_a_conversion(self):
+        """Timing and counters outside a recorded conversion are ignored."""
+        with timed("prompt"):
+            increment("api_calls")
+        self.assertIsNone(current_record())
+
+        metrics = MetricsCollector()
+        with self.assertRaises(ValueError):
+            with metrics.conversion("broken.md"):
+                raise ValueError("boom")
+        self.assertEqual(metrics.summary()["status"], {"failed": 1})
+
+    def test_batch_records_stages_and_counters_per_file(self):
+        """Each conversion records its stages, retries and tokens, including chunked and streamed runs."""
+        metrics = MetricsCollector()
+        converter = DiaryConverter(
+            template_path=TEMPLATE, backend=StubBackend(failure_rate=0.3, seed=5),
+            max_retries=10, chunk_size=500, metrics=metrics
+        )
+        converter.scheduler.sleep = lambda seconds: None
+
+        results = converter.convert_batch(self.source_dir, os.path.join(self.tmp_dir, "articles"))
+        self.assertTrue(all(r["success"] for r in results))
+
+        summary = metrics.summary()
+        self.assertEqual(summary["conversions"], 3)
+        self.assertEqual(summary["status"], {"converted": 3})
+        for stage in ["read", "template_prepare", "prompt", "api", "post_process", "write", "total"]:
+            self.assertEqual(summary["stages"][stage]["count"], 3, stage)
+        self.assertIn("chunk_map", summary["stages"])
+        self.assertEqual(summary["counters"]["api_calls"], converter.scheduler.stats["requests"])
+        self.assertEqual(summary["counters"]["retries"], converter.scheduler.stats["retries"])
+        self.assertGreater(summary["counters"]["prompt_tokens"], 0)
+        self.assertGreater(summary["counters"]["response_tokens"], 0)
+        for record in summary["files"]:
+            self.assertLessEqual(record["stages"]["write"], record["stages"]["total"])
+
+        converter.stream = True
+        converter.chunk_size = None
+        converter.convert(os.path.join(self.source_dir, "2025-03-01_001_development.md"),
+                          os.path.join(self.tmp_dir, "stream.md"))
+        streamed = metrics.summary()["files"][-1]
+        self.assertGreaterEqual(streamed["stages"]["write"], 0)
+        self.assertGreater(streamed["counters"]["response_tokens"], 0)
+
+        json_path = os.path.join(self.tmp_dir, "metrics", "summary.json")
+        prom_path = os.path.join(self.tmp_dir, "metrics", "diary_converter.prom")
+        metrics.write_json(json_path)
+        metrics.write_prometheus(prom_path)
+        with open(json_path, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["conversions"], 4)
+        prom = Path(prom_path).read_text(encoding='utf-8')
+        self.assertIn('diary_converter_conversions_total{status="converted"} 4', prom)
+        self.assertIn('diary_converter_stage_seconds_count{stage="api"} 4', prom)
+        self.assertIn("diary_converter_retries_total", prom)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+Unit tests for the atomic output writer
+"""
+
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from diary_converter.document_processor import DocumentProcessor
+from diary_converter.output_writer import OutputWriter
+
+
+class TestOutputWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "articles", "article.md")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_unchanged_content_is_not_rewritten(self):
+        """Writing identical content leaves the file, its inode and mtime untouched."""
+        writer = OutputWriter()
+        self.assertTrue(writer.write_text(self.path, "# 記事\n"))
+        before = os.stat(self.path)
+        os.utime(self.path, ns=(before.st_atime_ns, before.st_mtime_ns - 10**9))
+        before = os.stat(self.path)
+
+        self.assertFalse(writer.write_text(self.path, "# 記事\n"))
+        after = os.stat(self.path)
+        self.assertEqual((after.st_ino, after.st_mtime_ns), (before.st_ino, before.st_mtime_ns))
+
+        self.assertTrue(writer.write_text(self.path, "# 記事（更新）\n"))
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), "# 記事（更新）\n")
+        self.assertEqual(writer.stats, {"written": 2, "unchanged": 1})
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["article.md"])
+
+    def test_permissions_follow_umask_and_existing_file(self):
+        """New files get the usual umask-based mode; rewrites keep the existing mode."""
+        umask = os.umask(0o022)
+        try:
+            OutputWriter().write_text(self.path, "a")
+        finally:
+            os.umask(umask)
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o644)
+
+        os.chmod(self.path, 0o664)
+        OutputWriter().write_text(self.path, "b")
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o664)
+
+    def test_directories_are_created_once_per_writer(self):
+        """A batch of writes into one directory creates it only once, and recovers if it disappears."""
+        writer = OutputWriter()
+        with patch("diary_converter.output_writer.os.makedirs", wraps=os.makedirs) as makedirs:
+            for i in range(5):
+                writer.write_text(os.path.join(self.tmp_dir, "out", f"{i}.md"), str(i))
+            self.assertEqual(makedirs.call_count, 1)
+
+        shutil.rmtree(os.path.join(self.tmp_dir, "out"))
+        self.assertTrue(writer.write_text(os.path.join(self.tmp_dir, "out", "again.md"), "x"))
+
+    def test_streaming_write_is_atomic(self):
+        """A failed streaming write keeps the previous output; an identical one does not replace it."""
+        writer = OutputWriter()
+        writer.write_text(self.path, "old\n")
+        with self.assertRaises(RuntimeError):
+            with writer.open_atomic(self.path) as f:
+                f.write("partial")
+                raise RuntimeError("stream broke")
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), "old\n")
+
+        inode = os.stat(self.path).st_ino
+        with writer.open_atomic(self.path) as f:
+            f.write("old\n")
+        self.assertEqual(os.stat(self.path).st_ino, inode)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["article.md"])
+
+    def test_document_processor_skips_unchanged_files(self):
+        """Post-processing an already clean document does not rewrite it."""
+        writer = OutputWriter()
+        writer.write_text(self.path, "---\ntitle: \"a\"\n---\n\n## 見出し\n")
+        inode = os.stat(self.path).st_ino
+        processor = DocumentProcessor()
+        self.assertTrue(processor.process(self.path))
+        self.assertEqual(os.stat(self.path).st_ino, inode)
+
+        writer.write_text(self.path, "##見出し\n")
+        self.assertTrue(processor.process(self.path))
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), "## 見出し\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
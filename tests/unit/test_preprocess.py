@@ -0,0 +1,145 @@
+"""
+Unit tests for the source diary preprocessing
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from diary_converter.backends import StubBackend
+from diary_converter.diary_converter import DiaryConverter
+from diary_converter.preprocess import MARKER, SourcePreprocessor
+
+TEMPLATE = str(Path(__file__).parent.parent.parent / "templates" / "zenn_template.md")
+
+TRACE = "Traceback (most recent call last):\n" + "".join(
+    f'  File "app/module_{i}.py", line {i}, in handler_{i}\n    result = handler_{i + 1}(request)\n' for i in range(30)
+) + "ValueError: invalid token\n"
+
+
+def build_diary():
+    """貼り付けたログ・繰り返したスタックトレース・進捗表示を含む開発日記を組み立てる"""
+    return (
+        "# 開発日記\n\n"
+        "- ユーザー: テストが失敗します。ログを貼ります。エラーの原因を一緒に調べてもらえますか？昨日までは通っていたので、依存パッケージの更新が怪しいと思っています。よろしくお願いします。\n\n"
+        f"```\n{TRACE}```\n\n\n\n"
+        "- ユーザー: テストが失敗します。ログを貼ります。エラーの原因を一緒に調べてもらえますか？昨日までは通っていたので、依存パッケージの更新が怪しいと思っています。よろしくお願いします。\n\n"
+        f"```\n{TRACE}```\n\n"
+        "```\n"
+        + "".join(f"\x1b[32mDownloading\x1b[0m  {p}%|{'#' * (p // 10)}| {p}/100\n" for p in range(0, 101, 10))
+        + "waiting for server\n" * 5
+        + "done   \n```\n\n"
+        "## まとめ\n\n原因はトークンの検証でした。\n"
+    )
+
+
+class TestSourcePreprocessor(unittest.TestCase):
+    def test_compacts_noise_duplicates_and_long_fences(self):
+        """Repeated blocks, progress output and long logs shrink; the first occurrence and the error tail stay."""
+        diary = build_diary()
+        processed, stats = SourcePreprocessor(max_fence_lines=20, fence_tail_lines=5).process(diary)
+
+        self.assertEqual(stats["duplicate_blocks"], 2)
+        self.assertEqual(stats["truncated_fences"], 1)
+        self.assertEqual(processed.count("よろしくお願いします。"), 1)
+        self.assertEqual(processed.count("前に出てきた内容と同じため省略しました"), 2)
+        self.assertIn("ValueError: invalid token", processed)
+        self.assertIn(f"{MARKER} 42 行を省略しました", processed)
+        # 進捗表示は最後の1行だけ、繰り返される行は1行にまとめ、制御文字と行末の空白は除く
+        self.assertNotIn("\x1b", processed)
+        self.assertNotIn(" 90/100", processed)
+        self.assertIn(f"{MARKER} 進捗表示 10 行を省略しました\nDownloading  100%|##########| 100/100", processed)
+        self.assertIn(f"waiting for server\n{MARKER} 前の行が 4 回繰り返されています\ndone\n```", processed)
+        self.assertNotIn("\n\n\n", processed)
+        self.assertIn("## まとめ\n\n原因はトークンの検証でした。\n", processed)
+        self.assertTrue(processed.endswith("\n"))
+
+        self.assertEqual(stats["bytes_before"], len(diary.encode('utf-8')))
+        self.assertEqual(stats["bytes_removed"], stats["bytes_before"] - len(processed.encode('utf-8')))
+        self.assertGreater(stats["tokens_removed"], 0)
+
+    def test_options_and_unchanged_input(self):
+        """Each stage can be disabled, and a clean diary passes through unchanged."""
+        clean = "# 開発日記\n\n作業内容\n\n```python\nprint(1)\n```\n"
+        processed, stats = SourcePreprocessor().process(clean)
+        self.assertEqual(processed, clean)
+        self.assertEqual((stats["bytes_removed"], stats["tokens_removed"]), (0, 0))
+
+        diary = build_diary()
+        processed, stats = SourcePreprocessor(dedupe=False, strip_noise=False, max_fence_lines=None,
+                                              max_line_chars=None).process(diary)
+        self.assertEqual(processed, diary)
+
+        long_line = "x" * 50
+        processed, stats = SourcePreprocessor(max_line_chars=10).process(long_line)
+        self.assertEqual(processed, "x" * 10 + f" ... {MARKER} 以降の 40 文字を省略しました")
+        self.assertEqual(stats["truncated_lines"], 1)
+
+        with self.assertRaises(ValueError):
+            SourcePreprocessor(max_fence_lines=10, fence_tail_lines=10)
+
+    def test_tables_with_percentages_are_kept(self):
+        """Table rows with percentages are not mistaken for progress output, inside or outside fences."""
+        table = (
+            "| 項目 | 変更前 | 変更後 |\n"
+            "| --- | --- | --- |\n"
+            "| cpu | 50% | 30% |\n"
+            "| memory | 80% | 45% |\n"
+            "| disk | 10% | 12% |\n"
+        )
+        diary = f"# ベンチマーク\n\n{table}\n```\n{table}```\n"
+        processed, stats = SourcePreprocessor().process(diary)
+        self.assertEqual(processed, diary)
+        self.assertEqual(stats["noise_lines"], 0)
+
+    def test_long_lines_without_progress_are_fast(self):
+        """Long separator and bar lines that are not progress output are checked in linear time."""
+        lines = [
+            "━" * 20000,
+            "█" * 20000 + " 100",
+            "━" * 20000 + "|" + "━" * 20000 + " 45%",
+            "[" + "=" * 20000,
+            "9" * 20000 + "%",
+        ]
+        diary = "```\n" + "\n".join(lines) + "\n```\n"
+        started = time.perf_counter()
+        processed, stats = SourcePreprocessor(max_line_chars=None).process(diary)
+        self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertEqual(processed, diary)
+        self.assertEqual(stats["noise_lines"], 0)
+
+        progress = "".join(f"{'━' * (p // 10)} {p}%\n" for p in range(50, 101, 10))
+        processed, stats = SourcePreprocessor().process(progress)
+        self.assertEqual(processed, f"{MARKER} 進捗表示 5 行を省略しました\n{'━' * 10} 100%\n")
+
+
+class TestConverterPreprocess(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp_dir, "2025-03-01_12_development.md")
+        with open(self.source, 'w', encoding='utf-8') as f:
+            f.write(build_diary())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_preprocessed_prompt_is_smaller(self):
+        """The prompt is built from the compacted diary and the savings are reported."""
+        plain = DiaryConverter(template_path=TEMPLATE, backend=StubBackend(), dry_run=True).dry_run_file(self.source)
+        converter = DiaryConverter(template_path=TEMPLATE, backend=StubBackend(), dry_run=True,
+                                   preprocessor=SourcePreprocessor(max_fence_lines=20, fence_tail_lines=5))
+        compacted = converter.dry_run_file(self.source)
+
+        self.assertLess(compacted["input_tokens"], plain["input_tokens"])
+        self.assertNotIn("\x1b", compacted["prompt"])
+        stats = converter.preprocess_stats
+        self.assertEqual(stats["files"], 1)
+        self.assertEqual(stats["duplicate_blocks"], 2)
+        self.assertEqual(plain["input_tokens"] - compacted["input_tokens"], stats["tokens_removed"])
+
+
+if __name__ == '__main__':
+    unittest.main()
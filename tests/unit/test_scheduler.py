@@ -0,0 +1,123 @@
+"""
+Unit tests for the request scheduler module
+"""
+
+import unittest
+
+from diary_converter.scheduler import RequestScheduler, TokenBucket, is_retryable, retry_after_seconds
+from diary_converter.tokens import estimate_tokens
+
+
+class FakeClock:
+    """A manually advanced clock whose sleep moves time forward."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class APIError(Exception):
+    """An error carrying an HTTP status code like google.api_core exceptions."""
+
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+
+class TestRequestScheduler(unittest.TestCase):
+    def test_retryable_errors(self):
+        """Rate limit and transient server errors are retryable, others are not."""
+        self.assertTrue(is_retryable(APIError("quota", 429)))
+        self.assertTrue(is_retryable(APIError("unavailable", 503)))
+        self.assertTrue(is_retryable(ConnectionError("reset")))
+        self.assertFalse(is_retryable(APIError("bad request", 400)))
+        self.assertFalse(is_retryable(ValueError("broken")))
+
+    def test_retry_after_hint(self):
+        """Retry-after hints are read from attributes and messages."""
+        self.assertEqual(retry_after_seconds(APIError("429 Please retry in 12.5s.", 429)), 12.5)
+        self.assertEqual(retry_after_seconds(APIError("retry_delay {\n  seconds: 7\n}", 429)), 7.0)
+        self.assertIsNone(retry_after_seconds(APIError("quota exceeded", 429)))
+
+    def test_retries_with_backoff_and_counts(self):
+        """Retryable errors are retried with backoff until the call succeeds."""
+        clock = FakeClock()
+        scheduler = RequestScheduler(max_retries=3, base_delay=1.0, sleep=clock.sleep, clock=clock, rng=lambda: 0.5)
+        errors = [APIError("unavailable", 503), APIError("Please retry in 4s", 429)]
+
+        def flaky():
+            if errors:
+                raise errors.pop(0)
+            return "ok"
+
+        self.assertEqual(scheduler.call(flaky), "ok")
+        # 1回目はジッター付きバックオフ、2回目はサーバーの指定に従う
+        self.assertEqual(clock.sleeps, [0.5, 4.0])
+        self.assertEqual(scheduler.stats["retries"], 2)
+        self.assertEqual(scheduler.stats["requests"], 3)
+        self.assertEqual(scheduler.stats["backoff_seconds"], 4.5)
+
+    def test_retry_after_hint_is_capped(self):
+        """A server-supplied wait longer than max_delay is clamped to max_delay."""
+        clock = FakeClock()
+        scheduler = RequestScheduler(max_retries=1, max_delay=30.0, sleep=clock.sleep, clock=clock)
+        errors = [APIError("Please retry in 86400s", 429)]
+
+        def limited():
+            if errors:
+                raise errors.pop(0)
+            return "ok"
+
+        self.assertEqual(scheduler.call(limited), "ok")
+        self.assertEqual(clock.sleeps, [30.0])
+
+    def test_gives_up_after_max_retries_and_on_fatal_errors(self):
+        """Non-retryable errors and exhausted retries are raised."""
+        clock = FakeClock()
+        scheduler = RequestScheduler(max_retries=2, sleep=clock.sleep, clock=clock, rng=lambda: 0.0)
+
+        def always_busy():
+            raise APIError("busy", 503)
+
+        with self.assertRaises(APIError):
+            scheduler.call(always_busy)
+        self.assertEqual(scheduler.stats["requests"], 3)
+
+        def fatal():
+            raise APIError("bad request", 400)
+
+        with self.assertRaises(APIError):
+            scheduler.call(fatal)
+        self.assertEqual(scheduler.stats["failures"], 2)
+
+    def test_rate_limits_throttle_requests(self):
+        """Requests beyond the per-minute budget wait for the bucket to refill."""
+        clock = FakeClock()
+        scheduler = RequestScheduler(requests_per_minute=2, tokens_per_minute=100,
+                                     sleep=clock.sleep, clock=clock)
+        for _ in range(3):
+            scheduler.call(lambda: None, estimated_tokens=10)
+        self.assertEqual(clock.sleeps, [30.0])
+        self.assertEqual(scheduler.stats["throttled_seconds"], 30.0)
+
+        # トークン数の上限も同様に待機時間へ反映される
+        bucket = TokenBucket(60, clock)
+        self.assertEqual(bucket.reserve(90), 30.0)
+
+    def test_estimate_tokens(self):
+        """Token estimates count ASCII by groups of four and other characters individually."""
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("abcd"), 1)
+        self.assertEqual(estimate_tokens("abcde"), 2)
+        self.assertEqual(estimate_tokens("開発日記"), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
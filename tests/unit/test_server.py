@@ -0,0 +1,149 @@
+"""
+Unit tests for the conversion service
+"""
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from pathlib import Path
+from diary_converter.backends import StubBackend
+from diary_converter.diary_converter import DiaryConverter
+from diary_converter.server import (
+    ConversionService, JobStore, create_server,
+    STATUS_FAILED, STATUS_QUEUED, STATUS_RUNNING, STATUS_SUCCEEDED,
+)
+
+TEMPLATE = str(Path(__file__).parent.parent.parent / "templates" / "zenn_template.md")
+
+
+class TestJobStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "jobs.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_jobs_are_claimed_in_order_and_survive_restart(self):
+        """Queued jobs are claimed oldest first; jobs interrupted while running are requeued on restart."""
+        store = JobStore(self.db_path)
+        first = store.submit("/a.md", "/out/a.md")
+        second = store.submit("/b.md", "/out/b.md")
+        self.assertEqual(first["status"], STATUS_QUEUED)
+
+        claimed = store.claim_next()
+        self.assertEqual(claimed["id"], first["id"])
+        self.assertEqual(store.get(first["id"])["status"], STATUS_RUNNING)
+        store.close()
+
+        store = JobStore(self.db_path)
+        self.assertEqual(store.counts(), {STATUS_QUEUED: 2})
+        self.assertEqual(store.claim_next()["id"], first["id"])
+        self.assertEqual(store.claim_next()["id"], second["id"])
+        self.assertIsNone(store.claim_next())
+        store.close()
+
+
+class TestConversionService(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.source_file = os.path.join(self.tmp_dir, "2025-03-01_7_development.md")
+        with open(self.source_file, 'w', encoding='utf-8') as f:
+            f.write("# 開発日記\n\n今日はサービスを作った。\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def request(self, base_url, path, body=None, content_type="application/json"):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {"Content-Type": content_type} if data else {}
+        request = urllib.request.Request(base_url + path, data=data, headers=headers,
+                                         method="POST" if data else "GET")
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+
+    def wait_for(self, base_url, job_id):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            _, job = self.request(base_url, f"/jobs/{job_id}")
+            if job["status"] not in (STATUS_QUEUED, STATUS_RUNNING):
+                return job
+            time.sleep(0.02)
+        self.fail(f"job {job_id} did not finish")
+
+    def start_service(self):
+        converter = DiaryConverter(template_path=TEMPLATE, backend=StubBackend(latency=0.01))
+        store = JobStore(":memory:")
+        service = ConversionService(converter, store, workers=2, poll_interval=0.05, output_root=self.tmp_dir)
+        server = create_server(service, port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        service.start()
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+            service.stop()
+            store.close()
+        self.addCleanup(stop)
+        return f"http://127.0.0.1:{server.server_address[1]}", store
+
+    def test_http_jobs_run_through_worker_pool(self):
+        """Jobs submitted over HTTP are converted offline by the worker pool and expose their status."""
+        base_url, _ = self.start_service()
+        destination = os.path.join(self.tmp_dir, "out", "article.md")
+        status, job = self.request(base_url, "/jobs", {"source": self.source_file, "destination": destination})
+        self.assertEqual(status, 202)
+        self.assertEqual(self.wait_for(base_url, job["id"])["status"], STATUS_SUCCEEDED)
+        with open(destination, 'r', encoding='utf-8') as f:
+            self.assertIn("## はじめに", f.read())
+
+        missing = os.path.join(self.tmp_dir, "missing.md")
+        _, failed = self.request(base_url, "/jobs", {"source": missing, "destination": destination})
+        failed = self.wait_for(base_url, failed["id"])
+        self.assertEqual(failed["status"], STATUS_FAILED)
+        self.assertTrue(failed["error"])
+
+        _, listing = self.request(base_url, "/jobs")
+        self.assertEqual(len(listing["jobs"]), 2)
+        _, health = self.request(base_url, "/health")
+        self.assertEqual(health["jobs"], {STATUS_SUCCEEDED: 1, STATUS_FAILED: 1})
+
+        with self.assertRaises(urllib.error.HTTPError) as ctx:
+            self.request(base_url, "/jobs", {"source": self.source_file})
+        self.assertEqual(ctx.exception.code, 400)
+
+    def test_rejects_non_json_and_destinations_outside_output_root(self):
+        """Cross-origin style form posts get 415, and destinations escaping the output root get 400."""
+        base_url, store = self.start_service()
+        outside = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outside)
+        os.symlink(outside, os.path.join(self.tmp_dir, "link"))
+
+        body = {"source": self.source_file, "destination": "out/article.md"}
+        for content_type in ("text/plain", "application/x-www-form-urlencoded"):
+            with self.assertRaises(urllib.error.HTTPError) as ctx:
+                self.request(base_url, "/jobs", body, content_type=content_type)
+            self.assertEqual(ctx.exception.code, 415)
+
+        for destination in ("../article.md", os.path.join(outside, "article.md"), "link/article.md", "."):
+            with self.assertRaises(urllib.error.HTTPError) as ctx:
+                self.request(base_url, "/jobs", {"source": self.source_file, "destination": destination})
+            self.assertEqual(ctx.exception.code, 400, destination)
+        self.assertEqual(store.counts(), {})
+        self.assertEqual(os.listdir(outside), [])
+
+        status, job = self.request(base_url, "/jobs", body, content_type="application/json; charset=utf-8")
+        self.assertEqual(status, 202)
+        self.assertEqual(job["destination"], os.path.join(os.path.realpath(self.tmp_dir), "out", "article.md"))
+        self.assertEqual(self.wait_for(base_url, job["id"])["status"], STATUS_SUCCEEDED)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+Unit tests for the source reader
+"""
+
+import os
+import shutil
+import hashlib
+import tempfile
+import unittest
+
+from diary_converter.source_reader import iter_text, read_text, text_sha256
+
+
+class TestSourceReader(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_matches_text_mode_read(self):
+        """Chunked decoding gives the same text as a text-mode read, including newlines split across chunks."""
+        samples = {
+            "empty.md": b"",
+            "lf.md": "# 開発日記\n\nログ ✅\n".encode('utf-8') * 5000,
+            "crlf.md": "一行目\r\n二行目\rthird\r\n".encode('utf-8') * 5000,
+        }
+        for name, data in samples.items():
+            path = self.write(name, data)
+            with open(path, 'r', encoding='utf-8') as f:
+                expected = f.read()
+            self.assertEqual(read_text(path), expected, name)
+            # 小さな区切りでもマルチバイト文字や \r\n の途中で壊れない
+            self.assertEqual("".join(iter_text(path, chunk_bytes=7)), expected, name)
+
+        with self.assertRaises(UnicodeDecodeError):
+            read_text(self.write("broken.md", b"\xff\xfe"))
+
+    def test_text_sha256(self):
+        """Hashing in slices equals hashing the whole UTF-8 encoding."""
+        text = "日記とlog " * 100000
+        self.assertEqual(text_sha256(text), hashlib.sha256(text.encode('utf-8')).hexdigest())
+
+
+if __name__ == '__main__':
+    unittest.main()
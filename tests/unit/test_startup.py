@@ -0,0 +1,58 @@
+"""
+Startup budget tests: importing the package and running the CLI without an
+API call must not load the Gemini SDK.
+"""
+
+import os
+import sys
+import json
+import unittest
+import subprocess
+from pathlib import Path
+
+# パッケージのインポートにかけてよい時間（秒）。CI環境の揺らぎを見込んだ上限
+STARTUP_BUDGET_SECONDS = 0.5
+
+SRC_DIR = Path(__file__).parent.parent.parent / "src"
+
+PROBE = """
+import sys, json, time
+start = time.perf_counter()
+import diary_converter
+import diary_converter.diary_converter
+import diary_converter.document_processor
+elapsed = time.perf_counter() - start
+sys.argv = ["diary_converter", "--help"]
+try:
+    diary_converter.diary_converter.main()
+except SystemExit:
+    pass
+print(json.dumps({
+    "elapsed": elapsed,
+    "heavy": sorted(m for m in ("google.generativeai", "grpc", "frontmatter") if m in sys.modules),
+}))
+"""
+
+
+class TestStartup(unittest.TestCase):
+    def run_probe(self):
+        env = dict(os.environ, PYTHONPATH=str(SRC_DIR))
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE], env=env, check=True, capture_output=True, text=True
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def test_heavy_dependencies_are_not_imported(self):
+        """Import and --help do not pull in the Gemini SDK or gRPC."""
+        self.assertEqual(self.run_probe()["heavy"], [])
+
+    def test_import_within_budget(self):
+        """Importing the package stays within the startup budget."""
+        # 初回はバイトコードのコンパイルを含むため、2回目を計測する
+        self.run_probe()
+        elapsed = self.run_probe()["elapsed"]
+        self.assertLess(elapsed, STARTUP_BUDGET_SECONDS, f"import took {elapsed:.3f}s")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Unit tests for the article validator
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from diary_converter.backends import LLMBackend
+from diary_converter.diary_converter import DiaryConverter, TemplateManager
+from diary_converter.validator import ArticleSpec, apply_repair, build_repair_prompt, repair_locally, validate_article
+
+TEMPLATE = str(Path(__file__).parent.parent.parent / "templates" / "zenn_template.md")
+
+SECTIONS = ["はじめに", "背景と目的", "検討内容", "実装内容", "技術的なポイント", "所感", "今後の課題", "まとめ"]
+
+
+def build_article(model="stub", slug="prev-slug", skip=(), frontmatter_type="idea"):
+    """テンプレートに沿った記事を組み立てる（skip のセクションは省く）"""
+    body = "".join(f"## {section}\n{section}の本文\n\n" for section in SECTIONS if section not in skip)
+    return (
+        "---\n"
+        "title: \"テスト（開発日記 No.12）\"\n"
+        "emoji: \"📝\"\n"
+        f"type: \"{frontmatter_type}\"\n"
+        "topics: [\"開発日記\"]\n"
+        "published: false\n"
+        "---\n\n"
+        f":::message\nこの記事は{model}によって自動生成されています。\n:::\n\n"
+        f"## 関連リンク\n\n- [前回の開発日記](https://zenn.dev/centervil/articles/{slug})\n\n"
+        + body
+    )
+
+
+class TestValidator(unittest.TestCase):
+    def setUp(self):
+        manager = TemplateManager(TEMPLATE)
+        self.spec = ArticleSpec(manager.prepare_template(manager.load_compiled_template(), "stub", "12", "prev-slug"))
+
+    def test_spec_and_valid_article(self):
+        """The spec is read from the template and a conforming article has no issues."""
+        self.assertEqual(self.spec.sections, ["関連リンク"] + SECTIONS)
+        self.assertEqual(self.spec.fixed_frontmatter, {"type": 'type: "idea"', "published": "published: false"})
+        self.assertIn("所感", self.spec.guidance)
+        self.assertEqual(validate_article(build_article(), self.spec), [])
+
+    def test_local_repairs_and_targeted_regeneration(self):
+        """Template-defined parts are fixed locally; only broken sections are re-prompted and spliced in."""
+        article = build_article(skip=("所感",), frontmatter_type="tech")
+        article = article.replace(":::message\nこの記事はstubによって", ":::message\nこの記事はAIによって")
+        article = article.replace("実装内容の本文\n", "実装内容の本文\n```python\nprint(1)\n")
+        issues = validate_article(article, self.spec)
+        self.assertEqual(
+            [(issue.kind, issue.target) for issue in issues],
+            [("frontmatter", "type"), ("message", ":::message"),
+             ("unbalanced_fence", "実装内容"), ("missing_section", "所感")]
+        )
+
+        article, remaining = repair_locally(article, self.spec, issues)
+        self.assertEqual([issue.target for issue in remaining], ["実装内容", "所感"])
+        prompt = build_repair_prompt("日記の内容", self.spec, remaining)
+        self.assertIn("`## 所感`", prompt)
+        self.assertNotIn("`## まとめ`", prompt)
+
+        # 閉じていないコードブロックの後の見出しもセクションとして扱い、応答の部分だけを差し替える
+        response = "## 実装内容\n```python\nprint(1)\n```\n\n## 所感\n楽しかった\n"
+        repaired = apply_repair(article, response, self.spec, remaining)
+        self.assertEqual(validate_article(repaired, self.spec), [])
+        self.assertIn('type: "idea"', repaired)
+        self.assertLess(repaired.index("## 技術的なポイント"), repaired.index("## 所感"))
+        self.assertLess(repaired.index("## 所感"), repaired.index("## 今後の課題"))
+
+
+class ScriptedBackend(LLMBackend):
+    """プロンプトの種類に応じて決まった応答を返すバックエンド"""
+
+    def __init__(self):
+        super().__init__("stub")
+        self.prompts = []
+
+    def generate(self, prompt, system_instruction=None):
+        self.prompts.append(prompt)
+        if "部分的な再生成" in prompt:
+            return "## 所感\n再生成した所感\n"
+        return build_article(skip=("所感",))
+
+
+class TestConverterValidation(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp_dir, "2025-03-01_12_development.md")
+        with open(self.source, 'w', encoding='utf-8') as f:
+            f.write("# 開発日記\n\n作業内容\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_convert_regenerates_only_missing_section(self):
+        """With validation on, a missing section costs one small extra call instead of a full retry."""
+        for stream in (False, True):
+            backend = ScriptedBackend()
+            converter = DiaryConverter(template_path=TEMPLATE, backend=backend, validate=True,
+                                       prev_article_slug="prev-slug", stream=stream)
+            destination = os.path.join(self.tmp_dir, f"article_{stream}.md")
+            converter.convert(self.source, destination)
+            self.assertEqual(len(backend.prompts), 2)
+            self.assertNotIn("LLM変換指示", backend.prompts[1])
+            with open(destination, 'r', encoding='utf-8') as f:
+                article = f.read()
+            self.assertIn("## 所感\n再生成した所感\n", article)
+            self.assertEqual(article.count("## "), 9)
+
+
+if __name__ == '__main__':
+    unittest.main()